@@ -3,6 +3,12 @@ ASGI config for bestgms project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The async check-in endpoints (``scan_qr_attendance_async`` and
+``record_attendance_async``) only avoid holding a worker per request when
+served through this module, e.g.::
+
+    gunicorn bestgms.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -75,6 +75,7 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+QR_CACHE_DIR = os.path.join(MEDIA_ROOT, 'qrcache')  # Rendered QR images, safe to wipe
 
 AUTH_USER_MODEL = 'core.User'
 LOGIN_URL = 'login'
@@ -95,6 +96,69 @@ STATICFILES_DIRS = [
 # Email settings for notifications
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'unadjibu@bestgms.com'
+EMAIL_OUTBOX_BATCH_SIZE = 50  # Messages sent per SMTP connection
+EMAIL_OUTBOX_RATE_PER_MINUTE = 120  # Across all delivery workers
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5  # Then the message is marked failed
+EMAIL_OUTBOX_RETRY_SECONDS = 60  # First retry delay, doubled on each further attempt
+EMAIL_OUTBOX_LEASE_SECONDS = 300  # A claimed message is retried after this if its worker died
+
+# Check-in
+CHECKIN_BATCH_LIMIT = 500  # Max scans accepted per kiosk batch
+CHECKIN_SCAN_MAX_AGE = 24 * 60 * 60  # Seconds; buffered kiosk scans older than this are rejected
+ROSTER_REFRESH_SECONDS = 5  # How often a worker checks a gym's roster version
+ASYNC_DB_CONCURRENCY = 8  # Concurrent DB operations per event loop in async views
+
+# Live occupancy
+OCCUPANCY_VISIT_MINUTES = 90  # A check-in without check-out counts as present this long
+OCCUPANCY_RESYNC_SECONDS = 30  # How often a worker re-seeds a gym's counter from Attendance
+OCCUPANCY_STREAM_SECONDS = 300  # SSE connections (ASGI only) close after this; EventSource reconnects
+OCCUPANCY_POLL_SECONDS = 15  # How often the dashboard polls occupancy under WSGI
+
+# Dashboards
+# Cached metrics, counters, status and inbox entries are invalidated by job
+# workers and commands as well as web workers, so every process must share
+# one cache; a per-process LocMemCache would keep serving stale numbers.
+# The file cache is for development only: its add() is not atomic across
+# processes, and scan debouncing relies on that, so production needs Redis
+# or Memcached. Culling would also drop live claims and generations, hence
+# the high MAX_ENTRIES. Tests swap in LocMemCache, see core/test_runner.py.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),  # Safe to wipe
+        'OPTIONS': {'MAX_ENTRIES': 100000},  # Default of 300 culls live entries
+    }
+}
+TEST_RUNNER = 'core.test_runner.TestRunner'  # Keeps tests off the shared cache
+DASHBOARD_METRICS_TIMEOUT = 15 * 60  # Safety net, entries are invalidated on write
+PLATFORM_SNAPSHOT_MIN_INTERVAL = 60  # Seconds between refreshes triggered by page views
+PLATFORM_SNAPSHOT_KEEP_DAYS = 7  # Older snapshots are thinned to one per day
+SIDEBAR_COUNTS_TIMEOUT = 60  # Sidebar badges, also dropped on write
+# Attendance retention
+ATTENDANCE_RETENTION_DAYS = 365  # Raw rows older than this move to AttendanceArchive
+ATTENDANCE_ARCHIVE_BATCH_SIZE = 1000  # Rows moved per short write transaction
+# Member import
+MEMBER_IMPORT_CHUNK_SIZE = 500  # Rows validated and inserted per transaction
+EXPORT_CHUNK_SIZE = 2000  # Rows fetched and written per streamed chunk
+# Status sweeps
+STATUS_SWEEP_INTERVAL = 0  # Seconds between sweeps in a web process background thread, 0 leaves it to sweep_status
+# Billing
+BILLING_LEAD_DAYS = 7  # Renewal invoices go out this many days before a gym expires
+# Background jobs
+JOB_TASK_MODULES = ['core.tasks']  # Imported by workers to register tasks
+JOB_WORKER_PROCESSES = 2  # Default for run_jobs --processes
+JOB_POLL_SECONDS = 2  # Idle workers check for new jobs this often
+JOB_LEASE_SECONDS = 10 * 60  # A running job is handed out again after this if its worker died
+JOB_RETRY_SECONDS = 30  # First retry delay, doubled on each further attempt
+JOB_KEEP_DAYS = 7  # Finished jobs older than this are pruned
+JOB_SCHEDULE = {  # Task name -> seconds between runs
+    'deliver_email': 60,
+    'refresh_platform_snapshot': 5 * 60,
+    'sweep_status': 60 * 60,
+    'run_billing': 24 * 60 * 60,
+    'archive_attendance': 24 * 60 * 60,
+    'prune_jobs': 24 * 60 * 60,
+}
 
 MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
 
@@ -2,8 +2,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import (
     User, SystemPlan, Gym, GymPlan, Member, Visitor,
-    Attendance, Staff, Invoice, Expense, Notification,
-    PaymentMethod
+    Attendance, AttendanceArchive, AttendanceDaily, Staff, Invoice, Expense, Notification, Broadcast,
+    Job, LedgerDaily, OutboundEmail, PaymentMethod, PlatformSnapshot
 )
 
 class CustomUserAdmin(UserAdmin):
@@ -29,8 +29,8 @@ class SystemPlanAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 class GymAdmin(admin.ModelAdmin):
-    list_display = ('name', 'owner', 'system_plan', 'registration_date', 'expiry_date', 'is_active', 'is_approved')
-    list_filter = ('is_active', 'is_approved', 'system_plan')
+    list_display = ('name', 'owner', 'system_plan', 'registration_date', 'expiry_date', 'status', 'is_active', 'is_approved')
+    list_filter = ('status', 'is_active', 'is_approved', 'system_plan')
     search_fields = ('name', 'owner__username', 'email')
     raw_id_fields = ('owner',)
     readonly_fields = ('registration_date',)
@@ -42,11 +42,11 @@ class GymPlanAdmin(admin.ModelAdmin):
     raw_id_fields = ('gym',)
 
 class MemberAdmin(admin.ModelAdmin):
-    list_display = ('name', 'gym', 'member_type', 'plan', 'registration_date', 'expiry_date', 'is_active')
-    list_filter = ('member_type', 'is_active', 'gym', 'gender')
+    list_display = ('name', 'gym', 'member_type', 'plan', 'registration_date', 'expiry_date', 'status', 'is_active')
+    list_filter = ('status', 'member_type', 'is_active', 'gym', 'gender')
     search_fields = ('name', 'phone', 'email', 'gym__name')
     raw_id_fields = ('gym', 'plan')
-    readonly_fields = ('registration_date', 'qr_code')
+    readonly_fields = ('registration_date', 'qr_payload')
     list_select_related = ('gym', 'plan')
 
 class VisitorAdmin(admin.ModelAdmin):
@@ -63,6 +63,28 @@ class AttendanceAdmin(admin.ModelAdmin):
     raw_id_fields = ('gym', 'member', 'staff')
     date_hierarchy = 'timestamp'
 
+class AttendanceArchiveAdmin(admin.ModelAdmin):
+    list_display = ('gym_id', 'attendance_type', 'member_id', 'staff_id', 'timestamp', 'method')
+    list_filter = ('attendance_type', 'method')
+    search_fields = ('=member_id', '=staff_id', '=gym_id')
+    date_hierarchy = 'timestamp'
+
+class AttendanceDailyAdmin(admin.ModelAdmin):
+    list_display = ('gym', 'date', 'member_count', 'staff_count', 'qr_count', 'manual_count', 'unique_members')
+    list_filter = ('gym',)
+    raw_id_fields = ('gym',)
+    date_hierarchy = 'date'
+
+class LedgerDailyAdmin(admin.ModelAdmin):
+    list_display = ('gym', 'date', 'kind', 'source', 'payment_method', 'amount', 'entries')
+    list_filter = ('kind', 'gym')
+    raw_id_fields = ('gym',)
+    date_hierarchy = 'date'
+
+class PlatformSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'total_gyms', 'active_gyms', 'expiring_gyms', 'expired_gyms', 'total_income', 'total_expenses')
+    date_hierarchy = 'created_at'
+
 class StaffAdmin(admin.ModelAdmin):
     list_display = ('user', 'gym', 'position', 'is_active')
     list_filter = ('is_active', 'gym', 'position')
@@ -70,8 +92,8 @@ class StaffAdmin(admin.ModelAdmin):
     raw_id_fields = ('user', 'gym')
 
 class InvoiceAdmin(admin.ModelAdmin):
-    list_display = ('gym', 'amount', 'payment_method', 'date', 'is_paid')
-    list_filter = ('is_paid', 'payment_method', 'gym')
+    list_display = ('gym', 'amount', 'payment_method', 'date', 'invoice_type', 'is_paid')
+    list_filter = ('is_paid', 'invoice_type', 'payment_method', 'gym')
     search_fields = ('gym__name', 'description', 'transaction_id')
     raw_id_fields = ('gym',)
     date_hierarchy = 'date'
@@ -92,6 +114,25 @@ class NotificationAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
     readonly_fields = ('created_at',)
 
+class BroadcastAdmin(admin.ModelAdmin):
+    list_display = ('message', 'audience', 'created_at')
+    list_filter = ('audience',)
+    search_fields = ('message',)
+    date_hierarchy = 'created_at'
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('to', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to', 'subject')
+    date_hierarchy = 'created_at'
+    readonly_fields = ('attempts', 'last_error', 'sent_at')
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'priority', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'task')
+    date_hierarchy = 'created_at'
+    readonly_fields = ('attempts', 'claim', 'last_error', 'finished_at')
+
 class PaymentMethodAdmin(admin.ModelAdmin):
     list_display = ('name', 'is_active')
     list_filter = ('is_active',)
@@ -104,8 +145,15 @@ admin.site.register(GymPlan, GymPlanAdmin)
 admin.site.register(Member, MemberAdmin)
 admin.site.register(Visitor, VisitorAdmin)
 admin.site.register(Attendance, AttendanceAdmin)
+admin.site.register(AttendanceArchive, AttendanceArchiveAdmin)
+admin.site.register(AttendanceDaily, AttendanceDailyAdmin)
 admin.site.register(Staff, StaffAdmin)
 admin.site.register(Invoice, InvoiceAdmin)
 admin.site.register(Expense, ExpenseAdmin)
 admin.site.register(Notification, NotificationAdmin)
-admin.site.register(PaymentMethod, PaymentMethodAdmin)
\ No newline at end of file
+admin.site.register(Broadcast, BroadcastAdmin)
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
+admin.site.register(Job, JobAdmin)
+admin.site.register(PaymentMethod, PaymentMethodAdmin)
+admin.site.register(LedgerDaily, LedgerDailyAdmin)
+admin.site.register(PlatformSnapshot, PlatformSnapshotAdmin)
\ No newline at end of file
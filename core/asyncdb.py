@@ -0,0 +1,23 @@
+"""
+Bounded database access for the async check-in views.
+
+Every async ORM call runs its query on a worker thread. Under a burst of
+scans that would mean one thread (and one connection) per in-flight request,
+so async views wrap their DB work in ``db_slot()`` which caps concurrent
+database operations at ``ASYNC_DB_CONCURRENCY`` per event loop. Requests
+above the cap wait in the event loop without tying up a thread.
+"""
+import asyncio
+import weakref
+
+from django.conf import settings
+
+_slots = weakref.WeakKeyDictionary()
+
+
+def db_slot():
+    loop = asyncio.get_running_loop()
+    semaphore = _slots.get(loop)
+    if semaphore is None:
+        semaphore = _slots[loop] = asyncio.Semaphore(settings.ASYNC_DB_CONCURRENCY)
+    return semaphore
@@ -0,0 +1,153 @@
+"""
+Gym subscription billing cycle.
+
+``run`` finds every active gym expiring within the lead window in one query
+and issues its renewal invoice with ``bulk_create``. An invoice's
+``billing_period`` is the expiry date it renews, unique per gym, so re-runs
+and concurrent runs never bill a period twice. Owners get a notification
+and a queued reminder email, only from the run that issued the invoice. ``settle`` moves a gym's expiry on by one plan
+duration once the invoice for its current period is paid; it only matches
+gyms still on that period, so it is safe to repeat.
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateField, Exists, ExpressionWrapper, F, OuterRef
+from django.utils import timezone
+
+from . import inbox, metrics, outbox, platform, status
+from .models import Gym, Invoice, Notification, PaymentMethod
+
+PENDING_PAYMENT_METHOD = 'pending'
+
+
+@dataclass
+class BillingReport:
+    invoiced: int = 0
+    extended: int = 0
+
+
+def pending_method():
+    """The inactive placeholder method unpaid invoices are booked to."""
+    payment_method, _ = PaymentMethod.objects.get_or_create(
+        name=PENDING_PAYMENT_METHOD, defaults={'is_active': False}
+    )
+    return payment_method
+
+
+def _period_invoices(is_paid=None):
+    invoices = Invoice.objects.filter(
+        gym_id=OuterRef('pk'), invoice_type='subscription_renewal', billing_period=OuterRef('expiry_date'),
+    )
+    return invoices if is_paid is None else invoices.filter(is_paid=is_paid)
+
+
+def _lock_gyms(gym_ids):
+    # Billing runs and manual renewals queue on the gym rows, so whoever goes
+    # second sees the period's invoice instead of issuing or counting it again
+    list(Gym.objects.select_for_update().filter(pk__in=gym_ids).values_list('pk', flat=True))
+
+
+def renewal_invoice(gym, payment_method=None):
+    """The renewal invoice for ``gym``'s current period, created if missing."""
+    payment_method = payment_method or pending_method()
+    with transaction.atomic():
+        _lock_gyms([gym.pk])
+        invoice, _ = Invoice.objects.get_or_create(
+            gym=gym,
+            invoice_type='subscription_renewal',
+            billing_period=gym.expiry_date,
+            defaults={
+                'amount': gym.system_plan.price,
+                'payment_method': payment_method,
+                'description': f"Renewal subscription for {gym.name}",
+            },
+        )
+    return invoice
+
+
+def due_gyms(days, today=None):
+    """Active gyms expiring by ``today + days`` with no invoice for that period yet."""
+    today = today or timezone.localdate()
+    return Gym.objects.filter(
+        is_active=True, system_plan__isnull=False, expiry_date__lte=today + timedelta(days=days),
+    ).exclude(Exists(_period_invoices()))
+
+
+def settle(gym_ids=None):
+    """Extend gyms whose current period's renewal invoice is paid; returns how many moved."""
+    gyms = Gym.objects.filter(Exists(_period_invoices(is_paid=True)))
+    if gym_ids is not None:
+        gyms = gyms.filter(pk__in=gym_ids)
+    extended = 0
+    # One UPDATE per plan length rather than one per gym
+    durations = gyms.values_list('system_plan__duration_days', flat=True).distinct().order_by()
+    for duration in durations:
+        if duration is None:
+            continue
+        extended += gyms.filter(system_plan__duration_days=duration).update(
+            expiry_date=ExpressionWrapper(F('expiry_date') + timedelta(days=duration), output_field=DateField()),
+            is_active=True,
+        )
+    if extended:
+        status.sweep_gyms(Gym.objects.filter(pk__in=gym_ids) if gym_ids is not None else None)
+    return extended
+
+
+def run(days=None, today=None):
+    """Invoice every gym due for renewal and settle paid ones."""
+    days = settings.BILLING_LEAD_DAYS if days is None else days
+    report = BillingReport()
+    report.extended = settle()
+
+    due = list(due_gyms(days, today).values_list(
+        'pk', 'name', 'owner_id', 'expiry_date', 'system_plan__price', 'email'
+    ))
+    if not due:
+        return report
+
+    payment_method = pending_method()
+    with transaction.atomic():
+        gym_ids = [gym_id for gym_id, *_ in due]
+        _lock_gyms(gym_ids)
+        billed = set(Invoice.objects.filter(
+            gym_id__in=gym_ids, invoice_type='subscription_renewal', billing_period__isnull=False,
+        ).values_list('gym_id', 'billing_period'))
+        due = [row for row in due if (row[0], row[3]) not in billed]
+        if not due:
+            return report
+
+        Invoice.objects.bulk_create([
+            Invoice(
+                gym_id=gym_id,
+                amount=price,
+                payment_method=payment_method,
+                invoice_type='subscription_renewal',
+                billing_period=expiry_date,
+                description=f"Renewal subscription for {name}",
+            )
+            for gym_id, name, _, expiry_date, price, _ in due
+        ], ignore_conflicts=True)  # Only writers that skip the lock, e.g. the admin, can collide
+        inbox.notify([
+            Notification(
+                user_id=owner_id,
+                message=f"Your subscription for {name} expires on {expiry_date:%b %d, %Y}. A renewal invoice is ready.",
+                link="/gym/dashboard/",
+            )
+            for _, name, owner_id, expiry_date, _, _ in due
+        ])
+        outbox.enqueue_many(
+            (email, f"Renewal invoice for {name}",
+             f"The subscription for {name} expires on {expiry_date:%b %d, %Y}. "
+             f"Renew for {price} from your dashboard to keep your gym active.")
+            for _, name, _, expiry_date, price, email in due if email
+        )
+    report.invoiced = len(due)
+
+    # bulk_create skips the post_save signals
+    platform.mark_stale()
+    for gym_id, *_ in due:
+        metrics.invalidate(gym_id)
+    return report
@@ -0,0 +1,193 @@
+"""
+Printable membership card sheets.
+
+Cards are laid out ten to an A4 page. QR codes are drawn as vector
+rectangles, one per run of dark modules, so sheets stay small and print
+sharp at any resolution without rasterising anything. Pages are rendered
+one at a time in the request and streamed as they are done, so memory stays
+flat however many members a sheet holds.
+"""
+import zlib
+from itertools import islice
+
+import qrcode
+from django.utils.html import escape
+
+# A4 in points, ISO ID-1 (credit card sized) cards in a 2 x 5 grid
+PAGE_WIDTH, PAGE_HEIGHT = 595.0, 842.0
+CARD_WIDTH, CARD_HEIGHT = 242.6, 153.0
+COLUMNS, ROWS = 2, 5
+CARDS_PER_PAGE = COLUMNS * ROWS
+QR_SIZE = 120.0
+CARD_PADDING = 14.0
+
+MARGIN_X = (PAGE_WIDTH - COLUMNS * CARD_WIDTH) / 2
+MARGIN_Y = (PAGE_HEIGHT - ROWS * CARD_HEIGHT) / 2
+
+
+def qr_runs(data):
+    """``(size, runs)`` of a QR code, each run an ``(x, y, length)`` of dark modules."""
+    qr = qrcode.QRCode(border=0, error_correction=qrcode.constants.ERROR_CORRECT_M)
+    qr.add_data(data)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if row[x]:
+                start = x
+                while x < len(row) and row[x]:
+                    x += 1
+                runs.append((start, y, x - start))
+            else:
+                x += 1
+    return len(matrix), runs
+
+
+def _slots():
+    for index in range(CARDS_PER_PAGE):
+        row, column = divmod(index, COLUMNS)
+        yield MARGIN_X + column * CARD_WIDTH, MARGIN_Y + row * CARD_HEIGHT
+
+
+def _card_lines(card):
+    return [card['name'], card['gym'], f"Member #{card['id']}", card['detail']]
+
+
+def render_svg_page(cards):
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="210mm" height="297mm" '
+        f'viewBox="0 0 {PAGE_WIDTH:g} {PAGE_HEIGHT:g}" font-family="Helvetica, Arial, sans-serif">'
+    ]
+    for card, (x, y) in zip(cards, _slots()):
+        size, runs = qr_runs(card['payload'])
+        scale = QR_SIZE / size
+        qr_y = y + (CARD_HEIGHT - QR_SIZE) / 2
+        path = ''.join(f'M{rx} {ry}h{length}v1h-{length}z' for rx, ry, length in runs)
+        parts.append(
+            f'<rect x="{x:.1f}" y="{y:.1f}" width="{CARD_WIDTH}" height="{CARD_HEIGHT}" '
+            f'fill="none" stroke="#999" stroke-width="0.5"/>'
+            f'<path transform="translate({x + CARD_PADDING:.1f} {qr_y:.1f}) scale({scale:.4f})" d="{path}"/>'
+        )
+        text_x = x + CARD_PADDING * 2 + QR_SIZE
+        for line, text in enumerate(_card_lines(card)):
+            weight = ' font-weight="bold"' if line == 0 else ''
+            parts.append(
+                f'<text x="{text_x:.1f}" y="{qr_y + 14 + line * 16:.1f}" font-size="{11 if line == 0 else 8}"'
+                f'{weight}>{escape(text)}</text>'
+            )
+    parts.append('</svg>')
+    return ''.join(parts).encode()
+
+
+def _pdf_text(value):
+    value = value.encode('cp1252', 'replace').decode('latin-1')
+    return value.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def render_pdf_page(cards):
+    """A compressed PDF content stream for one page."""
+    ops = ['0.5 w 0.6 G']
+    for card, (x, top) in zip(cards, _slots()):
+        y = PAGE_HEIGHT - top - CARD_HEIGHT
+        ops.append(f'{x:.1f} {y:.1f} {CARD_WIDTH} {CARD_HEIGHT} re S')
+
+        size, runs = qr_runs(card['payload'])
+        scale = QR_SIZE / size
+        qr_x = x + CARD_PADDING
+        qr_top = y + (CARD_HEIGHT + QR_SIZE) / 2
+        ops.append('0 g')
+        ops.extend(
+            f'{qr_x + rx * scale:.2f} {qr_top - (ry + 1) * scale:.2f} {length * scale:.2f} {scale:.2f} re'
+            for rx, ry, length in runs
+        )
+        ops.append('f')
+
+        text_x = qr_x + CARD_PADDING + QR_SIZE
+        for line, text in enumerate(_card_lines(card)):
+            font, size = ('/F2', 11) if line == 0 else ('/F1', 8)
+            ops.append(f'BT {font} {size} Tf {text_x:.1f} {qr_top - 14 - line * 16:.1f} Td ({_pdf_text(text)}) Tj ET')
+    return zlib.compress('\n'.join(ops).encode('latin-1'))
+
+
+class _PdfStream:
+    """Writes a PDF page by page, tracking object offsets for the xref table."""
+    CATALOG, PAGES, FONT, BOLD_FONT = 1, 2, 3, 4
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.pages = []
+        self.next_id = 5
+
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def _object(self, number, body):
+        self.offsets[number] = self.offset
+        return self._emit(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+
+    def start(self):
+        return self._emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n') + b''.join([
+            self._object(self.FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>'),
+            self._object(self.BOLD_FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>'),
+        ])
+
+    def page(self, content):
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self.pages.append(page_id)
+        return self._object(
+            content_id, b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(content) + content + b'\nendstream'
+        ) + self._object(page_id, (
+            f'<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {PAGE_WIDTH:g} {PAGE_HEIGHT:g}] '
+            f'/Resources << /Font << /F1 {self.FONT} 0 R /F2 {self.BOLD_FONT} 0 R >> >> /Contents {content_id} 0 R >>'
+        ).encode())
+
+    def finish(self):
+        kids = ' '.join(f'{page} 0 R' for page in self.pages)
+        data = self._object(self.PAGES, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>'.encode())
+        data += self._object(self.CATALOG, f'<< /Type /Catalog /Pages {self.PAGES} 0 R >>'.encode())
+        xref_at = self.offset
+        xref = [b'xref\n0 %d\n' % self.next_id, b'0000000000 65535 f \n']
+        xref += [b'%010d 00000 n \n' % self.offsets[number] for number in range(1, self.next_id)]
+        trailer = b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (self.next_id, self.CATALOG, xref_at)
+        return data + b''.join(xref) + trailer
+
+
+SVG_HEAD = (
+    b'<!DOCTYPE html><html><head><meta charset="utf-8"><title>Membership cards</title>'
+    b'<style>@page{size:A4;margin:0}body{margin:0}svg{display:block;page-break-after:always}</style>'
+    b'</head><body>'
+)
+SVG_TAIL = b'</body></html>'
+
+def _pages(cards):
+    cards = iter(cards)
+    while True:
+        page = list(islice(cards, CARDS_PER_PAGE))
+        if not page:
+            return
+        yield page
+
+
+def card_sheet(cards, fmt='pdf'):
+    """
+    Yield a printable document of ``cards`` (dicts with id, name, gym, detail
+    and payload) in chunks: a PDF, or an HTML page of SVG sheets.
+    """
+    pages = _pages(cards)
+    if fmt == 'svg':
+        yield SVG_HEAD
+        yield from map(render_svg_page, pages)
+        yield SVG_TAIL
+    elif fmt == 'pdf':
+        pdf = _PdfStream()
+        yield pdf.start()
+        for content in map(render_pdf_page, pages):
+            yield pdf.page(content)
+        yield pdf.finish()
+    else:
+        raise ValueError(f"Unsupported card sheet format: {fmt}")
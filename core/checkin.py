@@ -0,0 +1,81 @@
+"""
+Duplicate-scan debouncing and session consumption.
+
+Each recorded scan leaves its time in the cache under the member's key. A
+scan within the gym's ``checkin_debounce_minutes`` of that time, before or
+after it, repeats the same visit and is reported as deduplicated instead of
+recorded. Times are the scan's own, so a kiosk that sends buffered scans late
+still has them counted as separate visits when they were. The first scan of a
+member claims the key with ``cache.add``, so concurrent kiosks cannot both
+record it.
+
+Members on session plans pay for a recorded check-in with one conditional
+UPDATE that only matches while ``sessions_remaining > 0``, so concurrent
+kiosks can never take the same session twice or drive the count negative.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from . import roster
+from .models import Member
+
+
+def _key(gym_id, member_id):
+    return f'checkin:{gym_id}:{member_id}'
+
+
+def _timeout(window_minutes):
+    # Kept long enough for a buffered scan of the same visit to still find it
+    return window_minutes * 60 + settings.CHECKIN_SCAN_MAX_AGE
+
+
+def _repeats(last, at, window_minutes):
+    return abs(at - last) < window_minutes * 60
+
+
+def first_scan(gym_id, member_id, window_minutes, at=None):
+    """True if a scan at ``at`` (default now) should be recorded, False if it repeats a recent one."""
+    if not window_minutes:
+        return True
+    key, at = _key(gym_id, member_id), (at or timezone.now()).timestamp()
+    if cache.add(key, at, timeout=_timeout(window_minutes)):
+        return True
+    last = cache.get(key)
+    if last is not None and _repeats(last, at, window_minutes):
+        return False
+    cache.set(key, max(at, last or at), timeout=_timeout(window_minutes))
+    return True
+
+
+async def afirst_scan(gym_id, member_id, window_minutes, at=None):
+    if not window_minutes:
+        return True
+    key, at = _key(gym_id, member_id), (at or timezone.now()).timestamp()
+    if await cache.aadd(key, at, timeout=_timeout(window_minutes)):
+        return True
+    last = await cache.aget(key)
+    if last is not None and _repeats(last, at, window_minutes):
+        return False
+    await cache.aset(key, max(at, last or at), timeout=_timeout(window_minutes))
+    return True
+
+
+def release_scan(gym_id, member_id):
+    """Give back a debounce claim for a scan that ended up refused."""
+    cache.delete(_key(gym_id, member_id))
+
+
+async def arelease_scan(gym_id, member_id):
+    await cache.adelete(_key(gym_id, member_id))
+
+
+def consume_session(gym_id, member_id):
+    """Take one session; False if none were left."""
+    used = Member.objects.filter(pk=member_id, gym_id=gym_id, sessions_remaining__gt=0).update(
+        sessions_remaining=F('sessions_remaining') - 1,
+        status=Case(When(sessions_remaining=1, then=Value('exhausted')), default=F('status')),
+    )
+    roster.consumed(gym_id, member_id, used)
+    return bool(used)
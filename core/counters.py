@@ -0,0 +1,37 @@
+"""
+Sidebar gym counters, cached for ``SIDEBAR_COUNTS_TIMEOUT`` seconds and
+dropped by the Gym signals, so rendering a sidebar normally costs no
+queries. The unread badge comes from ``core.inbox``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Gym
+
+ACTIVE_GYMS_KEY = 'sidebar:active-gyms'
+
+
+def _expiring_gyms_key(today):
+    return f'sidebar:expiring-gyms:{today.isoformat()}'
+
+
+def active_gym_count():
+    return cache.get_or_set(
+        ACTIVE_GYMS_KEY,
+        lambda: Gym.objects.filter(status__in=Gym.ACTIVE_STATUSES).count(),
+        settings.SIDEBAR_COUNTS_TIMEOUT,
+    )
+
+
+def expiring_gym_count():
+    today = timezone.localdate()
+    return cache.get_or_set(
+        _expiring_gyms_key(today),
+        lambda: Gym.objects.filter(status='expiring').count(),
+        settings.SIDEBAR_COUNTS_TIMEOUT,
+    )
+
+
+def invalidate_gym_counts():
+    cache.delete_many([ACTIVE_GYMS_KEY, _expiring_gyms_key(timezone.localdate())])
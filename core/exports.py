@@ -0,0 +1,116 @@
+"""
+Streaming CSV / JSON Lines exports of a gym's data.
+
+Rows come from ``values_list(...).iterator(chunk_size=...)`` and are written
+out a batch at a time, so memory stays flat however large the table, and
+the header goes out before the query has even run.
+"""
+import csv
+import json
+from datetime import date
+from itertools import chain, islice
+
+from django.conf import settings
+
+from .filters import filter_expenses, filter_invoices, filter_members, filter_visitors
+from .models import Attendance, AttendanceArchive, Expense, Invoice, Member, Visitor
+from .rollups import day_bounds
+
+# dataset -> ((column, lookup), ...)
+COLUMNS = {
+    'members': (
+        ('id', 'id'), ('name', 'name'), ('email', 'email'), ('phone', 'phone'), ('gender', 'gender'),
+        ('member_type', 'member_type'), ('plan', 'plan__name'), ('registration_date', 'registration_date'),
+        ('expiry_date', 'expiry_date'), ('sessions_remaining', 'sessions_remaining'), ('is_active', 'is_active'),
+    ),
+    'attendance': (
+        ('timestamp', 'timestamp'), ('attendance_type', 'attendance_type'), ('member_id', 'member_id'),
+        ('staff_id', 'staff_id'), ('method', 'method'),
+    ),
+    'invoices': (
+        ('id', 'id'), ('date', 'date'), ('invoice_type', 'invoice_type'), ('amount', 'amount'),
+        ('payment_method', 'payment_method__name'), ('is_paid', 'is_paid'), ('description', 'description'),
+        ('transaction_id', 'transaction_id'),
+    ),
+    'visitors': (
+        ('id', 'id'), ('date', 'date'), ('name', 'name'), ('amount', 'amount'),
+        ('payment_method', 'payment_method__name'),
+    ),
+    'expenses': (
+        ('id', 'id'), ('date', 'date'), ('description', 'description'), ('category', 'category'),
+        ('amount', 'amount'),
+    ),
+}
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson'}
+
+
+def _range(queryset, field, date_from, date_to, is_date=False):
+    """Limit to ``[date_from, date_to]``, as local days for datetime fields."""
+    if is_date:
+        if date_from:
+            queryset = queryset.filter(**{f'{field}__gte': date_from})
+        if date_to:
+            queryset = queryset.filter(**{f'{field}__lte': date_to})
+        return queryset
+    if date_from:
+        queryset = queryset.filter(**{f'{field}__gte': day_bounds(date_from)[0]})
+    if date_to:
+        queryset = queryset.filter(**{f'{field}__lt': day_bounds(date_to)[1]})
+    return queryset
+
+
+def querysets(gym, dataset, status='active', search='', date_from=None, date_to=None):
+    """The ordered querysets behind an export, with the list views' filters applied."""
+    if dataset == 'members':
+        return [filter_members(Member.objects.filter(gym=gym), status, search).order_by('id')]
+    if dataset == 'attendance':
+        # Archived rows are the oldest, so they go first to keep time order
+        live = _range(Attendance.objects.filter(gym=gym), 'timestamp', date_from, date_to)
+        archived = _range(AttendanceArchive.objects.filter(gym_id=gym.id), 'timestamp', date_from, date_to)
+        return [archived.order_by('timestamp', 'id'), live.order_by('timestamp', 'id')]
+    if dataset == 'invoices':
+        invoices = _range(Invoice.objects.filter(gym=gym), 'date', date_from, date_to)
+        return [filter_invoices(invoices, search).order_by('date', 'id')]
+    if dataset == 'visitors':
+        visitors = _range(Visitor.objects.filter(gym=gym), 'date', date_from, date_to)
+        return [filter_visitors(visitors, search).order_by('date', 'id')]
+    if dataset == 'expenses':
+        expenses = _range(Expense.objects.filter(gym=gym), 'date', date_from, date_to, is_date=True)
+        return [filter_expenses(expenses, search).order_by('date', 'id')]
+    raise ValueError(f"Unknown export: {dataset}")
+
+
+class _Echo:
+    """File-like object whose write() hands back the line, for csv.writer."""
+    def write(self, value):
+        return value
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, date) else str(value)
+
+
+def stream(querysets, dataset, fmt='csv', chunk_size=None):
+    """Yield the export as encoded chunks of ``chunk_size`` rows."""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    headers = [column for column, _ in COLUMNS[dataset]]
+    lookups = [lookup for _, lookup in COLUMNS[dataset]]
+    rows = chain.from_iterable(
+        queryset.values_list(*lookups).iterator(chunk_size=chunk_size) for queryset in querysets
+    )
+
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(headers).encode()
+        encode = writer.writerow
+    elif fmt == 'jsonl':
+        def encode(row):
+            return json.dumps(dict(zip(headers, row)), default=_json_value) + '\n'
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            break
+        yield ''.join(encode(row) for row in batch).encode()
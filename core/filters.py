@@ -0,0 +1,41 @@
+"""List filters shared by the gym list views, card sheets and exports."""
+from django.db.models import Q
+
+from .models import Member
+
+
+def filter_members(members, status, search_query):
+    """Apply the member list's status filter and search to a Member queryset."""
+    if status == 'active':
+        members = members.filter(status__in=Member.ACTIVE_STATUSES)
+    elif status in dict(Member.STATUSES):
+        members = members.filter(status=status)
+
+    if search_query:
+        members = members.filter(
+            Q(name__icontains=search_query) |
+            Q(phone__icontains=search_query) |
+            Q(email__icontains=search_query)
+        )
+    return members
+
+
+def filter_invoices(invoices, search_query):
+    if search_query:
+        invoices = invoices.filter(
+            Q(description__icontains=search_query) |
+            Q(payment_method__name__icontains=search_query)
+        )
+    return invoices
+
+
+def filter_visitors(visitors, search_query):
+    if search_query:
+        visitors = visitors.filter(name__icontains=search_query)
+    return visitors
+
+
+def filter_expenses(expenses, search_query):
+    if search_query:
+        expenses = expenses.filter(description__icontains=search_query)
+    return expenses
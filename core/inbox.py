@@ -0,0 +1,120 @@
+"""
+A user's inbox: their own ``Notification`` rows plus the ``Broadcast`` rows
+addressed to their role since they joined.
+
+A broadcast is one row however many users it reaches, and its read state is
+a ``BroadcastReceipt`` written only when a user marks their inbox read.
+Targeted messages go out with one ``bulk_create``. Listings and unread
+counts are single UNION queries, cached per user under a key that carries a
+broadcast generation, so sending a broadcast retires every user's cached
+copy without touching any of them.
+"""
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, F, OuterRef, Q, Value
+
+from .models import Broadcast, BroadcastReceipt, Notification
+
+Entry = namedtuple('Entry', ['kind', 'id', 'message', 'link', 'created_at', 'is_read'])
+
+GENERATION_KEY = 'inbox:generation'
+
+
+def _generation():
+    # Seeded from the clock so an evicted counter never reuses old keys
+    return cache.get_or_set(GENERATION_KEY, time.time_ns, timeout=None)
+
+
+def _keys(user_id):
+    generation = _generation()
+    return f'inbox:recent:{user_id}:{generation}', f'inbox:unread:{user_id}:{generation}'
+
+
+def _broadcasts(user):
+    return Broadcast.objects.filter(Q(audience='') | Q(audience=user.role), created_at__gte=user.date_joined)
+
+
+def _receipt(user):
+    return BroadcastReceipt.objects.filter(broadcast=OuterRef('pk'), user=user)
+
+
+def _unread_broadcasts(user):
+    return _broadcasts(user).exclude(Exists(_receipt(user)))
+
+
+def entries(user, limit=None):
+    """Notifications and broadcasts for ``user``, newest first."""
+    fields = ('kind', 'id', 'message', 'link', 'created_at', 'read')
+    personal = Notification.objects.filter(user=user).annotate(
+        kind=Value('notification'), read=F('is_read'),
+    ).values(*fields)
+    broadcasts = _broadcasts(user).annotate(
+        kind=Value('broadcast'), read=Exists(_receipt(user)),
+    ).values(*fields)
+    rows = personal.union(broadcasts, all=True).order_by('-created_at')
+    if limit:
+        rows = rows[:limit]
+    return [Entry(*(row[field] for field in fields)) for row in rows]
+
+
+def recent(user):
+    """The five newest entries, as shown on the dashboards."""
+    key, _ = _keys(user.pk)
+    items = cache.get(key)
+    if items is None:
+        items = entries(user, limit=5)
+        cache.set(key, items, timeout=settings.DASHBOARD_METRICS_TIMEOUT)
+    return items
+
+
+def unread_count(user):
+    _, key = _keys(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user=user, is_read=False).values('id').union(
+            _unread_broadcasts(user).values('id'), all=True
+        ).count()
+        cache.set(key, count, timeout=settings.SIDEBAR_COUNTS_TIMEOUT)
+    return count
+
+
+def mark_read(user):
+    Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+    # Receipts only ever exist for broadcasts a user has actually read
+    BroadcastReceipt.objects.bulk_create(
+        [BroadcastReceipt(broadcast_id=pk, user=user) for pk in _unread_broadcasts(user).values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    invalidate(user.pk)
+
+
+def notify(notifications):
+    """Insert prepared ``Notification`` rows in one statement."""
+    created = Notification.objects.bulk_create(notifications)
+    # bulk_create skips post_save
+    for user_id in {notification.user_id for notification in created}:
+        invalidate(user_id)
+    return created
+
+
+def send(user_ids, message, link=''):
+    return notify([Notification(user_id=user_id, message=message, link=link) for user_id in user_ids])
+
+
+def broadcast(message, link='', audience='gym_owner'):
+    """One row reaching every user with ``audience`` role, or everyone if blank."""
+    return Broadcast.objects.create(message=message, link=link, audience=audience)
+
+
+def invalidate(user_id):
+    cache.delete_many(_keys(user_id))
+
+
+def invalidate_all():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:  # Not set yet or evicted
+        _generation()
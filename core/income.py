@@ -0,0 +1,59 @@
+"""
+Platform income analytics for ``system.views.income_report``.
+
+Platform income is what gyms pay for their subscriptions. Every breakdown
+is a single grouped query over paid invoices, with initial subscriptions and
+renewals split by ``Invoice.invoice_type``.
+"""
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import Invoice
+from .rollups import day_bounds
+
+PLATFORM_INCOME_TYPES = ('subscription', 'subscription_renewal')
+BUCKETS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+
+def _money(expression):
+    return Coalesce(expression, Value(0), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _totals():
+    return {
+        'total_income': _money(Sum('amount')),
+        'subscriptions': _money(Sum('amount', filter=Q(invoice_type='subscription'))),
+        'renewals': _money(Sum('amount', filter=Q(invoice_type='subscription_renewal'))),
+        'invoices': Count('id'),
+    }
+
+
+def platform_invoices(date_from, date_to):
+    """Paid subscription invoices dated within ``[date_from, date_to]`` local days."""
+    return Invoice.objects.filter(
+        is_paid=True,
+        invoice_type__in=PLATFORM_INCOME_TYPES,
+        date__gte=day_bounds(date_from)[0],
+        date__lt=day_bounds(date_to)[1],
+    )
+
+
+def overall(invoices):
+    return invoices.aggregate(**_totals())
+
+
+def by_gym(invoices):
+    """Per gym totals, largest first; lazy, so it can be paginated."""
+    return invoices.values('gym_id').annotate(name=F('gym__name'), **_totals()).order_by('-total_income', 'gym_id')
+
+
+def by_plan(invoices):
+    """Totals per system plan the paying gyms are currently on."""
+    return invoices.values(plan=F('gym__system_plan__name')).annotate(**_totals()).order_by('-total_income')
+
+
+def by_bucket(invoices, bucket='day'):
+    """Totals per local day, week or month."""
+    trunc = BUCKETS[bucket]('date', tzinfo=timezone.get_current_timezone())
+    return invoices.annotate(period=trunc).values('period').annotate(**_totals()).order_by('period')
@@ -0,0 +1,139 @@
+"""
+Background jobs stored in the main database (``Job``), no broker needed.
+
+Views ``enqueue`` a task by name and return. ``run_jobs`` workers claim the
+highest priority due job with one UPDATE that stamps a claim token, marks
+it running and pushes ``run_at`` out by ``JOB_LEASE_SECONDS``. The UPDATE
+re-checks the row is still due, so two workers never get the same job on
+SQLite (writes are serialised) or Postgres (the WHERE is re-evaluated after
+a concurrent update). A job whose worker died is handed out again once its
+lease runs out. Failures retry with exponential backoff up to
+``max_attempts``.
+
+Periodic tasks in ``JOB_SCHEDULE`` get one job per interval: each schedule
+slot has a unique ``dedupe_key``, so any number of workers can try to
+enqueue it and only one row is written.
+"""
+import logging
+import time
+import traceback
+import uuid
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}
+
+
+def task(name):
+    """Register a function as the task ``name``."""
+    def register(func):
+        _tasks[name] = func
+        return func
+    return register
+
+
+def _registry():
+    for module in settings.JOB_TASK_MODULES:
+        import_module(module)
+    return _tasks
+
+
+def enqueue(name, priority=0, run_at=None, dedupe_key=None, max_attempts=3, **payload):
+    """Queue ``name`` to run with ``payload`` as keyword arguments."""
+    fields = {
+        'task': name, 'payload': payload, 'priority': priority, 'run_at': run_at or timezone.now(),
+        'max_attempts': max_attempts,
+    }
+    if dedupe_key:
+        return Job.objects.get_or_create(dedupe_key=dedupe_key, defaults=fields)[0]
+    return Job.objects.create(**fields)
+
+
+def schedule(now=None, last_slots=None):
+    """Enqueue the current slot of every periodic task; ``last_slots`` skips ones already done."""
+    now = now or timezone.now()
+    jobs = []
+    for name, every in settings.JOB_SCHEDULE.items():
+        slot = int(now.timestamp() // every)
+        if last_slots is not None:
+            if last_slots.get(name) == slot:
+                continue
+            last_slots[name] = slot
+        jobs.append(Job(task=name, run_at=now, max_attempts=1, dedupe_key=f'schedule:{name}:{slot}'))
+    if jobs:
+        Job.objects.bulk_create(jobs, ignore_conflicts=True)
+
+
+def _due(now):
+    return Job.objects.filter(Q(status='queued') | Q(status='running'), run_at__lte=now)
+
+
+def claim(now=None):
+    """Lease the highest priority due job to this worker, or None."""
+    now = now or timezone.now()
+    pk = _due(now).order_by('-priority', 'run_at', 'id').values_list('pk', flat=True).first()
+    if pk is None:
+        return None
+    token = uuid.uuid4().hex
+    claimed = _due(now).filter(pk=pk).update(
+        status='running', claim=token, attempts=F('attempts') + 1,
+        run_at=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+    )
+    # Lost the race to another worker, the caller just tries again
+    return Job.objects.filter(pk=pk, claim=token).first() if claimed else None
+
+
+def _backoff(attempts):
+    return timedelta(seconds=settings.JOB_RETRY_SECONDS * 2 ** (attempts - 1))
+
+
+def run(job):
+    """Run a claimed job and record the outcome; True if it succeeded."""
+    mine = Job.objects.filter(pk=job.pk, claim=job.claim)
+    func = _registry().get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f"Unknown task: {job.task}")
+        func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Job %s (%s) failed on attempt %s", job.pk, job.task, job.attempts)
+        now = timezone.now()
+        if func is None or job.attempts >= job.max_attempts:
+            mine.update(status='failed', last_error=error, finished_at=now)
+        else:
+            mine.update(status='queued', last_error=error, run_at=now + _backoff(job.attempts))
+        return False
+    mine.update(status='done', last_error='', finished_at=timezone.now())
+    return True
+
+
+def work(once=False, poll=None, should_stop=None):
+    """Worker loop: schedule periodic tasks, then claim and run jobs until stopped."""
+    poll = settings.JOB_POLL_SECONDS if poll is None else poll
+    last_slots = {}
+    while not (should_stop and should_stop()):
+        close_old_connections()
+        schedule(last_slots=last_slots)
+        job = claim()
+        if job is not None:
+            run(job)
+            continue
+        if once and not _due(timezone.now()).exists():
+            break
+        time.sleep(poll)
+
+
+def prune(keep_days=None):
+    cutoff = timezone.now() - timedelta(days=settings.JOB_KEEP_DAYS if keep_days is None else keep_days)
+    deleted, _ = Job.objects.filter(status__in=('done', 'failed'), finished_at__lt=cutoff).delete()
+    return deleted
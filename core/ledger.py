@@ -0,0 +1,158 @@
+"""
+Per gym daily ledger (``LedgerDaily``): paid member invoices and visitor
+fees as income by source, gym expenses by category, both split by payment
+method.
+
+New rows are added incrementally by ``record``. Edits and deletes recompute
+the affected gym day with ``refresh_day``, and ``rebuild`` recomputes any
+range from the raw tables. Gym subscription invoices are the platform's
+income, not the gym's, so they stay out of the ledger.
+"""
+from collections import defaultdict
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Expense, Invoice, LedgerDaily, Visitor
+from .rollups import day_bounds
+
+GYM_INCOME_TYPES = ('membership', 'membership_renewal', 'other')
+INCOME_SOURCES = {
+    'membership': 'Memberships',
+    'membership_renewal': 'Renewals',
+    'other': 'Other invoices',
+    'visitor': 'Visitors',
+}
+
+
+def entry_day(instance):
+    """The local day an invoice, visitor fee or expense belongs to."""
+    return instance.date if type(instance.date) is date else timezone.localdate(instance.date)
+
+
+def entry_for(instance):
+    """``(gym_id, day, kind, source, payment method name, amount)`` or None if off the ledger."""
+    if isinstance(instance, Invoice):
+        if not instance.is_paid or instance.invoice_type not in GYM_INCOME_TYPES:
+            return None
+        return (instance.gym_id, entry_day(instance), 'income', instance.invoice_type,
+                instance.payment_method.name, instance.amount)
+    if isinstance(instance, Visitor):
+        return (instance.gym_id, entry_day(instance), 'income', 'visitor',
+                instance.payment_method.name, instance.amount)
+    if isinstance(instance, Expense):
+        if instance.gym_id is None:  # Platform expense
+            return None
+        return (instance.gym_id, instance.date, 'expense', instance.category, '', instance.amount)
+    return None
+
+
+def record(instance):
+    """Add a newly created invoice, visitor fee or expense to its ledger day."""
+    entry = entry_for(instance)
+    if entry is None:
+        return
+    gym_id, day, kind, source, method, amount = entry
+    with transaction.atomic():
+        LedgerDaily.objects.get_or_create(gym_id=gym_id, date=day, kind=kind, source=source, payment_method=method)
+        LedgerDaily.objects.filter(
+            gym_id=gym_id, date=day, kind=kind, source=source, payment_method=method
+        ).update(amount=F('amount') + amount, entries=F('entries') + 1)
+
+
+def _aggregate(invoices, visitors, expenses):
+    """Ledger totals keyed by ``(gym_id, day, kind, source, payment_method)``."""
+    tz = timezone.get_current_timezone()
+    totals = defaultdict(lambda: [0, 0])
+    grouped = [
+        (invoices.filter(is_paid=True, invoice_type__in=GYM_INCOME_TYPES).annotate(
+            day=TruncDate('date', tzinfo=tz), source=F('invoice_type'), method=F('payment_method__name'),
+        ), 'income'),
+        (visitors.annotate(
+            day=TruncDate('date', tzinfo=tz), source=Value('visitor'), method=F('payment_method__name'),
+        ), 'income'),
+        (expenses.filter(gym__isnull=False).annotate(
+            day=F('date'), source=F('category'), method=Value(''),
+        ), 'expense'),
+    ]
+    for queryset, kind in grouped:
+        rows = queryset.values('gym_id', 'day', 'source', 'method').annotate(
+            total=Sum('amount'), count=Count('id'),
+        ).order_by()
+        for row in rows:
+            key = (row['gym_id'], row['day'], kind, row['source'], row['method'] or '')
+            totals[key][0] += row['total']
+            totals[key][1] += row['count']
+    return totals
+
+
+def _replace(ledger, totals):
+    with transaction.atomic():
+        ledger.delete()
+        created = LedgerDaily.objects.bulk_create(
+            LedgerDaily(gym_id=gym_id, date=day, kind=kind, source=source, payment_method=method,
+                        amount=amount, entries=count)
+            for (gym_id, day, kind, source, method), (amount, count) in totals.items()
+        )
+    return len(created)
+
+
+def refresh_day(gym_id, day):
+    """Recompute one gym's ledger day, after an edit or delete."""
+    start, end = day_bounds(day)
+    _replace(
+        LedgerDaily.objects.filter(gym_id=gym_id, date=day),
+        _aggregate(
+            Invoice.objects.filter(gym_id=gym_id, date__gte=start, date__lt=end),
+            Visitor.objects.filter(gym_id=gym_id, date__gte=start, date__lt=end),
+            Expense.objects.filter(gym_id=gym_id, date=day),
+        ),
+    )
+
+
+def rebuild(gym_ids=None, date_from=None, date_to=None):
+    """Recompute the ledger from the raw tables; returns the number of rows written."""
+    invoices, visitors, expenses = Invoice.objects.all(), Visitor.objects.all(), Expense.objects.all()
+    ledger = LedgerDaily.objects.all()
+    if gym_ids:
+        invoices, visitors, expenses = (qs.filter(gym_id__in=gym_ids) for qs in (invoices, visitors, expenses))
+        ledger = ledger.filter(gym_id__in=gym_ids)
+    if date_from:
+        start = day_bounds(date_from)[0]
+        invoices, visitors = invoices.filter(date__gte=start), visitors.filter(date__gte=start)
+        expenses, ledger = expenses.filter(date__gte=date_from), ledger.filter(date__gte=date_from)
+    if date_to:
+        end = day_bounds(date_to)[1]
+        invoices, visitors = invoices.filter(date__lt=end), visitors.filter(date__lt=end)
+        expenses, ledger = expenses.filter(date__lte=date_to), ledger.filter(date__lte=date_to)
+    return _replace(ledger, _aggregate(invoices, visitors, expenses))
+
+
+def summarize(gym_id, date_from, date_to):
+    """Income by source, expenses by category and the payment method split for a date range."""
+    summary = {
+        'income_total': 0,
+        'expense_total': 0,
+        'income_by_source': {label: 0 for label in INCOME_SOURCES.values()},
+        'expenses_by_category': {},
+        'payment_methods': {},
+    }
+    rows = LedgerDaily.objects.filter(gym_id=gym_id, date__range=(date_from, date_to)).values(
+        'kind', 'source', 'payment_method'
+    ).annotate(total=Sum('amount')).order_by()
+    for row in rows:
+        if row['kind'] == 'income':
+            summary['income_total'] += row['total']
+            label = INCOME_SOURCES.get(row['source'], row['source'])
+            summary['income_by_source'][label] = summary['income_by_source'].get(label, 0) + row['total']
+            method = row['payment_method'] or 'unknown'
+            summary['payment_methods'][method] = summary['payment_methods'].get(method, 0) + row['total']
+        else:
+            summary['expense_total'] += row['total']
+            category = row['source'] or 'Uncategorised'
+            summary['expenses_by_category'][category] = summary['expenses_by_category'].get(category, 0) + row['total']
+    summary['net_profit'] = summary['income_total'] - summary['expense_total']
+    return summary
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import retention
+
+
+class Command(BaseCommand):
+    help = "Move raw attendance older than the retention horizon into AttendanceArchive."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ATTENDANCE_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=settings.ATTENDANCE_ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches")
+        parser.add_argument('--max-batches', type=int)
+
+    def handle(self, *args, **options):
+        moved = retention.archive_attendance(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} attendance rows."))
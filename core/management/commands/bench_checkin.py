@@ -0,0 +1,143 @@
+import asyncio
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import roster
+from core.models import Attendance, Gym, Member, SystemPlan, User
+from core.qr import make_payload
+
+HEADERS = {'x-requested-with': 'XMLHttpRequest'}
+
+
+def _summary(label, results, elapsed):
+    latencies = sorted(latency for latency, _ in results)
+    failed = sum(1 for _, ok in results if not ok)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return (
+        f"{label:<5} {len(latencies) / elapsed:8.1f} req/s   "
+        f"p50 {statistics.median(latencies) * 1000:7.1f} ms   p99 {p99 * 1000:7.1f} ms   "
+        f"failed {failed}"
+    )
+
+
+def _ok(response):
+    return response.status_code == 200 and response.json().get('status') == 'success'
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire a burst of concurrent QR scans through the WSGI handler and the ASGI "
+        "handler in-process and compare requests/sec and p99 latency. Uses a "
+        "throwaway gym that is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--members', type=int, default=100)
+        parser.add_argument('--sessions', type=int,
+                            help="Put members on a session plan with this many sessions and audit the counts")
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        plan = SystemPlan.objects.order_by('id').first() or SystemPlan.objects.create(
+            name='Benchmark', plan_type='basic', price=0, duration_days=30, gym_limit=1, member_limit=0
+        )
+        user = User.objects.create_user(f'bench-{tag}', role='gym_owner')
+        gym = Gym.objects.create(
+            owner=user, name=f'Benchmark {tag}', address='-', phone='-', email='bench@example.com',
+            system_plan=plan, is_active=True, checkin_debounce_minutes=0,
+        )
+        try:
+            members = Member.objects.bulk_create(
+                Member(gym=gym, name=f'Member {i}', phone='-', gender='other', member_type='individual',
+                       sessions_remaining=options['sessions'])
+                for i in range(options['members'])
+            )
+            roster.touch(gym.id, [member.id for member in members])
+            payloads = [make_payload(gym.id, member.id) for member in members]
+            bodies = [
+                {'qr_data': payloads[i % len(payloads)], 'gym_id': gym.id}
+                for i in range(options['requests'])
+            ]
+
+            # DEBUG would log every query and skew both runs
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+                self.stdout.write(self._count_queries(user, payloads[0], gym.id))
+                self.stdout.write(self._run_wsgi(user, bodies, options['concurrency']))
+                self.stdout.write(self._run_asgi(user, bodies, options['concurrency']))
+                if options['sessions'] is not None:
+                    self.stdout.write(self._audit_sessions(gym, options['members'] * options['sessions']))
+        finally:
+            gym.delete()
+            user.delete()
+
+    def _count_queries(self, user, payload, gym_id):
+        client = Client()
+        client.force_login(user)
+        url = reverse('scan_qr_attendance')
+        client.post(url, {'qr_data': payload, 'gym_id': gym_id}, headers=HEADERS)  # Warm the roster
+        with CaptureQueriesContext(connection) as captured:
+            client.post(url, {'qr_data': payload, 'gym_id': gym_id}, headers=HEADERS)
+        return f"Queries per scan: {len(captured.captured_queries)}"
+
+    def _audit_sessions(self, gym, issued):
+        # Every recorded check-in must have taken exactly one session
+        remaining = Member.objects.filter(gym=gym).aggregate(total=Sum('sessions_remaining'))['total'] or 0
+        recorded = Attendance.objects.filter(gym=gym).count()
+        lost = issued - remaining - recorded
+        style = self.style.SUCCESS if lost == 0 else self.style.ERROR
+        return style(
+            f"Sessions: issued {issued}, consumed {issued - remaining}, check-ins recorded {recorded}, "
+            f"lost updates {lost}"
+        )
+
+    def _run_wsgi(self, user, bodies, concurrency):
+        url = reverse('scan_qr_attendance')
+        local = threading.local()
+
+        def scan(body):
+            # One logged-in client per thread, like one gunicorn worker each
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.force_login(user)
+            start = time.perf_counter()
+            response = local.client.post(url, body, headers=HEADERS)
+            return time.perf_counter() - start, _ok(response)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            start = time.perf_counter()
+            results = list(pool.map(scan, bodies))
+            elapsed = time.perf_counter() - start
+        return _summary('WSGI', results, elapsed)
+
+    def _run_asgi(self, user, bodies, concurrency):
+        url = reverse('scan_qr_attendance_async')
+        client = AsyncClient()
+        client.force_login(user)
+
+        async def burst():
+            gate = asyncio.Semaphore(concurrency)
+
+            async def scan(body):
+                async with gate:
+                    start = time.perf_counter()
+                    response = await client.post(url, body, headers=HEADERS)
+                    return time.perf_counter() - start, _ok(response)
+
+            start = time.perf_counter()
+            results = await asyncio.gather(*(scan(body) for body in bodies))
+            return results, time.perf_counter() - start
+
+        results, elapsed = asyncio.run(burst())
+        return _summary('ASGI', results, elapsed)
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox in batches over one connection each."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, help="Keep running, polling every N seconds when idle")
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--backend', help="Email backend path, e.g. the console backend for a dry run")
+
+    def handle(self, *args, **options):
+        while True:
+            report = outbox.deliver(options['batch_size'], options['backend'])
+            if report.sent or report.retrying or report.failed:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Sent {report.sent}, retrying {report.retrying}, failed {report.failed}."
+                ))
+            if not options['every']:
+                break
+            # Keep draining while there is mail, sleep once the queue is empty or rate limited
+            if not report.sent:
+                time.sleep(options['every'])
@@ -0,0 +1,44 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import exports
+from core.models import Gym
+
+
+class Command(BaseCommand):
+    help = "Stream a gym's members, attendance, invoices, visitors or expenses as CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('gym_id', type=int)
+        parser.add_argument('dataset', choices=sorted(exports.COLUMNS))
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--output', help="File to write, defaults to stdout")
+        parser.add_argument('--status', default='', help="Member status filter: active, expiring or expired")
+        parser.add_argument('--search', default='')
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat)
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat)
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        try:
+            gym = Gym.objects.get(pk=options['gym_id'])
+        except Gym.DoesNotExist:
+            raise CommandError(f"Gym {options['gym_id']} does not exist")
+
+        querysets = exports.querysets(
+            gym, options['dataset'],
+            status=options['status'],
+            search=options['search'],
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+        )
+        chunks = exports.stream(querysets, options['dataset'], options['format'], options['chunk_size'])
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if options['output']:
+                out.close()
@@ -0,0 +1,46 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.member_import import import_members, read_rows
+from core.models import Gym
+
+
+class Command(BaseCommand):
+    help = "Import members into a gym from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('gym_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension")
+        parser.add_argument('--chunk-size', type=int, default=settings.MEMBER_IMPORT_CHUNK_SIZE)
+        parser.add_argument('--workers', type=int, help="QR render processes, defaults to the CPU count")
+        parser.add_argument('--no-qr', action='store_true', help="Leave QR images to be rendered on first view")
+
+    def handle(self, *args, **options):
+        try:
+            gym = Gym.objects.select_related('system_plan').get(pk=options['gym_id'])
+        except Gym.DoesNotExist:
+            raise CommandError(f"Gym {options['gym_id']} does not exist")
+
+        fmt = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if fmt not in ('csv', 'jsonl'):
+            raise CommandError("Pass --format csv or --format jsonl")
+
+        def progress(report):
+            self.stdout.write(f"{report.processed} rows: {report.created} created, {report.failed} failed")
+
+        with open(options['path'], 'rb') as f:
+            report = import_members(
+                gym,
+                read_rows(f, fmt),
+                chunk_size=options['chunk_size'],
+                workers=options['workers'],
+                render_qr=not options['no_qr'],
+                progress=progress,
+            )
+
+        for row, message in report.errors:
+            self.stderr.write(f"Row {row}: {message}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {report.created} of {report.processed} members into {gym.name}."))
@@ -0,0 +1,18 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from core import ledger
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily financial ledger from invoices, visitors and expenses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gym', type=int, action='append', dest='gyms', help="Gym id (repeatable)")
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat)
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat)
+
+    def handle(self, *args, **options):
+        count = ledger.rebuild(options['gyms'], options['date_from'], options['date_to'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} ledger rows."))
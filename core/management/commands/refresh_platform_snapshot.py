@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import platform
+
+
+class Command(BaseCommand):
+    help = "Append a platform KPI snapshot for the system dashboard."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, help="Keep running, refreshing every N seconds")
+        parser.add_argument('--keep-days', type=int, default=settings.PLATFORM_SNAPSHOT_KEEP_DAYS,
+                            help="Thin older history to one snapshot per day")
+
+    def handle(self, *args, **options):
+        while True:
+            snapshot = platform.refresh()
+            pruned = platform.prune(options['keep_days']) if options['keep_days'] else 0
+            self.stdout.write(self.style.SUCCESS(
+                f"Snapshot at {snapshot.created_at:%Y-%m-%d %H:%M:%S}: {snapshot.active_gyms} active gyms, "
+                f"income {snapshot.total_income}, pruned {pruned}."
+            ))
+            if not options['every']:
+                break
+            time.sleep(options['every'])
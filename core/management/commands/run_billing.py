@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import billing
+
+
+class Command(BaseCommand):
+    help = "Issue renewal invoices to gyms expiring soon and extend gyms that have paid."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.BILLING_LEAD_DAYS,
+                            help="Invoice gyms expiring within this many days")
+
+    def handle(self, *args, **options):
+        report = billing.run(options['days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Issued {report.invoiced} renewal invoices, extended {report.extended} gyms."
+        ))
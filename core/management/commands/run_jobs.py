@@ -0,0 +1,57 @@
+import multiprocessing
+import signal
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _child(once):
+    # A no-op after fork, sets Django up under spawn; core is imported
+    # only after that
+    django.setup()
+    from core import jobs
+
+    # The parent turns Ctrl-C into SIGTERM, which lets the current job finish
+    stopping = []
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    jobs.work(once=once, should_stop=lambda: bool(stopping))
+
+
+class Command(BaseCommand):
+    help = "Run background job workers: queued jobs by priority, retries and the periodic schedule."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.JOB_WORKER_PROCESSES)
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due")
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            from core import jobs
+            jobs.work(once=options['once'])
+            return
+
+        # Children must not share the parent's database connections
+        connections.close_all()
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        workers = [
+            context.Process(target=_child, args=(options['once'],), name=f'job-worker-{index}')
+            for index in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} job workers.")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+            for worker in workers:
+                worker.join()
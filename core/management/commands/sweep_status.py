@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import status
+
+
+class Command(BaseCommand):
+    help = "Move members and gyms between the active, expiring, expired and exhausted states."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, help="Keep running, sweeping every N seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            report = status.sweep()
+            self.stdout.write(self.style.SUCCESS(
+                f"Updated {report.members} members and {report.gyms} gyms."
+            ))
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,193 @@
+"""
+Bulk member import from CSV or JSON Lines.
+
+Rows are streamed from the file and handled in chunks: each chunk is
+validated in memory, inserted with one ``bulk_create`` and committed on its
+own, so a bad row or chunk never rolls back what was already imported. QR
+images are pre-rendered into the disk cache by a process pool while later
+chunks are still being inserted.
+"""
+import csv
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import metrics, roster
+from .models import Member
+from .qr import cached_image, make_payload
+
+IMPORT_FIELDS = ('name', 'email', 'phone', 'gender', 'member_type', 'plan')
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.errors = []  # (row number, message)
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+    def as_dict(self, max_errors=100):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'failed': self.failed,
+            'errors': [{'row': row, 'message': message} for row, message in self.errors[:max_errors]],
+        }
+
+
+def read_rows(stream, fmt):
+    """Yield dicts from a binary or text CSV/JSONL stream without loading it whole."""
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+    elif fmt == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else {'__error__': 'Not a JSON object'}
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def _plan_lookup(gym):
+    plans = {}
+    for plan in gym.plans.all():
+        plans[str(plan.id)] = plan
+        plans.setdefault(plan.name.strip().lower(), plan)
+    return plans
+
+
+def _build_member(gym, plans, emails, row, today):
+    if '__error__' in row:
+        raise ValidationError(row['__error__'])
+
+    values = {field: str(row.get(field) or '').strip() for field in IMPORT_FIELDS}
+    email = values['email'].lower()
+    if email and email in emails:
+        raise ValidationError(f"Duplicate email '{values['email']}'")
+    plan = None
+    if values['plan']:
+        plan = plans.get(values['plan'].lower())
+        if plan is None:
+            raise ValidationError(f"Unknown plan '{values['plan']}'")
+
+    member = Member(
+        gym=gym,
+        name=values['name'],
+        email=values['email'] or None,
+        phone=values['phone'],
+        gender=values['gender'].lower(),
+        member_type=values['member_type'].lower() or 'individual',
+        plan=plan,
+        registration_date=today,
+    )
+    member.apply_plan_defaults(today)
+    member.status = member.current_status(today)
+    # gym and plan are already resolved, skip their per-row existence queries
+    member.full_clean(exclude=['gym', 'plan'], validate_unique=False, validate_constraints=False)
+    if email:
+        emails.add(email)
+    return member
+
+
+def _insert(members, report, numbers):
+    """Insert a chunk, falling back to row by row if the database rejects it."""
+    try:
+        with transaction.atomic():
+            return Member.objects.bulk_create(members)
+    except DatabaseError:
+        pass
+
+    created = []
+    for member, number in zip(members, numbers):
+        try:
+            with transaction.atomic():
+                created += Member.objects.bulk_create([member])
+        except DatabaseError as e:
+            report.errors.append((number, str(e)))
+    return created
+
+
+def _render_all(payloads):
+    for payload in payloads:
+        cached_image(payload)
+    return len(payloads)
+
+
+def import_members(gym, rows, chunk_size=None, workers=None, render_qr=True, progress=None):
+    """
+    Import member dicts into ``gym``; returns an ImportReport. ``progress`` is
+    called with the report after every chunk.
+    """
+    chunk_size = chunk_size or settings.MEMBER_IMPORT_CHUNK_SIZE
+    report = ImportReport()
+    plans = _plan_lookup(gym)
+    # A row is a duplicate if its email is already in the gym or earlier in the file
+    emails = {email.lower() for email in gym.members.exclude(email=None).values_list('email', flat=True)}
+    today = timezone.now().date()
+
+    room = None
+    if gym.system_plan:
+        room = max(gym.system_plan.member_limit - gym.members.count(), 0)
+
+    pool = ProcessPoolExecutor(max_workers=workers) if render_qr else None
+    renders = []
+    rows = iter(rows)
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+
+            members, numbers = [], []
+            for row in chunk:
+                report.processed += 1
+                if room is not None and len(members) >= room:
+                    report.errors.append((report.processed, 'Member limit reached'))
+                    continue
+                try:
+                    members.append(_build_member(gym, plans, emails, row, today))
+                    numbers.append(report.processed)
+                except ValidationError as e:
+                    report.errors.append((report.processed, '; '.join(e.messages)))
+
+            created = _insert(members, report, numbers) if members else []
+            if created:
+                for member in created:
+                    member.qr_payload = make_payload(gym.id, member.id)
+                Member.objects.bulk_update(created, ['qr_payload'])
+                # bulk_create skips post_save, so tell the check-in rosters directly
+                roster.touch(gym.id, [member.id for member in created])
+                metrics.invalidate(gym.id)
+                if pool:
+                    renders.append(pool.submit(_render_all, [member.qr_payload for member in created]))
+
+                report.created += len(created)
+                if room is not None:
+                    room -= len(created)
+
+            if progress:
+                progress(report)
+
+        for render in renders:
+            render.result()
+    finally:
+        if pool:
+            pool.shutdown()
+    return report
@@ -0,0 +1,110 @@
+"""
+Cached gym dashboard numbers.
+
+Each gym's metrics are cached under a key that includes the local date, so
+the date-dependent buckets (expiring, expired, today's attendance) roll over
+at midnight on their own. Writes to the underlying tables delete the gym's
+entry through the signals in ``core.signals``; bulk writes that skip signals
+call ``invalidate`` themselves. Income and expenses are read from the daily
+ledger (``core.ledger``). Notification lists are cached by ``core.inbox``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import AttendanceDaily, LedgerDaily, Member
+
+STATS_KEYS = {'hits': 'gym-metrics:stats:hits', 'misses': 'gym-metrics:stats:misses'}
+
+
+def _key(gym_id, today):
+    return f'gym-metrics:{gym_id}:{today.isoformat()}'
+
+
+def _count(stat, amount):
+    if amount:
+        key = STATS_KEYS[stat]
+        if not cache.add(key, amount, timeout=None):
+            try:
+                cache.incr(key, amount)
+            except ValueError:  # Evicted in between
+                cache.add(key, amount, timeout=None)
+
+
+def compute(gym_ids, today):
+    """Dashboard numbers for ``gym_ids``, one grouped query per table."""
+    member_counts = {
+        row['gym_id']: row for row in Member.objects.filter(gym_id__in=gym_ids).values('gym_id').annotate(
+            active=Count('id', filter=Q(status__in=Member.ACTIVE_STATUSES)),
+            expiring=Count('id', filter=Q(status='expiring')),
+            expired=Count('id', filter=Q(status='expired')),
+        ).order_by()
+    }
+    attendance = {
+        row.gym_id: row for row in AttendanceDaily.objects.filter(gym_id__in=gym_ids, date=today)
+    }
+    # The ledger leaves out the gym's own subscription invoices, which are
+    # the platform's income, and counts visitor fees
+    totals = {
+        row['gym_id']: row for row in LedgerDaily.objects.filter(gym_id__in=gym_ids).values('gym_id').annotate(
+            income=Sum('amount', filter=Q(kind='income')),
+            expenses=Sum('amount', filter=Q(kind='expense')),
+        ).order_by()
+    }
+    recent_members = {gym_id: [] for gym_id in gym_ids}
+    for member in Member.objects.filter(gym_id__in=gym_ids).annotate(
+        rank=Window(RowNumber(), partition_by=F('gym_id'), order_by=[F('registration_date').desc(), F('id').desc()])
+    ).filter(rank__lte=5).order_by('gym_id', 'rank'):
+        recent_members[member.gym_id].append(member)
+
+    metrics = {}
+    for gym_id in gym_ids:
+        counts = member_counts.get(gym_id, {})
+        day = attendance.get(gym_id)
+        gym_income = totals.get(gym_id, {}).get('income') or 0
+        gym_expenses = totals.get(gym_id, {}).get('expenses') or 0
+        metrics[gym_id] = {
+            'active_members_count': counts.get('active', 0),
+            'expiring_members_count': counts.get('expiring', 0),
+            'expired_members_count': counts.get('expired', 0),
+            'member_attendance': day.member_count if day else 0,
+            'staff_attendance': day.staff_count if day else 0,
+            'income': gym_income,
+            'expenses': gym_expenses,
+            'net_profit': gym_income - gym_expenses,
+            'recent_members': recent_members[gym_id],
+        }
+    return metrics
+
+
+def get_metrics(gym_ids, today=None):
+    """``{gym_id: metrics}``, computing only the gyms missing from the cache."""
+    today = today or timezone.localdate()
+    keys = {_key(gym_id, today): gym_id for gym_id in gym_ids}
+    cached = cache.get_many(keys)
+    metrics = {keys[key]: value for key, value in cached.items()}
+
+    missing = [gym_id for gym_id in gym_ids if gym_id not in metrics]
+    if missing:
+        fresh = compute(missing, today)
+        cache.set_many({_key(gym_id, today): value for gym_id, value in fresh.items()},
+                       timeout=settings.DASHBOARD_METRICS_TIMEOUT)
+        metrics.update(fresh)
+
+    _count('hits', len(cached))
+    _count('misses', len(missing))
+    return metrics
+
+
+def invalidate(gym_id):
+    if gym_id is not None:
+        cache.delete(_key(gym_id, timezone.localdate()))
+
+
+def stats():
+    hits = cache.get(STATS_KEYS['hits'], 0)
+    misses = cache.get(STATS_KEYS['misses'], 0)
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / lookups, 3) if lookups else None}
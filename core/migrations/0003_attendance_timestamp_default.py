@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_systemsetting'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendance',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_attendance_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gym',
+            name='roster_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='roster_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['gym', 'roster_version'], name='core_member_gym_id_057e0f_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    Attendance = apps.get_model('core', 'Attendance')
+    AttendanceDaily = apps.get_model('core', 'AttendanceDaily')
+    rows = Attendance.objects.annotate(
+        day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone())
+    ).values('gym_id', 'day').annotate(
+        member_count=Count('id', filter=Q(attendance_type='member')),
+        staff_count=Count('id', filter=Q(attendance_type='staff')),
+        qr_count=Count('id', filter=Q(method='qr')),
+        manual_count=Count('id', filter=Q(method='manual')),
+        unique_members=Count('member_id', distinct=True),
+    ).order_by()
+    AttendanceDaily.objects.bulk_create(
+        AttendanceDaily(gym_id=row.pop('gym_id'), date=row.pop('day'), **row) for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_member_roster'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('member_count', models.PositiveIntegerField(default=0)),
+                ('staff_count', models.PositiveIntegerField(default=0)),
+                ('qr_count', models.PositiveIntegerField(default=0)),
+                ('manual_count', models.PositiveIntegerField(default=0)),
+                ('unique_members', models.PositiveIntegerField(default=0)),
+                ('gym', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_rollups', to='core.gym')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('gym', 'date'), name='unique_attendance_daily')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_attendancedaily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gym_id', models.BigIntegerField()),
+                ('attendance_type', models.CharField(choices=[('member', 'Member'), ('staff', 'Staff')], max_length=10)),
+                ('member_id', models.BigIntegerField(blank=True, null=True)),
+                ('staff_id', models.BigIntegerField(blank=True, null=True)),
+                ('timestamp', models.DateTimeField()),
+                ('method', models.CharField(choices=[('qr', 'QR Code'), ('manual', 'Manual')], max_length=20)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['member_id', 'timestamp'], name='core_attend_member__5ae1df_idx'), models.Index(fields=['gym_id', 'timestamp'], name='core_attend_gym_id_d5de97_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_attendancearchive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['gym', 'timestamp'], name='core_attend_gym_id_a828b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['member', 'timestamp'], name='core_attend_member__409cc7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['staff', 'timestamp'], name='core_attend_staff_i_16eaf4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['gym', 'date'], name='core_expens_gym_id_9c6dc0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gym',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['expiry_date'], name='core_gym_active_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gym',
+            index=models.Index(fields=['expiry_date'], name='core_gym_expiry__6f1e58_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gym',
+            index=models.Index(fields=['registration_date'], name='core_gym_registr_474f17_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['gym', 'date'], name='core_invoic_gym_id_ce3912_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('is_paid', True)), fields=['gym', 'date'], name='core_invoice_gym_paid_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('is_paid', True)), fields=['date'], name='core_invoice_paid_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['gym', 'expiry_date'], name='core_member_active_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['gym', 'expiry_date'], name='core_member_gym_id_ff9afa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['gym', 'registration_date'], name='core_member_gym_id_9762f4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'created_at'], name='core_notifi_user_id_7862c3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['user'], name='core_notification_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitor',
+            index=models.Index(fields=['gym', 'date'], name='core_visito_gym_id_f29c54_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gym',
+            name='checkin_debounce_minutes',
+            field=models.PositiveSmallIntegerField(default=10),
+        ),
+    ]
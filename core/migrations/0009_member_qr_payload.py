@@ -0,0 +1,49 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:36
+
+import base64
+
+from django.db import migrations, models
+from django.utils.crypto import salted_hmac
+
+BATCH_SIZE = 500
+
+
+def make_payload(gym_id, member_id):
+    # Version 1 of core.qr.make_payload, frozen here
+    body = f"GM1.{gym_id}.{member_id}"
+    digest = salted_hmac('core.qr.payload', body, algorithm='sha256').digest()
+    return f"{body}.{base64.urlsafe_b64encode(digest[:12]).decode()}"
+
+
+def backfill_payloads(apps, schema_editor):
+    Member = apps.get_model('core', 'Member')
+    last_id = 0
+    while True:
+        # Keyed on id rather than one open cursor, so the updates cannot disturb the read
+        members = list(Member.objects.filter(pk__gt=last_id).order_by('pk').only('id', 'gym_id')[:BATCH_SIZE])
+        if not members:
+            return
+        for member in members:
+            member.qr_payload = make_payload(member.gym_id, member.id)
+        Member.objects.bulk_update(members, ['qr_payload'])
+        last_id = members[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_gym_checkin_debounce'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='qr_payload',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(backfill_payloads, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='member',
+            name='qr_code',
+        ),
+    ]
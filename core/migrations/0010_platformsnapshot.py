@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_member_qr_payload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('total_gyms', models.PositiveIntegerField(default=0)),
+                ('active_gyms', models.PositiveIntegerField(default=0)),
+                ('expiring_gyms', models.PositiveIntegerField(default=0)),
+                ('expired_gyms', models.PositiveIntegerField(default=0)),
+                ('total_income', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_expenses', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'get_latest_by': 'created_at',
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# Description prefixes written before invoices had a type
+INVOICE_TYPE_PREFIXES = [
+    ('Initial subscription for ', 'subscription'),
+    ('Renewal subscription for ', 'subscription_renewal'),
+    ('Membership for ', 'membership'),
+    ('Renewal for ', 'membership_renewal'),
+]
+GYM_INCOME_TYPES = ('membership', 'membership_renewal', 'other')
+
+
+def backfill_invoice_types(apps, schema_editor):
+    Invoice = apps.get_model('core', 'Invoice')
+    for prefix, invoice_type in INVOICE_TYPE_PREFIXES:
+        Invoice.objects.filter(description__startswith=prefix).update(invoice_type=invoice_type)
+
+
+def backfill_ledger(apps, schema_editor):
+    Invoice = apps.get_model('core', 'Invoice')
+    Visitor = apps.get_model('core', 'Visitor')
+    Expense = apps.get_model('core', 'Expense')
+    LedgerDaily = apps.get_model('core', 'LedgerDaily')
+    tz = timezone.get_current_timezone()
+
+    grouped = [
+        (Invoice.objects.filter(is_paid=True, invoice_type__in=GYM_INCOME_TYPES).annotate(
+            day=TruncDate('date', tzinfo=tz), source=F('invoice_type'), method=F('payment_method__name'),
+        ), 'income'),
+        (Visitor.objects.annotate(
+            day=TruncDate('date', tzinfo=tz), source=Value('visitor'), method=F('payment_method__name'),
+        ), 'income'),
+        (Expense.objects.filter(gym__isnull=False).annotate(
+            day=F('date'), source=F('category'), method=Value(''),
+        ), 'expense'),
+    ]
+    for queryset, kind in grouped:
+        rows = queryset.values('gym_id', 'day', 'source', 'method').annotate(
+            total=Sum('amount'), count=Count('id'),
+        ).order_by()
+        LedgerDaily.objects.bulk_create(
+            LedgerDaily(gym_id=row['gym_id'], date=row['day'], kind=kind, source=row['source'],
+                        payment_method=row['method'] or '', amount=row['total'], entries=row['count'])
+            for row in rows
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_platformsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='invoice_type',
+            field=models.CharField(choices=[('subscription', 'Gym Subscription'), ('subscription_renewal', 'Gym Subscription Renewal'), ('membership', 'Membership'), ('membership_renewal', 'Membership Renewal'), ('other', 'Other')], default='other', max_length=30),
+        ),
+        migrations.CreateModel(
+            name='LedgerDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('kind', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=10)),
+                ('source', models.CharField(blank=True, max_length=50)),
+                ('payment_method', models.CharField(blank=True, max_length=50)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('entries', models.PositiveIntegerField(default=0)),
+                ('gym', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to='core.gym')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('gym', 'date', 'kind', 'source', 'payment_method'), name='unique_ledger_daily')],
+            },
+        ),
+        migrations.RunPython(backfill_invoice_types, migrations.RunPython.noop),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='billing_period',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(condition=models.Q(('billing_period__isnull', False)), fields=('gym', 'invoice_type', 'billing_period'), name='unique_invoice_billing_period'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:52
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def backfill_status(apps, schema_editor):
+    Gym = apps.get_model('core', 'Gym')
+    Member = apps.get_model('core', 'Member')
+    today = timezone.localdate()
+    # First match wins, as in core.status
+    states = [
+        (Member, [
+            ('inactive', Q(is_active=False)),
+            ('exhausted', Q(sessions_remaining=0)),
+            ('expired', Q(expiry_date__lt=today)),
+            ('expiring', Q(expiry_date__lte=today + timedelta(days=7))),
+            ('active', Q()),
+        ]),
+        (Gym, [
+            ('inactive', Q(is_active=False)),
+            ('expired', Q(expiry_date__lt=today)),
+            ('expiring', Q(expiry_date__lte=today + timedelta(days=30))),
+            ('active', Q()),
+        ]),
+    ]
+    for model, model_states in states:
+        earlier = Q()
+        for status, condition in model_states:
+            model.objects.filter(condition & ~earlier).update(status=status)
+            earlier |= condition
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_invoice_billing_period'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gym',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('expiring', 'Expiring'), ('expired', 'Expired'), ('inactive', 'Inactive')], default='inactive', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('expiring', 'Expiring'), ('expired', 'Expired'), ('exhausted', 'Sessions used up'), ('inactive', 'Inactive')], default='active', editable=False, max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='gym',
+            index=models.Index(fields=['status'], name='core_gym_status_18b25f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['gym', 'status'], name='core_member_gym_id_d0961d_idx'),
+        ),
+        migrations.RunPython(backfill_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='checked_out_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
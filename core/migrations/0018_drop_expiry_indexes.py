@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_attendance_checked_out_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='gym',
+            name='core_gym_active_expiry_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='gym',
+            name='core_gym_expiry__6f1e58_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='member',
+            name='core_member_active_expiry_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='member',
+            name='core_member_gym_id_ff9afa_idx',
+        ),
+    ]
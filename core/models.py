@@ -3,9 +3,16 @@ from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from datetime import timedelta
 import uuid
-import qrcode
-from io import BytesIO
-from django.core.files import File
+
+from .qr import make_payload
+
+
+def _save_status_with(kwargs, fields):
+    """Add ``status`` to a partial save that touches the fields it is derived from."""
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not fields.isdisjoint(update_fields):
+        kwargs['update_fields'] = {*update_fields, 'status'}
+
 
 class User(AbstractUser):
     ROLE_CHOICES = (
@@ -37,6 +44,14 @@ class SystemPlan(models.Model):
         return f"{self.name} ({self.plan_type})"
 
 class Gym(models.Model):
+    STATUSES = (
+        ('active', 'Active'),
+        ('expiring', 'Expiring'),
+        ('expired', 'Expired'),
+        ('inactive', 'Inactive'),
+    )
+    ACTIVE_STATUSES = ('active', 'expiring')
+    EXPIRING_DAYS = 30
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='gyms')
     name = models.CharField(max_length=100)
     address = models.TextField()
@@ -47,10 +62,31 @@ class Gym(models.Model):
     expiry_date = models.DateField()
     is_active = models.BooleanField(default=False)
     is_approved = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUSES, default='inactive', editable=False)  # Kept current by core.status
+    roster_version = models.PositiveBigIntegerField(default=0, editable=False)  # Bumped on member changes
+    checkin_debounce_minutes = models.PositiveSmallIntegerField(default=10)  # Repeat scans inside this window are ignored
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status']),
+            models.Index(fields=['registration_date']),
+        ]
+
+    def current_status(self, today=None):
+        today = today or timezone.localdate()
+        if not self.is_active:
+            return 'inactive'
+        if self.expiry_date < today:
+            return 'expired'
+        if self.expiry_date <= today + timedelta(days=self.EXPIRING_DAYS):
+            return 'expiring'
+        return 'active'
 
     def save(self, *args, **kwargs):
         if not self.pk:  # New instance
             self.expiry_date = timezone.now().date() + timedelta(days=self.system_plan.duration_days)
+        self.status = self.current_status()
+        _save_status_with(kwargs, {'is_active', 'expiry_date'})
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -84,6 +120,15 @@ class Member(models.Model):
         ('individual', 'Individual'),
         ('group', 'Group'),
     )
+    STATUSES = (
+        ('active', 'Active'),
+        ('expiring', 'Expiring'),
+        ('expired', 'Expired'),
+        ('exhausted', 'Sessions used up'),
+        ('inactive', 'Inactive'),
+    )
+    ACTIVE_STATUSES = ('active', 'expiring')
+    EXPIRING_DAYS = 7
     gym = models.ForeignKey(Gym, on_delete=models.CASCADE, related_name='members')
     name = models.CharField(max_length=100)
     email = models.EmailField(blank=True, null=True)
@@ -95,41 +140,52 @@ class Member(models.Model):
     expiry_date = models.DateField(null=True, blank=True)
     sessions_remaining = models.PositiveIntegerField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
-    qr_code = models.ImageField(upload_to='qrcodes/', blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default='active', editable=False)  # Kept current by core.status
+    qr_payload = models.CharField(max_length=64, blank=True, editable=False)  # Rendered on demand by core.views.member_qr
+    roster_version = models.PositiveBigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['gym', 'status']),
+            models.Index(fields=['gym', 'roster_version']),
+            models.Index(fields=['gym', 'registration_date']),
+        ]
+
+    def apply_plan_defaults(self, today=None):
+        """Set the expiry date or session count a new member gets from their plan."""
+        # Set expiration if duration-based plan
+        if self.plan and 'duration' in self.plan.plan_type:
+            self.expiry_date = (today or timezone.now().date()) + timedelta(days=self.plan.duration_days)
+        # Set session count if session-based plan
+        if self.plan and 'session' in self.plan.plan_type:
+            self.sessions_remaining = self.plan.session_count
+
+    def current_status(self, today=None):
+        today = today or timezone.localdate()
+        if not self.is_active:
+            return 'inactive'
+        if self.sessions_remaining == 0:
+            return 'exhausted'
+        if self.expiry_date and self.expiry_date < today:
+            return 'expired'
+        if self.expiry_date and self.expiry_date <= today + timedelta(days=self.EXPIRING_DAYS):
+            return 'expiring'
+        return 'active'
 
     def save(self, *args, **kwargs):
-        if not self.pk:  # New member
-            # Generate QR code
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            data = {
-                'member_id': self.id,
-                'gym_id': self.gym.id,
-                'name': self.name,
-                'plan': self.plan.name if self.plan else 'None'
-            }
-            qr.add_data(str(data))
-            qr.make(fit=True)
-            img = qr.make_image(fill='black', back_color='white')
-            
-            buffer = BytesIO()
-            img.save(buffer, format='PNG')
-            file_name = f'qr_{self.id}.png'
-            self.qr_code.save(file_name, File(buffer), save=False)
-            
-            # Set expiration if duration-based plan
-            if self.plan and 'duration' in self.plan.plan_type:
-                self.expiry_date = timezone.now().date() + timedelta(days=self.plan.duration_days)
-            # Set session count if session-based plan
-            if self.plan and 'session' in self.plan.plan_type:
-                self.sessions_remaining = self.plan.session_count
-                
+        is_new = not self.pk
+        if is_new:  # New member
+            self.apply_plan_defaults()
+        self.status = self.current_status()
+        _save_status_with(kwargs, {'is_active', 'expiry_date', 'sessions_remaining'})
+
         super().save(*args, **kwargs)
 
+        if is_new:
+            # The signed QR payload needs the id, images are rendered lazily
+            self.qr_payload = make_payload(self.gym_id, self.id)
+            super().save(update_fields=['qr_payload'])
+
     def __str__(self):
         return self.name
 
@@ -143,14 +199,62 @@ class Attendance(models.Model):
     attendance_type = models.CharField(max_length=10, choices=ATTENDANCE_TYPES)
     member = models.ForeignKey(Member, on_delete=models.CASCADE, null=True, blank=True)
     staff = models.ForeignKey('Staff', on_delete=models.CASCADE, null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     method = models.CharField(max_length=20, choices=(
         ('qr', 'QR Code'),
         ('manual', 'Manual'),
     ))
+    checked_out_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['gym', 'timestamp']),
+            models.Index(fields=['member', 'timestamp']),
+            models.Index(fields=['staff', 'timestamp']),
+        ]
 
     def __str__(self):
         return f"{self.member or self.staff} - {self.timestamp}"
+
+
+class AttendanceArchive(models.Model):
+    # Raw attendance moved out of Attendance by core.retention; plain ids so
+    # history survives without foreign keys into the live tables
+    gym_id = models.BigIntegerField()
+    attendance_type = models.CharField(max_length=10, choices=Attendance.ATTENDANCE_TYPES)
+    member_id = models.BigIntegerField(null=True, blank=True)
+    staff_id = models.BigIntegerField(null=True, blank=True)
+    timestamp = models.DateTimeField()
+    method = models.CharField(max_length=20, choices=Attendance._meta.get_field('method').choices)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['member_id', 'timestamp']),
+            models.Index(fields=['gym_id', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.member_id or self.staff_id} - {self.timestamp}"
+
+
+class AttendanceDaily(models.Model):
+    # Per gym per local day rollup of Attendance, maintained by core.rollups
+    gym = models.ForeignKey(Gym, on_delete=models.CASCADE, related_name='attendance_rollups')
+    date = models.DateField()
+    member_count = models.PositiveIntegerField(default=0)
+    staff_count = models.PositiveIntegerField(default=0)
+    qr_count = models.PositiveIntegerField(default=0)
+    manual_count = models.PositiveIntegerField(default=0)
+    unique_members = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['gym', 'date'], name='unique_attendance_daily'),
+        ]
+
+    def __str__(self):
+        return f"{self.gym} - {self.date}"
+
 class PaymentMethod(models.Model):
     METHOD_CHOICES = (
         ('cash', 'Cash'),
@@ -166,14 +270,37 @@ class PaymentMethod(models.Model):
 
 # Update Invoice model to use PaymentMethod
 class Invoice(models.Model):
+    INVOICE_TYPES = (
+        ('subscription', 'Gym Subscription'),
+        ('subscription_renewal', 'Gym Subscription Renewal'),
+        ('membership', 'Membership'),
+        ('membership_renewal', 'Membership Renewal'),
+        ('other', 'Other'),
+    )
     gym = models.ForeignKey(Gym, on_delete=models.CASCADE, related_name='invoices')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_method = models.ForeignKey(PaymentMethod, on_delete=models.PROTECT)
     date = models.DateTimeField(auto_now_add=True)
     is_paid = models.BooleanField(default=False)
+    invoice_type = models.CharField(max_length=30, choices=INVOICE_TYPES, default='other')
+    billing_period = models.DateField(null=True, blank=True)  # Gym expiry date a renewal invoice extends
     description = models.TextField(blank=True)
     transaction_id = models.CharField(max_length=100, blank=True)  # For digital payments
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['gym', 'invoice_type', 'billing_period'],
+                condition=models.Q(billing_period__isnull=False),
+                name='unique_invoice_billing_period',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['gym', 'date']),
+            models.Index(fields=['gym', 'date'], condition=models.Q(is_paid=True), name='core_invoice_gym_paid_date_idx'),
+            models.Index(fields=['date'], condition=models.Q(is_paid=True), name='core_invoice_paid_date_idx'),
+        ]
+
     def __str__(self):
         return f"Invoice #{self.id} - {self.gym.name}"
 
@@ -184,6 +311,11 @@ class Visitor(models.Model):
     payment_method = models.ForeignKey(PaymentMethod, on_delete=models.PROTECT)
     date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['gym', 'date']),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.date}"
 class Staff(models.Model):
@@ -206,9 +338,38 @@ class Expense(models.Model):
     date = models.DateField(auto_now_add=True)
     category = models.CharField(max_length=50, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['gym', 'date']),
+        ]
+
     def __str__(self):
         return self.description
 
+class LedgerDaily(models.Model):
+    # Per gym per local day money in and out, maintained by core.ledger
+    KINDS = (
+        ('income', 'Income'),
+        ('expense', 'Expense'),
+    )
+    gym = models.ForeignKey(Gym, on_delete=models.CASCADE, related_name='ledger')
+    date = models.DateField()
+    kind = models.CharField(max_length=10, choices=KINDS)
+    source = models.CharField(max_length=50, blank=True)  # Income source or expense category
+    payment_method = models.CharField(max_length=50, blank=True)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    entries = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['gym', 'date', 'kind', 'source', 'payment_method'], name='unique_ledger_daily'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.gym} - {self.date} {self.kind} {self.source}"
+
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     message = models.TextField()
@@ -216,10 +377,122 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     link = models.CharField(max_length=200, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['user'], condition=models.Q(is_read=False), name='core_notification_unread_idx'),
+        ]
+
     def __str__(self):
         return f"Notification for {self.user.username}"
+
+
+class OutboundEmail(models.Model):
+    """A queued email, delivered by ``core.outbox`` outside the request."""
+    STATUSES = (
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)  # Blank uses DEFAULT_FROM_EMAIL
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)  # Also the lease while a worker holds it
+    claim = models.CharField(max_length=32, blank=True, editable=False)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], condition=models.Q(status='queued'), name='core_outbox_due_idx'),
+            models.Index(fields=['claim']),
+            models.Index(fields=['sent_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to}"
+
+
+class Job(models.Model):
+    """A unit of background work, run by the ``run_jobs`` workers (see ``core.jobs``)."""
+    STATUSES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)  # Keyword arguments for the task
+    priority = models.SmallIntegerField(default=0)  # Higher runs first
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    run_at = models.DateTimeField(default=timezone.now)  # Lease expiry while running
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    claim = models.CharField(max_length=32, blank=True, editable=False)
+    dedupe_key = models.CharField(max_length=150, null=True, blank=True, unique=True)  # One job per schedule slot
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-priority', 'run_at'], condition=models.Q(status__in=['queued', 'running']),
+                         name='core_job_due_idx'),
+            models.Index(fields=['claim']),
+            models.Index(fields=['status', 'finished_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
+
+
+class Broadcast(models.Model):
+    """One message for every user with a role; read state lives in BroadcastReceipt."""
+    audience = models.CharField(max_length=20, choices=User.ROLE_CHOICES, blank=True)  # Blank reaches everyone
+    message = models.TextField()
+    link = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Broadcast to {self.get_audience_display() or 'everyone'}"
+
+
+class BroadcastReceipt(models.Model):
+    broadcast = models.ForeignKey(Broadcast, on_delete=models.CASCADE, related_name='receipts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='broadcast_receipts')
+    read_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'broadcast'], name='unique_broadcast_receipt'),
+        ]
     
 
+class PlatformSnapshot(models.Model):
+    # Platform-wide KPIs for system_dashboard, appended by core.platform
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    total_gyms = models.PositiveIntegerField(default=0)
+    active_gyms = models.PositiveIntegerField(default=0)
+    expiring_gyms = models.PositiveIntegerField(default=0)
+    expired_gyms = models.PositiveIntegerField(default=0)
+    total_income = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_expenses = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        get_latest_by = 'created_at'
+
+    @property
+    def net_profit(self):
+        return self.total_income - self.total_expenses
+
+    def __str__(self):
+        return f"Platform snapshot {self.created_at:%Y-%m-%d %H:%M}"
+
+
 # models.py
 class SystemSetting(models.Model):
     key = models.CharField(max_length=100, unique=True)
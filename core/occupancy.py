@@ -0,0 +1,116 @@
+"""
+Live per-gym occupancy kept in memory.
+
+Check-ins add a visit, check-outs end it, and a visit with no check-out is
+assumed over after ``OCCUPANCY_VISIT_MINUTES``. A check-out is stamped on the
+visit's Attendance rows (``checked_out_at``). Each worker only sees its own
+check-ins and check-outs as they happen, so the counter is re-seeded from the
+last visit window of Attendance every ``OCCUPANCY_RESYNC_SECONDS``. That is
+one query per gym per worker per interval, however many dashboards watch.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Attendance
+
+
+def _visitor_key(attendance_type, member_id, staff_id):
+    return (attendance_type, member_id if attendance_type == 'member' else staff_id)
+
+
+class GymOccupancy:
+    def __init__(self, gym_id):
+        self.gym_id = gym_id
+        self.visits = {}  # visitor key -> latest check-in time
+        self.checkouts = {}  # visitor key -> latest check-out time
+        self.version = 0
+        self.seeded_at = None
+        self.lock = threading.Lock()
+
+    def _seed(self):
+        since = timezone.now() - timedelta(minutes=settings.OCCUPANCY_VISIT_MINUTES)
+        rows = Attendance.objects.filter(gym_id=self.gym_id, timestamp__gte=since).values_list(
+            'attendance_type', 'member_id', 'staff_id', 'timestamp', 'checked_out_at'
+        )
+        visits, checkouts = {}, {}
+        for attendance_type, member_id, staff_id, timestamp, checked_out_at in rows:
+            key = _visitor_key(attendance_type, member_id, staff_id)
+            visits[key] = max(timestamp, visits.get(key, timestamp))
+            if checked_out_at:
+                checkouts[key] = max(checked_out_at, checkouts.get(key, checked_out_at))
+
+        with self.lock:
+            self.visits = visits
+            self.checkouts = checkouts
+            self.seeded_at = time.monotonic()
+            self.version += 1
+
+    def resync_if_due(self):
+        if self.seeded_at is None or time.monotonic() - self.seeded_at >= settings.OCCUPANCY_RESYNC_SECONDS:
+            self._seed()
+
+    def check_in(self, key, at):
+        with self.lock:
+            if key not in self.visits or at > self.visits[key]:
+                self.visits[key] = at
+                self.version += 1
+
+    def check_out(self, key, at):
+        with self.lock:
+            self.checkouts[key] = at
+            self.version += 1
+
+    def count(self):
+        since = timezone.now() - timedelta(minutes=settings.OCCUPANCY_VISIT_MINUTES)
+        with self.lock:
+            return sum(
+                1 for key, started in self.visits.items()
+                if started >= since and started > self.checkouts.get(key, since)
+            )
+
+
+_gyms = {}
+_gyms_lock = threading.Lock()
+
+
+def get_tracker(gym_id):
+    """The gym's in-memory tracker, without touching the database."""
+    occupancy = _gyms.get(gym_id)
+    if occupancy is None:
+        with _gyms_lock:
+            occupancy = _gyms.setdefault(gym_id, GymOccupancy(gym_id))
+    return occupancy
+
+
+def get_occupancy(gym_id):
+    occupancy = get_tracker(gym_id)
+    occupancy.resync_if_due()
+    return occupancy
+
+
+def record(rows):
+    """Feed newly saved Attendance rows into the counters of gyms being watched."""
+    for row in rows:
+        occupancy = _gyms.get(row.gym_id)
+        if occupancy is not None:
+            occupancy.check_in(_visitor_key(row.attendance_type, row.member_id, row.staff_id), row.timestamp)
+
+
+def check_out(gym_id, attendance_type, visitor_id):
+    """End the visitor's open visit, in the database so every worker sees it at its next re-seed."""
+    now = timezone.now()
+    since = now - timedelta(minutes=settings.OCCUPANCY_VISIT_MINUTES)
+    Attendance.objects.filter(
+        gym_id=gym_id, attendance_type=attendance_type, timestamp__gte=since, checked_out_at__isnull=True,
+        **{f'{attendance_type}_id': visitor_id},
+    ).update(checked_out_at=now)
+    get_occupancy(gym_id).check_out(_visitor_key(attendance_type, visitor_id, visitor_id), now)
+
+
+def snapshot(gym_id):
+    occupancy = get_occupancy(gym_id)
+    return {'gym_id': gym_id, 'occupancy': occupancy.count(), 'version': occupancy.version}
@@ -0,0 +1,110 @@
+"""
+Email outbox (``OutboundEmail``).
+
+Views queue messages with ``enqueue``/``enqueue_many`` and return at once.
+``deliver`` claims a batch of due messages by stamping them with a claim
+token in one UPDATE, so concurrent workers never pick up the same row, and
+sends the batch over one connection from ``get_connection``. A claim also
+pushes ``next_attempt_at`` out by ``EMAIL_OUTBOX_LEASE_SECONDS``, so mail
+held by a worker that died goes out again once the lease runs out. Failures
+back off exponentially up to ``EMAIL_OUTBOX_MAX_ATTEMPTS``, and sends across
+all workers are capped at ``EMAIL_OUTBOX_RATE_PER_MINUTE``.
+"""
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+
+@dataclass
+class DeliveryReport:
+    sent: int = 0
+    retrying: int = 0
+    failed: int = 0
+
+
+def enqueue(to, subject, body, from_email=''):
+    return OutboundEmail.objects.create(to=to, subject=subject, body=body, from_email=from_email)
+
+
+def enqueue_many(messages):
+    """Queue ``(to, subject, body)`` tuples with one insert."""
+    return OutboundEmail.objects.bulk_create(
+        OutboundEmail(to=to, subject=subject, body=body) for to, subject, body in messages
+    )
+
+
+def _allowance(now):
+    sent = OutboundEmail.objects.filter(sent_at__gt=now - timedelta(minutes=1)).count()
+    return max(settings.EMAIL_OUTBOX_RATE_PER_MINUTE - sent, 0)
+
+
+def claim(limit, now=None):
+    """Lease up to ``limit`` due messages to this worker and return them."""
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    due = OutboundEmail.objects.filter(status='queued', next_attempt_at__lte=now).order_by('next_attempt_at', 'id')
+    # Rows another worker claimed in between fail the next_attempt_at check
+    OutboundEmail.objects.filter(
+        pk__in=list(due.values_list('pk', flat=True)[:limit]), status='queued', next_attempt_at__lte=now,
+    ).update(claim=token, next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS))
+    return list(OutboundEmail.objects.filter(claim=token).order_by('id'))
+
+
+def _backoff(attempts):
+    return timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1))
+
+
+def deliver(batch_size=None, backend=None):
+    """Send one batch over a single connection."""
+    now = timezone.now()
+    limit = min(batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE, _allowance(now))
+    report = DeliveryReport()
+    emails = claim(limit, now) if limit else []
+    if not emails:
+        return report
+
+    sent, failed = [], []
+    connection = get_connection(backend, fail_silently=False)
+    try:
+        connection.open()
+        for email in emails:
+            message = EmailMessage(
+                email.subject, email.body, email.from_email or settings.DEFAULT_FROM_EMAIL, [email.to],
+                connection=connection,
+            )
+            try:
+                # One message per call so a refused recipient only fails its own row
+                connection.send_messages([message])
+            except Exception as exc:
+                email.last_error = f"{type(exc).__name__}: {exc}"
+                failed.append(email)
+            else:
+                sent.append(email.pk)
+    except Exception as exc:  # Could not connect at all
+        failed = [email for email in emails if email.pk not in sent]
+        for email in failed:
+            email.last_error = f"{type(exc).__name__}: {exc}"
+    finally:
+        connection.close()
+
+    finished = timezone.now()
+    if sent:
+        OutboundEmail.objects.filter(pk__in=sent).update(status='sent', sent_at=finished, claim='', last_error='')
+    for email in failed:
+        email.attempts += 1
+        email.claim = ''
+        if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            email.status = 'failed'
+            report.failed += 1
+        else:
+            email.next_attempt_at = finished + _backoff(email.attempts)
+            report.retrying += 1
+    OutboundEmail.objects.bulk_update(failed, ['attempts', 'claim', 'status', 'next_attempt_at', 'last_error'])
+    report.sent = len(sent)
+    return report
@@ -0,0 +1,70 @@
+"""
+Platform KPI snapshots (``PlatformSnapshot``) for the system dashboard.
+
+``refresh`` appends a new row from three aggregate queries; rows are kept as
+history for trend charts. Writes to gyms, invoices and expenses only mark the
+latest snapshot stale (see ``core.signals``), and ``latest`` refreshes a stale
+or previous-day snapshot at most once per ``PLATFORM_SNAPSHOT_MIN_INTERVAL``.
+The ``refresh_platform_snapshot`` command keeps it current in the background.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Expense, Gym, Invoice, PlatformSnapshot
+
+STALE_KEY = 'platform-snapshot:stale'
+
+
+def refresh():
+    gyms = Gym.objects.aggregate(
+        total_gyms=Count('id'),
+        active_gyms=Count('id', filter=Q(status__in=Gym.ACTIVE_STATUSES)),
+        expiring_gyms=Count('id', filter=Q(status='expiring')),
+        expired_gyms=Count('id', filter=Q(status='expired')),
+    )
+    income = Invoice.objects.filter(is_paid=True).aggregate(total=Sum('amount'))['total'] or 0
+    # Platform expenses are the ones not booked to a gym
+    expenses = Expense.objects.filter(gym__isnull=True).aggregate(total=Sum('amount'))['total'] or 0
+
+    cache.delete(STALE_KEY)
+    return PlatformSnapshot.objects.create(total_income=income, total_expenses=expenses, **gyms)
+
+
+def mark_stale():
+    cache.set(STALE_KEY, True, timeout=None)
+
+
+def latest():
+    """The newest snapshot, refreshed first if it is out of date."""
+    snapshot = PlatformSnapshot.objects.order_by('-created_at').first()
+    if snapshot is None:
+        return refresh()
+
+    age = timezone.now() - snapshot.created_at
+    out_of_date = cache.get(STALE_KEY) or timezone.localdate(snapshot.created_at) != timezone.localdate()
+    if out_of_date and age.total_seconds() >= settings.PLATFORM_SNAPSHOT_MIN_INTERVAL:
+        return refresh()
+    return snapshot
+
+
+def history(days=30):
+    """The last snapshot of each of the past ``days`` days, oldest first."""
+    since = timezone.now() - timedelta(days=days)
+    daily = {}
+    for snapshot in PlatformSnapshot.objects.filter(created_at__gte=since).order_by('created_at'):
+        daily[timezone.localdate(snapshot.created_at)] = snapshot
+    return list(daily.values())
+
+
+def prune(keep_days):
+    """Thin history older than ``keep_days`` to the last snapshot of each day."""
+    cutoff = timezone.now() - timedelta(days=keep_days)
+    last_of_day = {}
+    for pk, created_at in PlatformSnapshot.objects.filter(created_at__lt=cutoff).order_by('created_at').values_list('pk', 'created_at'):
+        last_of_day[timezone.localdate(created_at)] = pk
+    deleted, _ = PlatformSnapshot.objects.filter(created_at__lt=cutoff).exclude(pk__in=last_of_day.values()).delete()
+    return deleted
@@ -0,0 +1,104 @@
+import base64
+import hashlib
+import os
+import tempfile
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+QR_ASSET_SALT = 'core.qr.asset'
+QR_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+# Compact signed QR payload: "GM<version>.<gym_id>.<member_id>.<signature>"
+QR_PAYLOAD_PREFIX = 'GM'
+QR_PAYLOAD_VERSION = 1
+QR_SIGNATURE_BYTES = 12
+
+
+class InvalidPayload(ValueError):
+    pass
+
+
+def _signature(body):
+    digest = salted_hmac('core.qr.payload', body, algorithm='sha256').digest()
+    return base64.urlsafe_b64encode(digest[:QR_SIGNATURE_BYTES]).decode()
+
+
+def make_payload(gym_id, member_id):
+    body = f"{QR_PAYLOAD_PREFIX}{QR_PAYLOAD_VERSION}.{gym_id}.{member_id}"
+    return f"{body}.{_signature(body)}"
+
+
+def parse_payload(data):
+    """Return ``(gym_id, member_id)`` from a signed payload or raise InvalidPayload."""
+    try:
+        version, gym_id, member_id, signature = (data or '').strip().split('.')
+    except ValueError:
+        raise InvalidPayload('Malformed QR payload')
+
+    if version != f"{QR_PAYLOAD_PREFIX}{QR_PAYLOAD_VERSION}":
+        raise InvalidPayload('Unsupported QR payload version')
+    if not (gym_id.isdigit() and member_id.isdigit()):
+        raise InvalidPayload('Malformed QR payload')
+
+    body = f"{version}.{gym_id}.{member_id}"
+    if not constant_time_compare(signature, _signature(body)):
+        raise InvalidPayload('Bad QR payload signature')
+    return int(gym_id), int(member_id)
+
+
+def image_key(data, box_size=10, border=4, fmt='png'):
+    """Content hash of a rendered image, used as cache file name and ETag."""
+    return hashlib.sha256(f"{fmt}:{box_size}:{border}:{data}".encode()).hexdigest()
+
+
+def cached_image(data, box_size=10, border=4, fmt='png'):
+    """
+    ``(key, path)`` of the image for ``data``, rendering it into
+    ``QR_CACHE_DIR`` on first use. Images are immutable for a given key, so
+    concurrent renders of the same payload just race to write identical files.
+    """
+    key = image_key(data, box_size, border, fmt)
+    path = os.path.join(settings.QR_CACHE_DIR, key[:2], f"{key}.{fmt}")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        qr = qrcode.QRCode(version=1, box_size=box_size, border=border)
+        qr.add_data(data)
+        qr.make(fit=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if fmt == 'svg':
+                    qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(f)
+                else:
+                    qr.make_image(fill_color="black", back_color="white").save(f, format='PNG')
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    return key, path
+
+
+def asset_url(data, box_size=10, fmt='png'):
+    """
+    A stable, signed URL serving the QR code of ``data``. The URL is derived
+    from the data itself, so a changed host or gym simply yields a new URL
+    and a new cache entry.
+    """
+    token = signing.Signer(salt=QR_ASSET_SALT).sign_object([data, box_size, fmt], compress=True)
+    return reverse('qr_asset', args=[token])
+
+
+def load_asset_token(token):
+    """``(data, box_size, fmt)`` from an ``asset_url`` token or raise InvalidPayload."""
+    try:
+        data, box_size, fmt = signing.Signer(salt=QR_ASSET_SALT).unsign_object(token)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise InvalidPayload('Bad QR asset token')
+    if fmt not in QR_FORMATS or not isinstance(box_size, int) or not 1 <= box_size <= 40:
+        raise InvalidPayload('Bad QR asset token')
+    return data, box_size, fmt
@@ -0,0 +1,87 @@
+"""
+Attendance retention: raw rows older than ``ATTENDANCE_RETENTION_DAYS`` move
+from Attendance into the compact AttendanceArchive table, in small batches so
+no write transaction holds the database for long.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics, rollups
+from .models import Attendance, AttendanceArchive, AttendanceDaily
+
+ARCHIVE_FIELDS = ('id', 'gym_id', 'attendance_type', 'member_id', 'staff_id', 'timestamp', 'method')
+
+
+def archive_cutoff(days=None):
+    days = settings.ATTENDANCE_RETENTION_DAYS if days is None else days
+    return rollups.day_bounds(timezone.localdate() - timedelta(days=days))[0]
+
+
+def _ensure_rollups(rows):
+    # Rollups are maintained on write; rebuild any day that predates them
+    # before its raw rows leave the table
+    days = {(row['gym_id'], timezone.localdate(row['timestamp'])) for row in rows}
+    existing = set(AttendanceDaily.objects.filter(
+        gym_id__in={gym_id for gym_id, _ in days},
+        date__in={day for _, day in days},
+    ).values_list('gym_id', 'date'))
+    for gym_id, day in days - existing:
+        rollups.rebuild([gym_id], day, day)
+
+
+def archive_attendance(days=None, batch_size=None, pause=0.0, max_batches=None):
+    """Move raw attendance older than the retention horizon; returns rows moved."""
+    cutoff = archive_cutoff(days)
+    batch_size = batch_size or settings.ATTENDANCE_ARCHIVE_BATCH_SIZE
+    moved = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        rows = list(
+            Attendance.objects.filter(timestamp__lt=cutoff)
+            .order_by('timestamp', 'id')
+            .values(*ARCHIVE_FIELDS)[:batch_size]
+        )
+        if not rows:
+            break
+
+        _ensure_rollups(rows)
+        with transaction.atomic():
+            AttendanceArchive.objects.bulk_create(
+                AttendanceArchive(**{field: row[field] for field in ARCHIVE_FIELDS if field != 'id'})
+                for row in rows
+            )
+            # One DELETE, without fetching the rows to send post_delete for
+            # each: their rollup days still count them through the archive
+            batch = Attendance.objects.filter(pk__in=[row['id'] for row in rows])
+            batch._raw_delete(batch.db)
+        for gym_id in {row['gym_id'] for row in rows}:
+            metrics.invalidate(gym_id)
+
+        moved += len(rows)
+        batches += 1
+        if pause:
+            time.sleep(pause)  # Let kiosk writes in between batches
+    return moved
+
+
+def member_history(member_id, offset=0, limit=50):
+    """
+    A member's attendance, newest first, across the live and archived tables.
+    Archived rows are always older than live ones, so the archive simply
+    continues where the live table ends.
+    """
+    fields = ('timestamp', 'method', 'gym_id')
+    live = Attendance.objects.filter(member_id=member_id).order_by('-timestamp')
+    live_count = live.count()
+
+    history = list(live.values(*fields)[offset:offset + limit])
+    if len(history) < limit:
+        archive_offset = max(offset - live_count, 0)
+        archived = AttendanceArchive.objects.filter(member_id=member_id).order_by('-timestamp')
+        history += list(archived.values(*fields)[archive_offset:archive_offset + limit - len(history)])
+    return history
@@ -0,0 +1,107 @@
+"""
+Daily attendance rollups (``AttendanceDaily``).
+
+New attendance rows are folded in incrementally by ``record_attendance``;
+deletes recompute their day with ``refresh_day``. ``rebuild`` recomputes a
+range from the raw and archived rows, e.g. after rows were edited by hand.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Attendance, AttendanceArchive, AttendanceDaily
+
+
+def day_bounds(day):
+    """Aware ``[start, end)`` datetimes of a local day, for index-friendly range filters."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def record_attendance(rows):
+    """Fold newly saved Attendance rows into their gym's daily rollup."""
+    groups = defaultdict(list)
+    for row in rows:
+        groups[(row.gym_id, timezone.localdate(row.timestamp))].append(row)
+
+    with transaction.atomic():
+        for (gym_id, day), day_rows in groups.items():
+            member_ids = {row.member_id for row in day_rows if row.member_id}
+            if member_ids:
+                # Members already seen earlier that day do not count as unique again
+                start, end = day_bounds(day)
+                seen = set(Attendance.objects.filter(
+                    gym_id=gym_id,
+                    timestamp__gte=start,
+                    timestamp__lt=end,
+                    member_id__in=member_ids,
+                ).exclude(pk__in=[row.pk for row in day_rows]).values_list('member_id', flat=True))
+                member_ids -= seen
+
+            AttendanceDaily.objects.get_or_create(gym_id=gym_id, date=day)
+            AttendanceDaily.objects.filter(gym_id=gym_id, date=day).update(
+                member_count=F('member_count') + sum(1 for row in day_rows if row.attendance_type == 'member'),
+                staff_count=F('staff_count') + sum(1 for row in day_rows if row.attendance_type == 'staff'),
+                qr_count=F('qr_count') + sum(1 for row in day_rows if row.method == 'qr'),
+                manual_count=F('manual_count') + sum(1 for row in day_rows if row.method == 'manual'),
+                unique_members=F('unique_members') + len(member_ids),
+            )
+
+
+def refresh_day(gym_id, day):
+    """Recompute one gym's rollup day, after attendance was deleted."""
+    rebuild([gym_id], day, day)
+
+
+def aggregate_by_day(queryset):
+    """Group an Attendance-like queryset into rollup rows, one per gym and local day."""
+    return queryset.annotate(
+        day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone())
+    ).values('gym_id', 'day').annotate(
+        member_count=Count('id', filter=Q(attendance_type='member')),
+        staff_count=Count('id', filter=Q(attendance_type='staff')),
+        qr_count=Count('id', filter=Q(method='qr')),
+        manual_count=Count('id', filter=Q(method='manual')),
+        unique_members=Count('member_id', distinct=True),
+    ).order_by()
+
+
+def rebuild(gym_ids=None, date_from=None, date_to=None):
+    """
+    Recompute rollups from the raw and archived rows; returns the number of
+    rollup rows written. A day only partly archived counts unique members per
+    table, so it can overcount them until the archive run finishes that day.
+    """
+    sources = [Attendance.objects.all(), AttendanceArchive.objects.all()]
+    rollups = AttendanceDaily.objects.all()
+    if gym_ids:
+        sources = [source.filter(gym_id__in=gym_ids) for source in sources]
+        rollups = rollups.filter(gym_id__in=gym_ids)
+    if date_from:
+        sources = [source.filter(timestamp__gte=day_bounds(date_from)[0]) for source in sources]
+        rollups = rollups.filter(date__gte=date_from)
+    if date_to:
+        sources = [source.filter(timestamp__lt=day_bounds(date_to)[1]) for source in sources]
+        rollups = rollups.filter(date__lte=date_to)
+
+    totals = {}
+    for source in sources:
+        for row in aggregate_by_day(source):
+            key = (row.pop('gym_id'), row.pop('day'))
+            if key in totals:
+                for field, value in row.items():
+                    totals[key][field] += value
+            else:
+                totals[key] = row
+
+    with transaction.atomic():
+        rollups.delete()
+        created = AttendanceDaily.objects.bulk_create(
+            AttendanceDaily(gym_id=gym_id, date=day, **counts)
+            for (gym_id, day), counts in totals.items()
+        )
+    return len(created)
@@ -0,0 +1,177 @@
+"""
+Per-worker, per-gym member roster used to validate check-ins without
+querying the Member table.
+
+Every change to a gym's members bumps ``Gym.roster_version`` and stamps the
+changed rows with the new value (see ``touch``). A worker keeps the roster in
+sorted arrays and only pulls the rows stamped after the version it holds.
+Session counts are only a first filter: ``core.checkin.consume_session`` is
+the authority and keeps this worker's copy in step without a version bump.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Gym, Member
+
+Verdict = namedtuple('Verdict', ['ok', 'message', 'name', 'debounce_minutes', 'metered'], defaults=[0, False])
+
+INVALID = Verdict(False, 'Invalid QR code', None)
+
+_NO_EXPIRY = 0
+_NO_SESSIONS = -1
+
+
+def touch(gym_id, member_ids=()):
+    """Bump the gym's roster version and stamp ``member_ids`` with it."""
+    with transaction.atomic():
+        Gym.objects.filter(pk=gym_id).update(roster_version=F('roster_version') + 1)
+        version = Gym.objects.filter(pk=gym_id).values_list('roster_version', flat=True).first()
+        if member_ids and version is not None:
+            Member.objects.filter(pk__in=member_ids).update(roster_version=version)
+    return version
+
+
+Table = namedtuple('Table', ['ids', 'active', 'expiry', 'sessions', 'names'])
+
+
+def _empty_table():
+    return Table(array('q'), bytearray(), array('l'), array('l'), [])
+
+
+def _index(ids, member_id):
+    index = bisect_left(ids, member_id)
+    if index < len(ids) and ids[index] == member_id:
+        return index
+    return None
+
+
+def _put(table, member_id, is_active, expiry_date, sessions_remaining, name):
+    expiry = expiry_date.toordinal() if expiry_date else _NO_EXPIRY
+    sessions = _NO_SESSIONS if sessions_remaining is None else sessions_remaining
+    index = bisect_left(table.ids, member_id)
+    if index < len(table.ids) and table.ids[index] == member_id:
+        table.active[index] = is_active
+        table.expiry[index] = expiry
+        table.sessions[index] = sessions
+        table.names[index] = name
+    else:
+        for column, value in zip(table, (member_id, is_active, expiry, sessions, name)):
+            column.insert(index, value)
+
+
+class GymRoster:
+    def __init__(self, gym_id):
+        self.gym_id = gym_id
+        self.version = None
+        self.debounce_minutes = 0
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        # Replaced whole, never edited in place by refresh, so check() can
+        # read it without the lock while a refresh runs
+        self.table = _empty_table()
+
+    def _rows(self, members):
+        return members.order_by('id').values_list(
+            'id', 'is_active', 'expiry_date', 'sessions_remaining', 'name', 'roster_version'
+        )
+
+    def refresh(self, force=False):
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self.checked_at < settings.ROSTER_REFRESH_SECONDS:
+                return
+            self.checked_at = now
+
+            gym = Gym.objects.filter(pk=self.gym_id).values_list(
+                'roster_version', 'checkin_debounce_minutes'
+            ).first()
+            if gym is None:
+                self.version = None
+                self.table = _empty_table()
+                return
+            version, self.debounce_minutes = gym
+            if version == self.version:
+                return
+
+            members = Member.objects.filter(gym_id=self.gym_id)
+            if self.version is not None:
+                rows = list(self._rows(members.filter(
+                    roster_version__gt=self.version, roster_version__lte=version
+                )))
+                table = Table(*(column[:] for column in self.table))
+                for row in rows:
+                    _put(table, *row[:5])
+                # A member saved twice only shows its latest stamp, so check the
+                # newest bump is covered; deletions stamp nothing and leave the
+                # copy larger than the gym, so those take a full reload
+                if max((row[5] for row in rows), default=None) == version and len(table.ids) == members.count():
+                    self.table = table
+                    self.version = version
+                    return
+
+            table = _empty_table()
+            for row in self._rows(members):
+                _put(table, *row[:5])
+            self.table = table
+            self.version = version
+
+    def check(self, member_id, today):
+        table = self.table
+        index = _index(table.ids, member_id)
+        if index is None:
+            return None
+        name = table.names[index]
+        if not table.active[index]:
+            return Verdict(False, 'Membership expired', name)
+        if table.expiry[index] != _NO_EXPIRY and table.expiry[index] < today.toordinal():
+            return Verdict(False, 'Membership expired', name)
+        if table.sessions[index] == 0:
+            return Verdict(False, 'No sessions remaining', name)
+        return Verdict(True, None, name, self.debounce_minutes, table.sessions[index] != _NO_SESSIONS)
+
+    def consumed(self, member_id, used):
+        """Mirror a session UPDATE locally; a refused one means the count is gone."""
+        with self.lock:
+            sessions = self.table.sessions
+            index = _index(self.table.ids, member_id)
+            if index is not None and sessions[index] != _NO_SESSIONS:
+                sessions[index] = max(sessions[index] - 1, 0) if used else 0
+
+
+_rosters = {}
+_rosters_lock = threading.Lock()
+
+
+def get_roster(gym_id):
+    roster = _rosters.get(gym_id)
+    if roster is None:
+        with _rosters_lock:
+            roster = _rosters.setdefault(gym_id, GymRoster(gym_id))
+    roster.refresh()
+    return roster
+
+
+def check_member(gym_id, member_id, today=None):
+    """Accept or reject a check-in from the cached roster."""
+    today = today or timezone.localdate()
+    roster = get_roster(gym_id)
+    verdict = roster.check(member_id, today)
+    if verdict is None:
+        # Unknown ids may be members added since the last refresh
+        roster.refresh(force=True)
+        verdict = roster.check(member_id, today)
+    return verdict or INVALID
+
+
+def consumed(gym_id, member_id, used):
+    roster = _rosters.get(gym_id)
+    if roster is not None:
+        roster.consumed(member_id, used)
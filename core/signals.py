@@ -0,0 +1,131 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import billing, counters, inbox, ledger, metrics, occupancy, platform, rollups, roster
+from .models import Attendance, AttendanceArchive, Broadcast, Expense, Gym, Invoice, Member, Notification, Visitor
+
+
+class _DayRefresh:
+    """Calls ``refresh(gym_id, day)`` once per queued pair after the transaction commits."""
+    def __init__(self, refresh):
+        self.refresh = refresh
+        self.days = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        # Days of a deleted gym went with it, rollups and ledger included
+        live = set(Gym.objects.filter(pk__in={gym_id for gym_id, _ in self.days}).values_list('pk', flat=True))
+        for gym_id, day in sorted(self.days):
+            if gym_id in live:
+                self.refresh(gym_id, day)
+
+
+def _refresh_on_commit(refresh, gym_id, day):
+    # A cascade deletes rows one post_delete at a time; collect their days so
+    # each is recomputed once, not once per row
+    connection = transaction.get_connection()
+    for _, func, _ in connection.run_on_commit:
+        if isinstance(func, _DayRefresh) and func.refresh is refresh and not func.done:
+            func.days.add((gym_id, day))
+            return
+    pending = _DayRefresh(refresh)
+    pending.days.add((gym_id, day))
+    transaction.on_commit(pending)
+
+
+@receiver(post_save, sender=Member)
+def member_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'qr_payload'}:
+        return
+    roster.touch(instance.gym_id, [instance.pk])
+    metrics.invalidate(instance.gym_id)
+
+
+@receiver(post_delete, sender=Member)
+def member_deleted(sender, instance, **kwargs):
+    roster.touch(instance.gym_id)
+    metrics.invalidate(instance.gym_id)
+
+
+@receiver(post_save, sender=Attendance)
+def attendance_saved(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_attendance([instance])
+        occupancy.record([instance])
+    metrics.invalidate(instance.gym_id)
+
+
+@receiver(post_delete, sender=Attendance)
+def attendance_deleted(sender, instance, **kwargs):
+    # Also fires for rows removed along with their member or gym
+    _refresh_on_commit(rollups.refresh_day, instance.gym_id, timezone.localdate(instance.timestamp))
+    metrics.invalidate(instance.gym_id)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_save, sender=Visitor)
+@receiver(post_delete, sender=Visitor)
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def gym_totals_changed(sender, instance, **kwargs):
+    metrics.invalidate(instance.gym_id)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def notification_changed(sender, instance, **kwargs):
+    inbox.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Broadcast)
+@receiver(post_delete, sender=Broadcast)
+def broadcast_changed(sender, instance, **kwargs):
+    inbox.invalidate_all()
+
+
+@receiver(post_save, sender=Gym)
+@receiver(post_delete, sender=Gym)
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def platform_totals_changed(sender, instance, update_fields=None, **kwargs):
+    if sender is Gym and update_fields and set(update_fields) <= {'roster_version'}:
+        return
+    platform.mark_stale()
+    if sender is Gym:
+        counters.invalidate_gym_counts()
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Visitor)
+@receiver(post_save, sender=Expense)
+def ledger_entry_saved(sender, instance, created, **kwargs):
+    if created:
+        ledger.record(instance)
+    elif instance.gym_id is not None:
+        ledger.refresh_day(instance.gym_id, ledger.entry_day(instance))
+
+
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Visitor)
+@receiver(post_delete, sender=Expense)
+def ledger_entry_deleted(sender, instance, **kwargs):
+    if instance.gym_id is not None:
+        _refresh_on_commit(ledger.refresh_day, instance.gym_id, ledger.entry_day(instance))
+
+
+@receiver(post_save, sender=Invoice)
+def renewal_paid(sender, instance, **kwargs):
+    if instance.is_paid and instance.invoice_type == 'subscription_renewal' and instance.billing_period:
+        billing.settle([instance.gym_id])
+
+
+@receiver(post_delete, sender=Gym)
+def gym_deleted(sender, instance, **kwargs):
+    # The archive keeps plain ids, so nothing cascades to it
+    AttendanceArchive.objects.filter(gym_id=instance.pk).delete()
@@ -0,0 +1,134 @@
+"""
+Materialised member and gym status.
+
+``Member.status`` and ``Gym.status`` are set on save and moved along by
+``sweep`` as dates pass, so list filters and dashboard counts are plain
+index lookups. Each state is one set-based UPDATE that only touches rows
+whose status changes, which makes re-running a sweep cheap.
+
+Sweeps run from the ``sweep_status`` command, from a background thread in
+the web process when ``STATUS_SWEEP_INTERVAL`` is set, and lazily once per
+day through ``sweep_if_stale``.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from . import counters, metrics, platform
+from .models import Gym, Member
+
+logger = logging.getLogger(__name__)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+@dataclass
+class SweepReport:
+    members: int = 0
+    gyms: int = 0
+
+
+def _swept_key(today):
+    return f'status-sweep:{today.isoformat()}'
+
+
+def member_states(today):
+    """``(status, condition)`` pairs, first match wins; mirrors ``Member.current_status``."""
+    return [
+        ('inactive', Q(is_active=False)),
+        ('exhausted', Q(sessions_remaining=0)),
+        ('expired', Q(expiry_date__lt=today)),
+        ('expiring', Q(expiry_date__lte=today + timedelta(days=Member.EXPIRING_DAYS))),
+        ('active', Q()),
+    ]
+
+
+def gym_states(today):
+    """``(status, condition)`` pairs, first match wins; mirrors ``Gym.current_status``."""
+    return [
+        ('inactive', Q(is_active=False)),
+        ('expired', Q(expiry_date__lt=today)),
+        ('expiring', Q(expiry_date__lte=today + timedelta(days=Gym.EXPIRING_DAYS))),
+        ('active', Q()),
+    ]
+
+
+def _apply(queryset, states, collect_gyms=False):
+    """Move every row to its state; returns ``(rows changed, gym ids touched)``."""
+    changed, gym_ids, earlier = 0, set(), Q()
+    for status, condition in states:
+        rows = queryset.filter(condition & ~earlier).exclude(status=status)
+        if collect_gyms:
+            gym_ids.update(rows.values_list('gym_id', flat=True).distinct().order_by())
+        changed += rows.update(status=status)
+        earlier |= condition
+    return changed, gym_ids
+
+
+def sweep_members(members=None, today=None):
+    today = today or timezone.localdate()
+    changed, gym_ids = _apply(members if members is not None else Member.objects.all(), member_states(today), True)
+    # UPDATE skips post_save, so drop the cached dashboards here
+    for gym_id in gym_ids:
+        metrics.invalidate(gym_id)
+    return changed
+
+
+def sweep_gyms(gyms=None, today=None):
+    today = today or timezone.localdate()
+    changed, _ = _apply(gyms if gyms is not None else Gym.objects.all(), gym_states(today))
+    if changed:
+        counters.invalidate_gym_counts()
+        platform.mark_stale()
+    return changed
+
+
+def sweep(today=None):
+    today = today or timezone.localdate()
+    report = SweepReport(members=sweep_members(today=today), gyms=sweep_gyms(today=today))
+    cache.set(_swept_key(today), True, timeout=2 * 24 * 60 * 60)
+    return report
+
+
+def sweep_if_stale():
+    """Sweep if nothing has today; one cache lookup otherwise."""
+    _start_scheduler()
+    today = timezone.localdate()
+    if cache.get(_swept_key(today)):
+        return None
+    # Only one request runs the day's first sweep
+    if not cache.add(f'{_swept_key(today)}:lock', True, timeout=60):
+        return None
+    return sweep(today)
+
+
+def _run_scheduler(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            sweep()
+        except Exception:
+            logger.exception("Status sweep failed")
+        finally:
+            close_old_connections()
+
+
+def _start_scheduler():
+    """Start the in-process sweeper thread once, if ``STATUS_SWEEP_INTERVAL`` is set."""
+    global _scheduler
+    interval = settings.STATUS_SWEEP_INTERVAL
+    if not interval or _scheduler is not None:
+        return
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=_run_scheduler, args=(interval,), name='status-sweeper', daemon=True)
+            _scheduler.start()
@@ -0,0 +1,46 @@
+"""Tasks the ``run_jobs`` workers can run, by name (see ``core.jobs``)."""
+from django.conf import settings
+
+from . import billing, jobs, outbox, platform, retention, status
+from .models import Member
+from .qr import cached_image
+
+
+@jobs.task('deliver_email')
+def deliver_email():
+    # Drain the outbox while the rate limit allows
+    while outbox.deliver().sent:
+        pass
+
+
+@jobs.task('render_member_qr')
+def render_member_qr(gym_id):
+    """Pre-render QR images for a gym's members; already cached ones are skipped."""
+    for payload in Member.objects.filter(gym_id=gym_id).exclude(qr_payload='').values_list('qr_payload', flat=True).iterator():
+        cached_image(payload)
+
+
+@jobs.task('refresh_platform_snapshot')
+def refresh_platform_snapshot():
+    platform.refresh()
+    platform.prune(settings.PLATFORM_SNAPSHOT_KEEP_DAYS)
+
+
+@jobs.task('sweep_status')
+def sweep_status():
+    status.sweep()
+
+
+@jobs.task('run_billing')
+def run_billing():
+    billing.run()
+
+
+@jobs.task('archive_attendance')
+def archive_attendance():
+    retention.archive_attendance()
+
+
+@jobs.task('prune_jobs')
+def prune_jobs():
+    jobs.prune()
@@ -1,18 +1,29 @@
 from django import template
-from datetime import date, timedelta
+from datetime import date
 
+from core import counters, inbox
 from core.models import Gym
 
 register = template.Library()
 
 @register.simple_tag
 def get_active_gym_count():
-    return Gym.objects.filter(is_active=True).count()
+    return counters.active_gym_count()
 
 @register.simple_tag
 def get_expiring_gym_count():
-    today = date.today()
-    return Gym.objects.filter(expiry_date__range=(today, today + timedelta(days=7))).count()
+    return counters.expiring_gym_count()
+
+@register.simple_tag
+def get_expiring_gym_days():
+    return Gym.EXPIRING_DAYS
+
+@register.simple_tag(takes_context=True)
+def get_unread_notification_count(context):
+    user = context.get('user')
+    if user is None or not user.is_authenticated:
+        return 0
+    return inbox.unread_count(user)
 
 @register.filter
 def days_until(value):
@@ -0,0 +1,16 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Runs the suite against a private in-memory cache instead of the shared one."""
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        })
+        self._cache.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache.disable()
+        super().teardown_test_environment(**kwargs)
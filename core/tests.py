@@ -1,3 +1,793 @@
-from django.test import TestCase
+import io
+import json
+import re
+import tempfile
+import unittest
+from unittest import mock
+from datetime import timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.core import mail, signing
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import billing, counters, inbox, jobs, ledger, metrics, occupancy, outbox, platform, retention, rollups, roster, status
+from .checkin import consume_session
+from .qr import QR_ASSET_SALT, InvalidPayload, asset_url, parse_payload
+from .member_import import import_members, read_rows
+from .models import (
+    Attendance, AttendanceArchive, AttendanceDaily, Expense, Gym, GymPlan, Invoice, Job, LedgerDaily, Member, Notification, OutboundEmail, PaymentMethod, PlatformSnapshot, SystemPlan, User,
+    Visitor,
+)
+from .roster import GymRoster
+
+FULL_SCAN = re.compile(r'\bSCAN (\w+)(?! USING (COVERING )?INDEX)\b')
+
+
+class GymTestCase(TestCase):
+    def setUp(self):
+        self.owner = owner = User.objects.create_user('owner', role='gym_owner')
+        plan = SystemPlan.objects.create(
+            name='Basic', plan_type='basic', price=10, duration_days=30, gym_limit=1, member_limit=100
+        )
+        self.gym = Gym.objects.create(
+            owner=owner, name='Gym', address='a', phone='1', email='g@x.com', system_plan=plan, is_active=True
+        )
+
+    def add_member(self, **fields):
+        return Member.objects.create(gym=self.gym, name='M', phone='1', gender='male', member_type='individual', **fields)
+
+
+# The pages this tree has no template for render just enough of their
+# context to run the view's lazy querysets
+PAGE_TEMPLATES = {
+    'gym/member_list.html': '{% for member in page_obj %}{{ member.name }}{% endfor %}',
+    'gym/member_detail.html': '{% for row in attendance %}{{ row.timestamp }}{% endfor %}',
+    'gym/attendance_report.html': '{{ attendance_by_date|length }}',
+    'gym/invoice_list.html': '{% for invoice in page_obj %}{{ invoice.amount }}{% endfor %}',
+    'gym/visitor_list.html': '{% for visitor in page_obj %}{{ visitor.name }}{% endfor %}',
+    'gym/expense_list.html': '{% for expense in page_obj %}{{ expense.amount }}{% endfor %}',
+    'gym/notifications.html': '{% for entry in notifications %}{{ entry.message }}{% endfor %}',
+    'system/income_report.html': '{% for row in gym_income %}{{ row.name }}{% endfor %}',
+}
+TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {**settings.TEMPLATES[0]['OPTIONS'], 'loaders': [
+        ('django.template.loaders.locmem.Loader', PAGE_TEMPLATES),
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]},
+}]
+STATIC_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+# Lookup tables with a handful of rows, read whole, and the names Django
+# gives derived tables, whose scans read rows already fetched by index
+SCAN_ALLOWED = {'core_paymentmethod', 'core_systemplan', 'core_systemsetting', 'core_gymplan', 'subquery', 'qualify'}
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN output is SQLite specific")
+@override_settings(TEMPLATES=TEMPLATES, STORAGES=STATIC_STORAGES)
+class HotQueryPlanTests(GymTestCase):
+    """EXPLAIN every query the list, dashboard and report pages actually run."""
+    OWNER_PAGES = [
+        '/gym/dashboard/', '/gym/members/?status=active', '/gym/members/?status=expiring',
+        '/gym/members/?status=expired', '/gym/members/{member}/', '/gym/attendance/report/', '/gym/invoices/',
+        '/gym/visitors/', '/gym/expenses/', '/gym/notifications/',
+    ]
+    ADMIN_PAGES = ['/system/dashboard/', '/system/gyms/', '/system/invoices/', '/system/income/', '/system/notifications/']
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        today = timezone.localdate()
+        member = self.add_member(expiry_date=today + timedelta(days=3))
+        self.add_member(expiry_date=today - timedelta(days=3))
+        Attendance.objects.create(gym=self.gym, attendance_type='member', member=member)
+        cash = PaymentMethod.objects.create(name='cash')
+        Invoice.objects.create(gym=self.gym, amount=5, payment_method=cash, description='Membership', is_paid=True)
+        Expense.objects.create(gym=self.gym, amount=2, description='Towels')
+        Visitor.objects.create(gym=self.gym, name='V', amount=1, payment_method=cash)
+        Notification.objects.create(user=self.owner, message='Hello')
+        self.member = member
+        self.admin = User.objects.create_user('admin', role='system_admin')
+
+    def assert_pages_use_indexes(self, user, pages):
+        self.client.force_login(user)
+        seen = []
+        for page in pages:
+            url = page.format(member=self.member.id)
+            with self.subTest(url), CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            for query in captured.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                    plan = '\n'.join(row[-1] for row in cursor.fetchall())
+                scans = {match.group(1) for match in FULL_SCAN.finditer(plan)} - SCAN_ALLOWED
+                self.assertFalse(scans, f"{url} runs a full table scan:\n{query['sql']}\n{plan}")
+                seen.append(query['sql'])
+        return seen
+
+    def test_owner_pages_use_indexes(self):
+        seen = self.assert_pages_use_indexes(self.owner, self.OWNER_PAGES)
+        # The dashboard's grouped metrics and the report's daily rollup
+        self.assertTrue(any('GROUP BY' in sql and '"core_member"' in sql for sql in seen))
+        self.assertTrue(any('FROM "core_attendancedaily"' in sql for sql in seen))
+
+    def test_admin_pages_use_indexes(self):
+        self.assert_pages_use_indexes(self.admin, self.ADMIN_PAGES)
+
+
+@override_settings(TEMPLATES=TEMPLATES, STORAGES=STATIC_STORAGES)
+class IncomeReportTests(GymTestCase):
+    def test_report_splits_initial_and_renewal_income_in_grouped_queries(self):
+        cash = PaymentMethod.objects.create(name='cash')
+        other = Gym.objects.create(
+            owner=self.owner, name='Other', address='a', phone='1', email='o@x.com', system_plan=self.gym.system_plan,
+        )
+        for gym, amount, invoice_type in [
+            (self.gym, 10, 'subscription'), (self.gym, 10, 'subscription_renewal'),
+            (self.gym, 10, 'subscription_renewal'), (other, 40, 'subscription'), (other, 99, 'membership'),
+        ]:
+            Invoice.objects.create(gym=gym, amount=amount, payment_method=cash, invoice_type=invoice_type, is_paid=True)
+        Invoice.objects.create(gym=other, amount=7, payment_method=cash, invoice_type='subscription')
+        self.client.force_login(User.objects.create_user('admin', role='system_admin'))
+
+        # session, user, totals, page count and rows, plans, buckets
+        with self.assertNumQueries(7):
+            response = self.client.get('/system/income/', {'bucket': 'month'})
+        context = response.context
+        self.assertEqual(context['total_income'], 70)
+        self.assertEqual(context['sources'], {'subscriptions': 50, 'renewals': 20})
+        self.assertEqual(
+            [(row['name'], row['subscriptions'], row['renewals']) for row in context['gym_income']],
+            [('Other', 40, 0), ('Gym', 10, 20)],
+        )
+        self.assertEqual([(row['plan'], row['invoices']) for row in context['plan_income']], [('Basic', 4)])
+        self.assertEqual([row['total_income'] for row in context['income_over_time']], [70])
+
+
+class StatusSweepTests(GymTestCase):
+    def test_sweep_moves_rows_as_dates_pass(self):
+        today = timezone.localdate()
+        fresh = self.add_member(expiry_date=today + timedelta(days=30))
+        soon = self.add_member(expiry_date=today + timedelta(days=3))
+        used_up = self.add_member(sessions_remaining=0)
+        self.assertEqual([fresh.status, soon.status, used_up.status], ['active', 'expiring', 'exhausted'])
+        self.assertEqual(self.gym.status, 'expiring')
+
+        later = today + timedelta(days=25)
+        self.assertEqual(status.sweep(later), status.SweepReport(members=2, gyms=0))
+        states = dict(Member.objects.values_list('pk', 'status'))
+        self.assertEqual([states[fresh.pk], states[soon.pk], states[used_up.pk]], ['expiring', 'expired', 'exhausted'])
+        self.assertEqual(status.sweep(later), status.SweepReport())
+
+        self.assertEqual(status.sweep(today + timedelta(days=31)), status.SweepReport(members=1, gyms=1))
+        self.gym.refresh_from_db()
+        self.assertEqual(self.gym.status, 'expired')
+
+
+    @override_settings(STORAGES=STATIC_STORAGES)
+    def test_sidebar_badge_names_the_expiry_window(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('admin', role='system_admin'))
+        response = self.client.get('/system/dashboard/')
+        self.assertContains(response, f'title="Expiring within {Gym.EXPIRING_DAYS} days"')
+
+
+class SidebarCounterTests(GymTestCase):
+    def test_counts_are_cached_until_a_gym_changes(self):
+        cache.clear()
+        active, expiring = counters.active_gym_count(), counters.expiring_gym_count()
+        with self.assertNumQueries(0):
+            self.assertEqual((counters.active_gym_count(), counters.expiring_gym_count()), (active, expiring))
+
+        self.gym.status = 'expiring'
+        self.gym.save()
+        with self.assertNumQueries(2):
+            self.assertEqual(counters.expiring_gym_count(), 1)
+            counters.active_gym_count()
+        # Bookkeeping saves leave the counts alone
+        self.gym.save(update_fields=['roster_version'])
+        with self.assertNumQueries(0):
+            counters.expiring_gym_count()
+
+        self.gym.delete()
+        self.assertEqual((counters.active_gym_count(), counters.expiring_gym_count()), (0, 0))
+
+
+class LedgerTests(GymTestCase):
+    def entries(self):
+        return sorted(LedgerDaily.objects.values_list('kind', 'source', 'payment_method', 'amount', 'entries'))
+
+    def test_ledger_matches_a_rebuild_through_edits_and_deletes(self):
+        cash = PaymentMethod.objects.create(name='cash')
+        membership = Invoice.objects.create(
+            gym=self.gym, amount=30, payment_method=cash, invoice_type='membership', is_paid=True
+        )
+        Invoice.objects.create(gym=self.gym, amount=30, payment_method=cash, invoice_type='membership', is_paid=True)
+        Invoice.objects.create(gym=self.gym, amount=9, payment_method=cash, invoice_type='membership')
+        Invoice.objects.create(gym=self.gym, amount=50, payment_method=cash, invoice_type='subscription', is_paid=True)
+        visitor = Visitor.objects.create(gym=self.gym, name='V', amount=5, payment_method=cash)
+        Expense.objects.create(gym=self.gym, amount=12, description='Towels', category='supplies')
+        Expense.objects.create(amount=100, description='Servers')
+        self.assertEqual(self.entries(), [
+            ('expense', 'supplies', '', 12, 1),
+            ('income', 'membership', 'cash', 60, 2),
+            ('income', 'visitor', 'cash', 5, 1),
+        ])
+        # Subscriptions are the platform's income, not the gym's
+        self.assertEqual(metrics.compute([self.gym.id], timezone.localdate())[self.gym.id]['net_profit'], 53)
+
+        membership.amount = 25
+        membership.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            visitor.delete()
+        self.assertEqual(self.entries(), [('expense', 'supplies', '', 12, 1), ('income', 'membership', 'cash', 55, 2)])
+
+        incremental = self.entries()
+        ledger.rebuild()
+        self.assertEqual(self.entries(), incremental)
+
+    def test_bulk_and_cascade_deletes_refresh_each_day_once(self):
+        cash = PaymentMethod.objects.create(name='cash')
+        for _ in range(30):
+            Invoice.objects.create(gym=self.gym, amount=10, payment_method=cash, invoice_type='membership', is_paid=True)
+        Visitor.objects.create(gym=self.gym, name='V', amount=5, payment_method=cash)
+
+        with mock.patch.object(ledger, 'refresh_day', wraps=ledger.refresh_day) as refresh_day, \
+                self.captureOnCommitCallbacks(execute=True):
+            Invoice.objects.filter(gym=self.gym).delete()
+        self.assertEqual(refresh_day.call_count, 1)
+        self.assertEqual(self.entries(), [('income', 'visitor', 'cash', 5, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gym.delete()
+        self.assertFalse(LedgerDaily.objects.exists())
+
+
+class PlatformSnapshotTests(GymTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    @override_settings(PLATFORM_SNAPSHOT_MIN_INTERVAL=60)
+    def test_writes_refresh_a_stale_snapshot_at_most_once_a_minute(self):
+        first = platform.latest()
+        self.assertEqual((first.total_gyms, first.total_expenses), (1, 0))
+        self.assertEqual(platform.latest(), first)
+
+        Expense.objects.create(amount=100, description='Servers')
+        # Too soon after the last refresh, the stale snapshot is served
+        self.assertEqual(platform.latest(), first)
+        PlatformSnapshot.objects.filter(pk=first.pk).update(created_at=timezone.now() - timedelta(seconds=61))
+        second = platform.latest()
+        self.assertNotEqual(second, first)
+        self.assertEqual(second.total_expenses, 100)
+        self.assertEqual(platform.latest(), second)
+
+    def test_prune_keeps_the_last_snapshot_of_each_old_day(self):
+        now = timezone.now()
+        for days in (10, 9):
+            for hours in (3, 2, 1):
+                PlatformSnapshot.objects.create(created_at=now - timedelta(days=days, hours=hours))
+        recent = [PlatformSnapshot.objects.create(created_at=now - timedelta(hours=hours)) for hours in (2, 1)]
+
+        self.assertEqual(platform.prune(keep_days=7), 4)
+        self.assertEqual(PlatformSnapshot.objects.count(), 4)
+        self.assertTrue(all(PlatformSnapshot.objects.filter(pk=snapshot.pk).exists() for snapshot in recent))
+        self.assertEqual(len(platform.history(30)), 3)
+
+    def test_kpi_history_clamps_days_and_refuses_bad_input(self):
+        admin = User.objects.create_user('admin', role='system_admin')
+        self.client.force_login(admin)
+        now = timezone.now()
+        for days in (400, 20, 0):
+            PlatformSnapshot.objects.create(created_at=now - timedelta(days=days), active_gyms=days)
+
+        url = reverse('kpi_history')
+        self.assertEqual([row['active_gyms'] for row in self.client.get(url).json()['results']], [20, 0])
+        self.assertEqual([row['active_gyms'] for row in self.client.get(url, {'days': -3}).json()['results']], [0])
+        self.assertEqual(len(self.client.get(url, {'days': 5000}).json()['results']), 2)
+        self.assertEqual(self.client.get(url, {'days': 'week'}).status_code, 400)
+
+
+class BillingTests(GymTestCase):
+    def test_second_run_bills_and_notifies_nothing(self):
+        self.gym.expiry_date = timezone.localdate() + timedelta(days=3)
+        self.gym.save()
+
+        self.assertEqual(billing.run().invoiced, 1)
+        self.assertEqual(billing.run().invoiced, 0)
+        # A run that read the gym as due before the first one committed
+        with mock.patch.object(billing, 'due_gyms', lambda days, today: Gym.objects.all()):
+            self.assertEqual(billing.run().invoiced, 0)
+        self.assertEqual(Invoice.objects.filter(gym=self.gym, invoice_type='subscription_renewal').count(), 1)
+        self.assertEqual(Notification.objects.filter(user=self.owner).count(), 1)
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+        self.assertEqual(billing.renewal_invoice(self.gym), Invoice.objects.get(invoice_type='subscription_renewal'))
+
+    def test_paying_a_renewal_extends_expiry_once(self):
+        expiry = timezone.localdate() + timedelta(days=3)
+        self.gym.expiry_date = expiry
+        self.gym.save()
+        billing.run()
+        invoice = Invoice.objects.get(gym=self.gym, invoice_type='subscription_renewal')
+        cash = PaymentMethod.objects.create(name='cash')
+
+        self.client.force_login(self.owner)
+        self.client.post('/core/process-payment/', {'invoice_id': invoice.id, 'payment_method_id': cash.id})
+        self.gym.refresh_from_db()
+        extended = expiry + timedelta(days=self.gym.system_plan.duration_days)
+        self.assertEqual(self.gym.expiry_date, extended)
+
+        # The paid invoice belongs to the previous period now
+        invoice.refresh_from_db()
+        invoice.save()
+        self.assertEqual(billing.settle(), 0)
+        self.assertEqual(billing.run().extended, 0)
+        self.gym.refresh_from_db()
+        self.assertEqual(self.gym.expiry_date, extended)
+
+
+class SessionCheckinTests(GymTestCase):
+    def test_last_session_is_consumed_once(self):
+        member = self.add_member(sessions_remaining=1)
+        self.assertTrue(consume_session(self.gym.id, member.id))
+        self.assertFalse(consume_session(self.gym.id, member.id))
+        member.refresh_from_db()
+        self.assertEqual((member.sessions_remaining, member.status), (0, 'exhausted'))
+
+
+class RollupTests(GymTestCase):
+    def day(self, day):
+        return AttendanceDaily.objects.filter(gym=self.gym, date=day).values_list(
+            'member_count', 'unique_members'
+        ).first()
+
+    def test_rollup_follows_inserts_and_deletes(self):
+        today = timezone.localdate()
+        midnight = rollups.day_bounds(today)[1]
+        regular, visitor = self.add_member(), self.add_member()
+        # A check-in at the next midnight belongs to tomorrow only
+        Attendance.objects.create(gym=self.gym, attendance_type='member', member=regular, timestamp=midnight)
+        Attendance.objects.create(gym=self.gym, attendance_type='member', member=regular, timestamp=midnight - timedelta(hours=1))
+        Attendance.objects.create(gym=self.gym, attendance_type='member', member=visitor, timestamp=midnight - timedelta(hours=2))
+        self.assertEqual(self.day(today), (2, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            visitor.delete()
+        self.assertEqual(self.day(today), (1, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            Attendance.objects.filter(timestamp=midnight).get().delete()
+        self.assertIsNone(self.day(today + timedelta(days=1)))
+        self.assertEqual(self.day(today), (1, 1))
+
+    def test_cascade_refreshes_each_day_once(self):
+        today = timezone.localdate()
+        member, other = self.add_member(), self.add_member()
+        noon = rollups.day_bounds(today)[0] + timedelta(hours=12)
+        for minutes in range(40):
+            for day in (0, 1):
+                Attendance.objects.create(
+                    gym=self.gym, attendance_type='member', member=member,
+                    timestamp=noon - timedelta(days=day, minutes=minutes),
+                )
+        Attendance.objects.create(gym=self.gym, attendance_type='member', member=other, timestamp=noon)
+
+        with mock.patch.object(rollups, 'refresh_day', wraps=rollups.refresh_day) as refresh_day, \
+                self.captureOnCommitCallbacks(execute=True):
+            member.delete()
+        self.assertEqual(refresh_day.call_count, 2)
+        self.assertEqual(self.day(today), (1, 1))
+        self.assertIsNone(self.day(today - timedelta(days=1)))
+
+    def test_gym_delete_takes_its_rollups_and_archive(self):
+        member = self.add_member()
+        old = timezone.now() - timedelta(days=400)
+        Attendance.objects.create(gym=self.gym, attendance_type='member', member=member, timestamp=old)
+        Attendance.objects.create(gym=self.gym, attendance_type='member', member=member)
+        retention.archive_attendance(days=30)
+        self.assertEqual(AttendanceArchive.objects.filter(gym_id=self.gym.id).count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gym.delete()
+        self.assertFalse(AttendanceDaily.objects.exists())
+        self.assertFalse(AttendanceArchive.objects.exists())
+
+
+class RetentionTests(GymTestCase):
+    def test_archive_moves_batches_without_per_row_signals(self):
+        member = self.add_member()
+        old = timezone.now() - timedelta(days=400)
+        for hours in range(5):
+            Attendance.objects.create(
+                gym=self.gym, attendance_type='member', member=member, timestamp=old + timedelta(hours=hours)
+            )
+        Attendance.objects.create(gym=self.gym, attendance_type='member', member=member)
+        day = timezone.localdate(old)
+        before = AttendanceDaily.objects.values_list('member_count', 'unique_members').get(date=day)
+
+        with mock.patch.object(rollups, 'refresh_day') as refresh_day, \
+                CaptureQueriesContext(connection) as captured:
+            self.assertEqual(retention.archive_attendance(days=30, batch_size=2), 5)
+        refresh_day.assert_not_called()
+        deletes = [query['sql'] for query in captured.captured_queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 3)
+
+        self.assertEqual(Attendance.objects.count(), 1)
+        self.assertEqual(AttendanceArchive.objects.filter(member_id=member.id).count(), 5)
+        self.assertEqual(AttendanceDaily.objects.values_list('member_count', 'unique_members').get(date=day), before)
+        self.assertEqual(len(retention.member_history(member.id)), 6)
+
+
+class RosterTests(GymTestCase):
+    def test_refresh_reads_only_changed_members(self):
+        today = timezone.localdate()
+        first = self.add_member()
+        roster = GymRoster(self.gym.id)
+        roster.refresh()
+
+        first.name = 'Renamed'
+        first.save()
+        first.save()
+        second = self.add_member()
+        # version, changed rows and the member count; no full reload
+        with self.assertNumQueries(3):
+            roster.refresh(force=True)
+        self.assertEqual(roster.check(first.id, today).name, 'Renamed')
+        self.assertTrue(roster.check(second.id, today).ok)
+
+        second_id = second.id
+        second.delete()
+        roster.refresh(force=True)
+        self.assertIsNone(roster.check(second_id, today))
+
+
+class QrImageTests(GymTestCase):
+    def setUp(self):
+        super().setUp()
+        qr_cache = tempfile.TemporaryDirectory()
+        self.addCleanup(qr_cache.cleanup)
+        qr_settings = override_settings(QR_CACHE_DIR=qr_cache.name)
+        qr_settings.enable()
+        self.addCleanup(qr_settings.disable)
+        self.client.force_login(self.owner)
+        self.member = self.add_member()
+
+    def test_member_qr_is_private_and_revalidated_by_etag(self):
+        url = f'/core/members/{self.member.id}/qr.png'
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'\x89PNG'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+
+        again = self.client.get(url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+
+        self.member.gym = Gym.objects.create(
+            owner=User.objects.create_user('other', role='gym_owner'), name='Other', address='a', phone='1',
+            email='o@x.com', system_plan=self.gym.system_plan,
+        )
+        self.member.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_qr_asset_serves_only_signed_tokens(self):
+        url = asset_url('https://example.com/register/', fmt='svg')
+        self.client.logout()
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn('public', response['Cache-Control'])
+
+        token = url.rstrip('/').rsplit('/', 1)[1]
+        forged = signing.Signer(salt='elsewhere').sign_object(['https://evil.test/', 10, 'svg'], compress=True)
+        oversized = signing.Signer(salt=QR_ASSET_SALT).sign_object(['x', 400, 'png'], compress=True)
+        for bad in (token[:-2], forged, oversized):
+            self.assertEqual(self.client.get(f'/core/qr/{bad}/').status_code, 404)
+
+
+class DebounceTests(GymTestCase):
+    def setUp(self):
+        cache.clear()
+        roster._rosters.clear()
+        super().setUp()
+        self.client.force_login(self.owner)
+        self.member = self.add_member()
+
+    def scan(self, minutes_later=0):
+        clock = timezone.now
+        with mock.patch('django.utils.timezone.now', lambda: clock() + timedelta(minutes=minutes_later)):
+            response = self.client.post(
+                '/core/scan-qr/', {'qr_data': self.member.qr_payload, 'gym_id': self.gym.id},
+                headers={'x-requested-with': 'XMLHttpRequest'},
+            )
+        return response.json()['recorded']
+
+    def test_repeat_scan_is_recorded_only_after_the_window(self):
+        self.assertEqual(self.gym.checkin_debounce_minutes, 10)
+        self.assertEqual([self.scan(), self.scan(minutes_later=9), self.scan(minutes_later=11)], [True, False, True])
+        self.assertEqual(Attendance.objects.filter(member=self.member).count(), 2)
+
+    def test_gym_sets_its_own_window(self):
+        self.gym.checkin_debounce_minutes = 0
+        self.gym.save()
+        roster._rosters.clear()
+        self.assertEqual([self.scan(), self.scan()], [True, True])
+
+        self.gym.checkin_debounce_minutes = 30
+        self.gym.save()
+        # Rosters re-read the window every ROSTER_REFRESH_SECONDS
+        roster._rosters.clear()
+        self.assertEqual([self.scan(), self.scan(minutes_later=20), self.scan(minutes_later=31)], [True, False, True])
+
+
+class QrPayloadTests(GymTestCase):
+    def test_only_signed_payloads_parse(self):
+        member = self.add_member()
+        self.assertEqual(parse_payload(member.qr_payload), (self.gym.id, member.id))
+
+        version, gym_id, member_id, signature = member.qr_payload.split('.')
+        tampered = f'{version}.{gym_id}.{int(member_id) + 1}.{signature}'
+        for payload in (tampered, f'{version}.{gym_id}.{member_id}', str(member.id), '', None,
+                        f'GM2.{gym_id}.{member_id}.{signature}'):
+            with self.subTest(payload), self.assertRaises(InvalidPayload):
+                parse_payload(payload)
+
+        self.client.force_login(self.owner)
+        response = self.client.post(
+            '/core/scan-qr/', {'qr_data': tampered, 'gym_id': self.gym.id}, headers={'x-requested-with': 'XMLHttpRequest'},
+        )
+        self.assertEqual(response.json(), {'status': 'error', 'message': 'Invalid QR code'})
+        self.assertFalse(Attendance.objects.exists())
+
+
+class AsyncScanTests(GymTestCase):
+    def setUp(self):
+        cache.clear()
+        roster._rosters.clear()
+        super().setUp()
+        self.client.force_login(self.owner)
+
+    def scan(self, member, gym_id=None):
+        return self.client.post(
+            '/core/scan-qr/async/', {'qr_data': member.qr_payload, 'gym_id': gym_id or self.gym.id},
+            headers={'x-requested-with': 'XMLHttpRequest'},
+        ).json()
+
+    def test_async_scan_has_the_sync_contract(self):
+        member = self.add_member()
+        self.assertEqual(self.scan(member), {'status': 'success', 'member_name': 'M', 'recorded': True})
+        self.assertEqual(self.scan(member)['recorded'], False)
+        self.assertEqual(self.scan(member, gym_id=self.gym.id + 1), {'status': 'error', 'message': 'Invalid QR code'})
+
+        metered = self.add_member(sessions_remaining=1)
+        self.assertTrue(self.scan(metered)['recorded'])
+        cache.clear()
+        self.assertEqual(self.scan(metered), {'status': 'error', 'message': 'No sessions remaining'})
+        self.assertEqual(Attendance.objects.filter(method='qr').count(), 2)
+        self.assertEqual(self.client.get('/core/scan-qr/async/').status_code, 400)
+
+
+class BatchCheckinTests(GymTestCase):
+    def setUp(self):
+        cache.clear()
+        roster._rosters.clear()
+        super().setUp()
+        self.client.force_login(self.owner)
+
+    def post_scans(self, *scans):
+        response = self.client.post(
+            '/core/scan-qr/batch/', json.dumps({'scans': list(scans)}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return [(result['status'], result.get('message') or result.get('recorded')) for result in response.json()['results']]
+
+    def test_batch_records_each_scan_on_its_own_merits(self):
+        now = timezone.now()
+        member = self.add_member(sessions_remaining=1)
+        late = self.add_member()
+        buffered = self.add_member()
+        gym = self.gym.id
+
+        results = self.post_scans(
+            {'gym_id': gym, 'member_id': member.id, 'timestamp': (now + timedelta(hours=1)).isoformat()},
+            {'gym_id': gym, 'member_id': member.id},
+            {'gym_id': gym, 'member_id': 999999},
+            {'gym_id': gym, 'member_id': late.id, 'timestamp': (now - timedelta(days=2)).isoformat()},
+            {'gym_id': gym, 'member_id': buffered.id, 'timestamp': (now - timedelta(hours=2)).isoformat()},
+            {'gym_id': gym, 'member_id': buffered.id, 'timestamp': (now - timedelta(minutes=115)).isoformat()},
+            {'gym_id': gym, 'member_id': buffered.id},
+        )
+        # The buffered visit two hours ago and the scan now are two visits;
+        # the debounce window runs on scan times, not arrival
+        self.assertEqual(results, [
+            ('success', True), ('error', 'No sessions remaining'), ('error', 'Invalid QR code'),
+            ('error', 'Scan too old'), ('success', True), ('success', False), ('success', True),
+        ])
+        # The future time is clamped to the server clock, the buffered one kept
+        self.assertLessEqual(Attendance.objects.get(member=member).timestamp, timezone.now())
+        self.assertEqual(
+            Attendance.objects.filter(member=buffered).order_by('timestamp').first().timestamp,
+            now - timedelta(hours=2),
+        )
+        self.assertFalse(Attendance.objects.filter(member=late).exists())
+        member.refresh_from_db()
+        self.assertEqual(member.sessions_remaining, 0)
+
+    def test_foreign_gyms_and_impossible_dates_fail_only_their_scan(self):
+        member = self.add_member()
+        other = User.objects.create_user('other', role='gym_owner')
+        self.client.force_login(other)
+        self.assertEqual(self.post_scans({'gym_id': self.gym.id, 'member_id': member.id}), [('error', 'Gym not found')])
+        self.assertFalse(Attendance.objects.exists())
+
+        self.client.force_login(self.owner)
+        results = self.post_scans(
+            {'gym_id': self.gym.id, 'member_id': member.id, 'timestamp': '2024-02-30T10:00'},
+            {'gym_id': self.gym.id, 'member_id': member.id},
+        )
+        self.assertEqual(results, [('error', 'Invalid timestamp'), ('success', True)])
+
+    def test_oversized_batch_is_refused(self):
+        with self.settings(CHECKIN_BATCH_LIMIT=1):
+            response = self.client.post(
+                '/core/scan-qr/batch/', json.dumps({'scans': [{}, {}]}), content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 400)
+
+
+class MemberImportTests(GymTestCase):
+    def test_bad_rows_are_reported_and_the_rest_imported(self):
+        plan = GymPlan.objects.create(gym=self.gym, name='Monthly', plan_type='individual_duration', price=5, duration_days=30)
+        self.add_member(email='taken@x.com')
+        upload = io.BytesIO(
+            b"Name,Email,Phone,Gender,Plan\n"
+            b"Ann,ann@x.com,1,female,monthly\n"
+            b"Ben,TAKEN@x.com,2,male,\n"
+            b"Ann again,ann@x.com,3,female,\n"
+            b"Cy,,4,male,Yearly\n"
+            b"Di,,5,unknown,\n"
+            b"Ed,,6,male,%d\n" % plan.id
+        )
+        report = import_members(self.gym, read_rows(upload, 'csv'), chunk_size=2, render_qr=False)
+        self.assertEqual((report.processed, report.created), (6, 2))
+        self.assertEqual([(error['row'], error['message']) for error in report.as_dict()['errors']], [
+            (2, "Duplicate email 'TAKEN@x.com'"),
+            (3, "Duplicate email 'ann@x.com'"),
+            (4, "Unknown plan 'Yearly'"),
+            (5, "Value 'unknown' is not a valid choice."),
+        ])
+        imported = Member.objects.filter(name__in=['Ann', 'Ed'])
+        self.assertEqual({member.plan_id for member in imported}, {plan.id})
+        self.assertTrue(all(member.qr_payload and member.expiry_date for member in imported))
+
+    def test_jsonl_lines_that_are_not_objects_are_row_errors(self):
+        upload = io.BytesIO(b'{"name": "Ann", "phone": "1", "gender": "female"}\n[1, 2]\nnot json\n')
+        report = import_members(self.gym, read_rows(upload, 'jsonl'), render_qr=False)
+        self.assertEqual(report.created, 1)
+        self.assertEqual([error[0] for error in report.errors], [2, 3])
+
+
+class OccupancyTests(GymTestCase):
+    def test_check_out_survives_a_reseed(self):
+        occupancy._gyms.clear()
+        member = self.add_member()
+        Attendance.objects.create(gym=self.gym, attendance_type='member', member=member)
+        self.assertEqual(occupancy.snapshot(self.gym.id)['occupancy'], 1)
+
+        occupancy.check_out(self.gym.id, 'member', member.id)
+        self.assertEqual(occupancy.snapshot(self.gym.id)['occupancy'], 0)
+        # Another worker's tracker seeds from the database alone
+        other = occupancy.GymOccupancy(self.gym.id)
+        other.resync_if_due()
+        self.assertEqual(other.count(), 0)
+
+        # A later check-in opens a new visit
+        Attendance.objects.create(gym=self.gym, attendance_type='member', member=member)
+        other._seed()
+        self.assertEqual(other.count(), 1)
+
+
+class InboxTests(GymTestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def test_broadcast_is_one_row_read_lazily(self):
+        other = User.objects.create_user('other', role='gym_owner')
+        admin = User.objects.create_user('admin', role='system_admin')
+        Notification.objects.create(user=self.owner, message='Personal')
+
+        with self.assertNumQueries(1):
+            inbox.broadcast('Maintenance tonight')
+        self.assertEqual([inbox.unread_count(user) for user in (self.owner, other, admin)], [2, 1, 0])
+        self.assertEqual([entry.message for entry in inbox.entries(self.owner)], ['Maintenance tonight', 'Personal'])
+
+        inbox.mark_read(self.owner)
+        self.assertEqual([inbox.unread_count(user) for user in (self.owner, other)], [0, 1])
+        self.assertTrue(all(entry.is_read for entry in inbox.recent(self.owner)))
+
+        late = User.objects.create_user('late', role='gym_owner')
+        self.assertEqual(inbox.entries(late), [])
+
+
+class BouncingBackend(EmailBackend):
+    def send_messages(self, messages):
+        if any('bounce' in address for message in messages for address in message.to):
+            raise ConnectionError("Recipient refused")
+        return super().send_messages(messages)
+
+
+class OutboxTests(TestCase):
+    def test_batch_retries_failures_with_backoff(self):
+        outbox.enqueue_many([
+            ('a@example.com', 'Hi', 'Body'), ('bounce@example.com', 'Hi', 'Body'), ('b@example.com', 'Hi', 'Body'),
+        ])
+        report = outbox.deliver(backend='core.tests.BouncingBackend')
+        self.assertEqual((report.sent, report.retrying, report.failed), (2, 1, 0))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['a@example.com', 'b@example.com'])
+
+        bounced = OutboundEmail.objects.get(to='bounce@example.com')
+        self.assertEqual((bounced.status, bounced.attempts, bounced.claim), ('queued', 1, ''))
+        self.assertGreater(bounced.next_attempt_at, timezone.now())
+        self.assertEqual(outbox.deliver(backend='core.tests.BouncingBackend').sent, 0)
+
+    @override_settings(EMAIL_OUTBOX_RATE_PER_MINUTE=2)
+    def test_rate_limit_spans_batches(self):
+        outbox.enqueue_many([(f'{n}@example.com', 'Hi', 'Body') for n in range(3)])
+        self.assertEqual(outbox.deliver().sent, 2)
+        self.assertEqual(outbox.deliver().sent, 0)
+        self.assertEqual(OutboundEmail.objects.filter(status='queued').count(), 1)
+
+
+JOB_LOG = []
+
+
+@jobs.task('tests.record')
+def record_job(label, fail=False):
+    JOB_LOG.append(label)
+    if fail:
+        raise RuntimeError(label)
+
+
+@override_settings(JOB_SCHEDULE={'tests.record': 60}, JOB_RETRY_SECONDS=0)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        JOB_LOG.clear()
+
+    def test_priority_retries_and_schedule(self):
+        jobs.enqueue('tests.record', label='low')
+        jobs.enqueue('tests.record', priority=5, label='high')
+        flaky = jobs.enqueue('tests.record', max_attempts=2, label='flaky', fail=True)
+        # Two workers in the same schedule slot write one periodic job
+        jobs.schedule()
+        jobs.schedule()
+        self.assertEqual(Job.objects.filter(dedupe_key__startswith='schedule:').count(), 1)
+        Job.objects.filter(dedupe_key__startswith='schedule:').update(payload={'label': 'periodic'})
+
+        with self.assertLogs('core.jobs', 'WARNING'):
+            jobs.work(once=True, poll=0)
+        self.assertEqual(JOB_LOG[0], 'high')
+        self.assertEqual(JOB_LOG.count('flaky'), 2)
+        self.assertEqual(sorted(set(JOB_LOG)), ['flaky', 'high', 'low', 'periodic'])
+        flaky.refresh_from_db()
+        self.assertEqual((flaky.status, flaky.attempts), ('failed', 2))
+        self.assertEqual(Job.objects.filter(status='done').count(), 3)
+
+    def test_claim_is_exclusive(self):
+        jobs.enqueue('tests.record', label='once')
+        first = jobs.claim()
+        self.assertIsNotNone(first)
+        self.assertIsNone(jobs.claim())
@@ -16,6 +16,10 @@ urlpatterns = [
     
     # QR Code attendance
     path('scan-qr/', views.scan_qr_attendance, name='scan_qr_attendance'),
+    path('scan-qr/async/', views.scan_qr_attendance_async, name='scan_qr_attendance_async'),
+    path('scan-qr/batch/', views.scan_qr_attendance_batch, name='scan_qr_attendance_batch'),
+    path('members/<int:member_id>/qr.png', views.member_qr, name='member_qr'),
+    path('qr/<str:token>/', views.qr_asset, name='qr_asset'),
     
     # Member registration (for gym owners)
     path('gym/register-member/<int:gym_id>/', views.register_member, name='register_member'),
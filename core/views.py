@@ -1,11 +1,21 @@
+import json
 from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_cache_control
+from asgiref.sync import sync_to_async
 from .models import Attendance,  Gym, Member, PaymentMethod, Invoice, Notification, Staff, SystemPlan
+from . import billing, inbox, metrics, occupancy, rollups, roster
+from .asyncdb import db_slot
+from .checkin import afirst_scan, arelease_scan, consume_session, first_scan, release_scan
+from .qr import QR_FORMATS, InvalidPayload, cached_image, load_asset_token, parse_payload
 from .forms import ExpenseForm, GymPlanForm, UserRegisterForm, UserLoginForm, GymForm, MemberForm, VisitorForm
 
 def home(request):
@@ -61,8 +71,6 @@ def dashboard_redirect(request):
         return redirect('gym_dashboard')
     return redirect('home')
 
-PENDING_PAYMENT_METHOD = 'pending'  # 🔒 Constant for safety
-
 @login_required
 def gym_register(request):
     if request.user.role != 'gym_owner':
@@ -76,16 +84,14 @@ def gym_register(request):
             gym.save()
 
             # ✅ Ensure the 'pending' payment method exists
-            payment_method, _ = PaymentMethod.objects.get_or_create(
-                name=PENDING_PAYMENT_METHOD,
-                defaults={'is_active': False}
-            )
+            payment_method = billing.pending_method()
 
             # ✅ Create initial invoice
             Invoice.objects.create(
                 gym=gym,
                 amount=gym.system_plan.price,
                 payment_method=payment_method,
+                invoice_type='subscription',
                 description=f"Initial subscription for {gym.name}"
             )
             
@@ -100,7 +106,7 @@ def gym_register(request):
 @login_required
 def gym_payment(request, gym_id):
     gym = get_object_or_404(Gym, id=gym_id, owner=request.user)
-    invoice = gym.invoices.first()
+    invoice = gym.invoices.filter(invoice_type='subscription').first()
     payment_methods = PaymentMethod.objects.filter(is_active=True)
     
     if request.method == 'POST':
@@ -131,35 +137,212 @@ def gym_payment(request, gym_id):
     }
     return render(request, 'gym/payment.html', context)
 
+def _record_scan(gym_id, member_id, metered):
+    """Record a QR check-in, paying for it first on session plans; False if none are left."""
+    with transaction.atomic():
+        if metered and not consume_session(gym_id, member_id):
+            return False
+        Attendance.objects.create(
+            gym_id=gym_id,
+            attendance_type='member',
+            member_id=member_id,
+            method='qr'
+        )
+    return True
+
 @login_required
 def scan_qr_attendance(request):
     if request.method == 'POST' and request.headers.get('x-requested-with') == 'XMLHttpRequest':
         qr_data = request.POST.get('qr_data')
         gym_id = request.POST.get('gym_id')
-        
+
         try:
-            # In a real implementation, you would decrypt and verify the QR data
-            # For simplicity, we're using a dummy implementation
-            member_id = qr_data.split('_')[-1]  # Extract member ID
-            member = Member.objects.get(id=member_id, gym_id=gym_id)
-            
-            # Check if member is active
-            if not member.is_active:
-                return JsonResponse({'status': 'error', 'message': 'Membership expired'})
-            
-            # Record attendance
-            Attendance.objects.create(
-                gym=member.gym,
-                attendance_type='member',
-                member=member,
-                method='qr'
-            )
-            return JsonResponse({'status': 'success', 'member_name': member.name})
-        except Member.DoesNotExist:
+            payload_gym_id, member_id = parse_payload(qr_data)
+        except InvalidPayload:
             return JsonResponse({'status': 'error', 'message': 'Invalid QR code'})
-    
+        if str(payload_gym_id) != str(gym_id):
+            return JsonResponse({'status': 'error', 'message': 'Invalid QR code'})
+
+        # Accepted or rejected from the cached roster, no Member query
+        verdict = roster.check_member(payload_gym_id, member_id)
+        if not verdict.ok:
+            return JsonResponse({'status': 'error', 'message': verdict.message})
+
+        # Repeat scans inside the gym's debounce window are not recorded again
+        if not first_scan(payload_gym_id, member_id, verdict.debounce_minutes):
+            return JsonResponse({'status': 'success', 'member_name': verdict.name, 'recorded': False})
+
+        if not _record_scan(payload_gym_id, member_id, verdict.metered):
+            release_scan(payload_gym_id, member_id)
+            return JsonResponse({'status': 'error', 'message': 'No sessions remaining'})
+        return JsonResponse({'status': 'success', 'member_name': verdict.name, 'recorded': True})
+
+    return JsonResponse({'status': 'error'}, status=400)
+
+@login_required
+async def scan_qr_attendance_async(request):
+    # Same contract as scan_qr_attendance, served natively under ASGI
+    if request.method == 'POST' and request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        qr_data = request.POST.get('qr_data')
+        gym_id = request.POST.get('gym_id')
+
+        try:
+            payload_gym_id, member_id = parse_payload(qr_data)
+        except InvalidPayload:
+            return JsonResponse({'status': 'error', 'message': 'Invalid QR code'})
+        if str(payload_gym_id) != str(gym_id):
+            return JsonResponse({'status': 'error', 'message': 'Invalid QR code'})
+
+        async with db_slot():
+            verdict = await sync_to_async(roster.check_member)(payload_gym_id, member_id)
+            if not verdict.ok:
+                return JsonResponse({'status': 'error', 'message': verdict.message})
+
+            if not await afirst_scan(payload_gym_id, member_id, verdict.debounce_minutes):
+                return JsonResponse({'status': 'success', 'member_name': verdict.name, 'recorded': False})
+
+            if verdict.metered:
+                # The session UPDATE and the insert need one transaction
+                if not await sync_to_async(_record_scan)(payload_gym_id, member_id, True):
+                    await arelease_scan(payload_gym_id, member_id)
+                    return JsonResponse({'status': 'error', 'message': 'No sessions remaining'})
+            else:
+                await Attendance.objects.acreate(
+                    gym_id=payload_gym_id,
+                    attendance_type='member',
+                    member_id=member_id,
+                    method='qr'
+                )
+        return JsonResponse({'status': 'success', 'member_name': verdict.name, 'recorded': True})
+
     return JsonResponse({'status': 'error'}, status=400)
 
+def _scan_timestamp(value, now):
+    """
+    The scan time a kiosk reports, or None if it is older than
+    CHECKIN_SCAN_MAX_AGE; ValueError for a well-formed but impossible date.
+    """
+    # Kiosks buffer scans and send their own clock; never accept a future time
+    timestamp = parse_datetime(value) if isinstance(value, str) else None
+    if timestamp is None:
+        return now
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    if timestamp < now - timedelta(seconds=settings.CHECKIN_SCAN_MAX_AGE):
+        return None
+    return min(timestamp, now)
+
+def _scan_identity(scan):
+    """Return ``(gym_id, member_id)`` for a batch scan, or None if it is unusable."""
+    if not isinstance(scan, dict) or not str(scan.get('gym_id', '')).isdigit():
+        return None
+    gym_id = int(scan['gym_id'])
+
+    if scan.get('qr_data'):
+        try:
+            payload_gym_id, member_id = parse_payload(scan['qr_data'])
+        except InvalidPayload:
+            return None
+        return (gym_id, member_id) if payload_gym_id == gym_id else None
+
+    member_id = str(scan.get('member_id', ''))
+    return (gym_id, int(member_id)) if member_id.isdigit() else None
+
+@login_required
+def scan_qr_attendance_batch(request):
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error'}, status=400)
+
+    try:
+        scans = json.loads(request.body)['scans']
+    except (ValueError, KeyError, TypeError):
+        scans = None
+    if not isinstance(scans, list) or len(scans) > settings.CHECKIN_BATCH_LIMIT:
+        return JsonResponse({'status': 'error', 'message': 'Invalid payload'}, status=400)
+
+    now = timezone.now()
+    today = timezone.localdate(now)
+    # Kiosks only record into their owner's gyms
+    gym_ids = set(request.user.gyms.values_list('id', flat=True))
+    results = []
+    rows = []
+    # Single write transaction for the whole batch, session UPDATEs included
+    with transaction.atomic():
+        for index, scan in enumerate(scans):
+            try:
+                timestamp = _scan_timestamp(scan.get('timestamp'), now) if isinstance(scan, dict) else now
+            except ValueError:
+                results.append({'index': index, 'status': 'error', 'message': 'Invalid timestamp'})
+                continue
+            if timestamp is None:
+                results.append({'index': index, 'status': 'error', 'message': 'Scan too old'})
+                continue
+            identity = _scan_identity(scan)
+            if identity and identity[0] not in gym_ids:
+                results.append({'index': index, 'status': 'error', 'message': 'Gym not found'})
+                continue
+            # Validated against the cached per-gym roster
+            verdict = roster.check_member(*identity, today=today) if identity else roster.INVALID
+            if not verdict.ok:
+                results.append({'index': index, 'status': 'error', 'message': verdict.message})
+                continue
+
+            gym_id, member_id = identity
+            if not first_scan(gym_id, member_id, verdict.debounce_minutes, timestamp):
+                results.append({'index': index, 'status': 'success', 'member_name': verdict.name, 'recorded': False})
+                continue
+            if verdict.metered and not consume_session(gym_id, member_id):
+                release_scan(gym_id, member_id)
+                results.append({'index': index, 'status': 'error', 'message': 'No sessions remaining'})
+                continue
+
+            rows.append(Attendance(
+                gym_id=gym_id,
+                attendance_type='member',
+                member_id=member_id,
+                method='qr',
+                timestamp=timestamp,
+            ))
+            results.append({'index': index, 'status': 'success', 'member_name': verdict.name, 'recorded': True})
+
+        Attendance.objects.bulk_create(rows)
+        rollups.record_attendance(rows)
+    occupancy.record(rows)
+    for gym_id in {row.gym_id for row in rows}:
+        metrics.invalidate(gym_id)
+
+    return JsonResponse({'status': 'success', 'results': results})
+
+def _cached_qr_response(request, path, key, content_type, private):
+    etag = f'"{key}"'
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response['ETag'] = etag
+    patch_cache_control(response, **{'private' if private else 'public': True}, max_age=31536000, immutable=True)
+    return response
+
+@login_required
+def member_qr(request, member_id):
+    """The member's QR code as a PNG, rendered on first request and cached on disk."""
+    member = get_object_or_404(Member, id=member_id, gym__owner=request.user)
+    if not member.qr_payload:
+        return JsonResponse({'status': 'error', 'message': 'Member has no QR code'}, status=404)
+
+    key, path = cached_image(member.qr_payload)
+    return _cached_qr_response(request, path, key, 'image/png', private=True)
+
+def qr_asset(request, token):
+    """Public QR images for links; the signed token is the authorisation."""
+    try:
+        data, box_size, fmt = load_asset_token(token)
+    except InvalidPayload:
+        return JsonResponse({'status': 'error', 'message': 'Invalid QR link'}, status=404)
+
+    key, path = cached_image(data, box_size, fmt=fmt)
+    return _cached_qr_response(request, path, key, QR_FORMATS[fmt], private=False)
+
 @login_required
 def register_member(request, gym_id):
     gym = get_object_or_404(Gym, id=gym_id)
@@ -182,6 +365,7 @@ def register_member(request, gym_id):
                 gym=gym,
                 amount=member.plan.price,
                 payment_method=PaymentMethod.objects.get(name='cash'),
+                invoice_type='membership',
                 description=f"Membership for {member.name}",
                 is_paid=True
             )
@@ -213,17 +397,15 @@ def user_profile(request):
 
 @login_required
 def user_notifications(request):
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
-    
     context = {
-        'notifications': notifications
+        'notifications': inbox.entries(request.user)
     }
     return render(request, 'notifications.html', context)
 
 @login_required
 def mark_notifications_read(request):
     if request.method == 'POST':
-        Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        inbox.mark_read(request.user)
         messages.success(request, 'All notifications marked as read')
     return redirect('user_notifications')
 
@@ -241,7 +423,7 @@ def process_payment(request):
         invoice.save()
         
         # Handle gym activation if it's a registration payment
-        if invoice.description.startswith('Initial subscription'):
+        if invoice.invoice_type == 'subscription':
             invoice.gym.is_active = True
             invoice.gym.is_approved = True
             invoice.gym.save()
@@ -1,3 +1,226 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import exports, occupancy, status
+from core.models import Attendance, AttendanceArchive, Expense, Gym, GymPlan, Invoice, Member, PaymentMethod, SystemPlan, User
+
+STATIC_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(STORAGES=STATIC_STORAGES)
+class GymDashboardQueryTests(TestCase):
+    # session, user, then gyms, members, attendance, ledger totals,
+    # recent members, notifications and the sidebar's unread count
+    DASHBOARD_QUERIES = 9
+    # session, user and gyms once the metrics are cached
+    CACHED_DASHBOARD_QUERIES = 3
+
+    def setUp(self):
+        self.clear_cache()
+        self.owner = User.objects.create_user('owner', password='pw', role='gym_owner')
+        self.system_plan = SystemPlan.objects.create(
+            name='Basic', plan_type='basic', price=10, duration_days=30, gym_limit=20, member_limit=100
+        )
+        self.cash = PaymentMethod.objects.create(name='cash')
+        self.client.force_login(self.owner)
+
+    def clear_cache(self):
+        cache.clear()
+        # The day's status sweep is not part of the dashboard's cost
+        status.sweep()
+
+    def add_gym(self, index):
+        gym = Gym.objects.create(
+            owner=self.owner, name=f'Gym {index}', address='a', phone='1', email=f'g{index}@x.com',
+            system_plan=self.system_plan, is_active=True,
+        )
+        plan = GymPlan.objects.create(gym=gym, name='Monthly', plan_type='individual_duration', price=5, duration_days=30)
+        for number in range(7):
+            member = Member.objects.create(
+                gym=gym, name=f'M{number}', phone='1', gender='male', member_type='individual', plan=plan
+            )
+        Attendance.objects.create(gym=gym, attendance_type='member', member=member)
+        Invoice.objects.create(gym=gym, amount=5, payment_method=self.cash, description='Membership', is_paid=True)
+        Expense.objects.create(gym=gym, amount=2, description='Towels')
+        return gym
+
+    def test_query_count_does_not_grow_with_gyms(self):
+        self.add_gym(0)
+        with self.assertNumQueries(self.DASHBOARD_QUERIES):
+            response = self.client.get(reverse('gym_dashboard'))
+        self.assertEqual(len(response.context['gyms_data']), 1)
+
+        for index in range(1, 15):
+            self.add_gym(index)
+        self.clear_cache()
+        with self.assertNumQueries(self.DASHBOARD_QUERIES):
+            response = self.client.get(reverse('gym_dashboard'))
+        with self.assertNumQueries(self.CACHED_DASHBOARD_QUERIES):
+            self.client.get(reverse('gym_dashboard'))
+
+        gyms_data = response.context['gyms_data']
+        self.assertEqual(len(gyms_data), 15)
+        for data in gyms_data:
+            self.assertEqual(data['active_members_count'], 7)
+            self.assertEqual(data['member_attendance'], 1)
+            self.assertEqual(data['net_profit'], 3)
+            self.assertEqual(len(data['recent_members']), 5)
+
+    def test_writes_invalidate_cached_metrics(self):
+        gym = self.add_gym(0)
+        self.client.get(reverse('gym_dashboard'))
+
+        Expense.objects.create(gym=gym, amount=1, description='Chalk')
+        member = gym.members.first()
+        Attendance.objects.create(gym=gym, attendance_type='member', member=member)
+        member.is_active = False
+        member.save()
+
+        data = self.client.get(reverse('gym_dashboard')).context['gyms_data'][0]
+        self.assertEqual(data['net_profit'], 2)
+        self.assertEqual(data['member_attendance'], 2)
+        self.assertEqual(data['active_members_count'], 6)
+
+    def test_wsgi_dashboard_polls_occupancy(self):
+        gym = self.add_gym(0)
+        occupancy._gyms.clear()
+        response = self.client.get(reverse('gym_dashboard'))
+        self.assertContains(response, 'data-occupancy-poll="%s"' % reverse('occupancy_status', args=[gym.id]))
+        self.assertEqual(self.client.get(reverse('occupancy_stream', args=[gym.id])).status_code, 400)
+        self.assertEqual(self.client.get(reverse('occupancy_status', args=[gym.id])).json()['occupancy'], 1)
+
+
+@override_settings(STORAGES=STATIC_STORAGES)
+class ManualAttendanceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', password='pw', role='gym_owner')
+        system_plan = SystemPlan.objects.create(
+            name='Basic', plan_type='basic', price=10, duration_days=30, gym_limit=1, member_limit=100
+        )
+        self.gym = Gym.objects.create(
+            owner=self.owner, name='Gym', address='a', phone='1', email='g@x.com', system_plan=system_plan,
+            is_active=True,
+        )
+        self.member = Member.objects.create(
+            gym=self.gym, name='M', phone='1', gender='male', member_type='individual', sessions_remaining=1
+        )
+        self.client.force_login(self.owner)
+
+    def check_in_twice(self, url_name):
+        for _ in range(2):
+            response = self.client.post(reverse(url_name), {'member_id': self.member.id})
+            self.assertRedirects(response, reverse('record_attendance'), fetch_redirect_response=False)
+        self.member.refresh_from_db()
+        self.assertEqual((self.member.sessions_remaining, self.member.status), (0, 'exhausted'))
+        # The second visit found no session left and wrote nothing
+        self.assertEqual(Attendance.objects.filter(member=self.member).count(), 1)
+
+    def test_manual_check_in_consumes_sessions(self):
+        self.check_in_twice('record_attendance')
+
+    def test_async_manual_check_in_consumes_sessions(self):
+        self.check_in_twice('record_attendance_async')
+
+    def test_async_route_renders_the_form(self):
+        for url_name in ('record_attendance', 'record_attendance_async'):
+            response = self.client.get(reverse(url_name))
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'value="%s"' % self.member.id)
+
+    def test_history_clamps_paging_and_refuses_bad_input(self):
+        for minutes in range(3):
+            Attendance.objects.create(
+                gym=self.gym, attendance_type='member', member=self.member,
+                timestamp=timezone.now() - timedelta(minutes=minutes),
+            )
+        url = reverse('member_attendance_history', args=[self.member.id])
+        page = self.client.get(url, {'offset': -5, 'limit': 0}).json()
+        self.assertEqual((len(page['results']), page['next_offset']), (1, 1))
+        page = self.client.get(url, {'offset': 1, 'limit': 500}).json()
+        self.assertEqual((len(page['results']), page['next_offset']), (2, None))
+        for params in ({'offset': 'x'}, {'limit': '1.5'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='pw', role='gym_owner')
+        system_plan = SystemPlan.objects.create(
+            name='Basic', plan_type='basic', price=10, duration_days=30, gym_limit=1, member_limit=100
+        )
+        self.gym = Gym.objects.create(
+            owner=self.owner, name='Gym', address='a', phone='1', email='g@x.com', system_plan=system_plan,
+            is_active=True,
+        )
+        for name in ('Ann', 'Ben, Jr.', 'Cy'):
+            Member.objects.create(gym=self.gym, name=name, phone='1', gender='female', member_type='individual')
+        Member.objects.filter(name='Cy').update(is_active=False, status='inactive')
+        self.client.force_login(self.owner)
+
+    def export(self, dataset, **params):
+        response = self.client.get(reverse('export_data', args=[dataset]), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_has_the_filtered_rows(self):
+        response, body = self.export('members', format='csv', status='active')
+        self.assertEqual(response['Content-Type'], exports.FORMATS['csv'])
+        self.assertIn('attachment; filename="members-', response['Content-Disposition'])
+        lines = body.splitlines()
+        self.assertEqual(lines[0], ','.join(column for column, _ in exports.COLUMNS['members']))
+        self.assertEqual([line.split(',', 2)[1] for line in lines[1:]], ['Ann', '"Ben'])
+        self.assertIn('"Ben, Jr."', lines[2])
+
+    def test_jsonl_attendance_puts_archived_rows_first(self):
+        member = self.gym.members.get(name='Ann')
+        Attendance.objects.create(gym=self.gym, attendance_type='member', member=member, method='qr')
+        AttendanceArchive.objects.create(
+            gym_id=self.gym.id, attendance_type='member', member_id=member.id, method='manual',
+            timestamp=timezone.now() - timedelta(days=400),
+        )
+        _, body = self.export('attendance', format='jsonl')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['method'] for row in rows], ['manual', 'qr'])
+        self.assertEqual({row['member_id'] for row in rows}, {member.id})
+
+        _, body = self.export('attendance', format='jsonl', **{'from': timezone.localdate().isoformat()})
+        self.assertEqual(len(body.splitlines()), 1)
+
+    def test_rows_stream_in_chunks(self):
+        chunks = list(exports.stream(exports.querysets(self.gym, 'members', status='all'), 'members', chunk_size=2))
+        # Header, then two rows and one row
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [1, 2, 1])
+
+    def test_member_cards_stream_one_page_per_ten_members(self):
+        for number in range(10):
+            Member.objects.create(gym=self.gym, name=f'<M{number}>', phone='1', gender='male', member_type='individual')
+        url = reverse('member_cards')
+
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        pdf = b''.join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF-'))
+        self.assertTrue(pdf.endswith(b'%%EOF\n'))
+        # Ann, Ben and ten more active members; Cy is inactive
+        self.assertIn(b'/Count 2 ', pdf)
+
+        response = self.client.get(url, {'format': 'svg', 'search': 'M'})
+        svg = b''.join(response.streaming_content).decode()
+        self.assertEqual(svg.count('<svg'), 1)
+        self.assertIn('&lt;M0&gt;', svg)
+        self.assertNotIn('<M0>', svg)
+        self.assertEqual(self.client.get(url, {'format': 'png'}).status_code, 400)
+
+    def test_unknown_export_and_bad_dates_are_refused(self):
+        self.assertEqual(self.client.get(reverse('export_data', args=['secrets'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export_data', args=['invoices']), {'from': 'May'}).status_code, 400)
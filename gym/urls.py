@@ -5,15 +5,24 @@ urlpatterns = [
     # Dashboard
     path('dashboard/', views.gym_dashboard, name='gym_dashboard'),
     
+    # Live occupancy
+    path('occupancy/<int:gym_id>/', views.occupancy_status, name='occupancy_status'),
+    path('occupancy/<int:gym_id>/stream/', views.occupancy_stream, name='occupancy_stream'),
+    path('occupancy/<int:gym_id>/checkout/', views.occupancy_checkout, name='occupancy_checkout'),
+    
     # Members
     path('members/', views.member_list, name='member_list'),
     path('members/add/', views.add_member, name='add_member'),
+    path('members/import/', views.import_members_upload, name='import_members'),
+    path('members/cards/', views.member_cards, name='member_cards'),
     path('members/<int:member_id>/', views.member_detail, name='member_detail'),
+    path('members/<int:member_id>/attendance/', views.member_attendance_history, name='member_attendance_history'),
     path('members/<int:member_id>/renew/', views.renew_membership, name='renew_membership'),
     path('members/<int:member_id>/notify/', views.send_member_notification, name='send_member_notification'),
     
     # Attendance
     path('attendance/', views.record_attendance, name='record_attendance'),
+    path('attendance/async/', views.record_attendance_async, name='record_attendance_async'),
     path('attendance/report/', views.attendance_report, name='attendance_report'),
     
     # Invoices
@@ -37,6 +46,9 @@ urlpatterns = [
     path('staff/add/', views.create_staff, name='create_staff'),
     path('staff/<int:staff_id>/', views.staff_detail, name='staff_detail'),
     
+    # Exports
+    path('export/<str:dataset>/', views.export_data, name='export_data'),
+    
     # Registration Link
     path('share-link/', views.share_registration_link, name='share_registration_link'),
     
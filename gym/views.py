@@ -1,12 +1,28 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import asyncio
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from django.contrib import messages
+from django.http import JsonResponse, StreamingHttpResponse
 from datetime import timedelta, date
 from django.core.paginator import Paginator
 from core.forms import ExpenseForm, GymForm, GymPlanForm, InvoiceForm, MemberForm, StaffForm, VisitorForm
-from core.models import Attendance, Expense, Gym, Invoice, Member, Notification, PaymentMethod, Staff, Visitor
+from core import cards, exports, inbox, jobs, ledger, metrics, occupancy, outbox
+from core.asyncdb import db_slot
+from core.checkin import consume_session
+from core.filters import filter_expenses, filter_invoices, filter_members, filter_visitors
+from core.member_import import import_members, read_rows
+from core.qr import asset_url
+from core.retention import member_history
+from core.status import sweep_if_stale
+from core.models import Attendance, AttendanceDaily, Expense, Gym, Invoice, Member, Notification, PaymentMethod, Staff, Visitor
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.utils import timezone
@@ -15,72 +31,91 @@ from django.db.models import Sum
 
 @login_required
 def gym_dashboard(request):
-    gyms = request.user.gyms.all()  # Using related_name 'gyms' from your model
-
-    today = timezone.now().date()
-
-    gyms_data = []
-    for gym in gyms:
-        members = gym.members.all()
-        active_members = members.filter(is_active=True)
-        expiring_members = members.filter(expiry_date__range=(today, today + timedelta(days=7)))
-        expired_members = members.filter(expiry_date__lt=today, is_active=True)
-
-        attendance = gym.attendance_set.filter(timestamp__date=today)
-        member_attendance = attendance.filter(attendance_type='member').count()
-        staff_attendance = attendance.filter(attendance_type='staff').count()
-
-        income = gym.invoices.filter(is_paid=True).aggregate(total=Sum('amount'))['total'] or 0
-        expenses = gym.expenses.aggregate(total=Sum('amount'))['total'] or 0
-        net_profit = income - expenses
-
-        recent_members = members.order_by('-registration_date')[:5]
-        notifications = Notification.objects.filter(user=request.user).order_by('-created_at')[:5]
-
-        gyms_data.append({
-            'gym': gym,
-            'active_members_count': active_members.count(),
-            'expiring_members_count': expiring_members.count(),
-            'expired_members_count': expired_members.count(),
-            'member_attendance': member_attendance,
-            'staff_attendance': staff_attendance,
-            'income': income,
-            'expenses': expenses,
-            'net_profit': net_profit,
-            'recent_members': recent_members,
-            'notifications': notifications,
-        })
+    sweep_if_stale()
+    gyms = list(request.user.gyms.all())  # Using related_name 'gyms' from your model
+    gym_metrics = metrics.get_metrics([gym.id for gym in gyms])
+    notifications = inbox.recent(request.user)
+
+    gyms_data = [
+        {'gym': gym, **gym_metrics[gym.id], 'notifications': notifications}
+        for gym in gyms
+    ]
 
     context = {
         'gyms_data': gyms_data,
+        # A stream holds a sync worker for its whole life, so WSGI polls instead
+        'occupancy_live': isinstance(request, ASGIRequest),
+        'occupancy_poll_seconds': settings.OCCUPANCY_POLL_SECONDS,
     }
     return render(request, 'gym/dashboard.html', context)
 
 
+OCCUPANCY_HEARTBEAT_SECONDS = 15
+
+def _occupancy_event(state):
+    return f"event: occupancy\ndata: {json.dumps(state)}\n\n"
+
+async def _occupancy_events(gym_id):
+    # Push the count when it changes, a comment line as heartbeat otherwise;
+    # idle connections wait in the event loop rather than holding a thread
+    deadline = time.monotonic() + settings.OCCUPANCY_STREAM_SECONDS
+    last_count = None
+    yield "retry: 3000\n\n"
+    while time.monotonic() < deadline:
+        state = await sync_to_async(occupancy.snapshot)(gym_id)
+        yield _occupancy_event(state) if state['occupancy'] != last_count else ": keep-alive\n\n"
+        last_count = state['occupancy']
+        tracker = occupancy.get_tracker(gym_id)
+        for _ in range(OCCUPANCY_HEARTBEAT_SECONDS):
+            await asyncio.sleep(1)
+            if tracker.version != state['version']:
+                break
+
+@login_required
+def occupancy_stream(request, gym_id):
+    gym = get_object_or_404(Gym, id=gym_id, owner=request.user)
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI each stream would hold a worker; the dashboard polls occupancy_status
+        return JsonResponse({'status': 'error', 'message': 'Live updates need an ASGI server'}, status=400)
+
+    response = StreamingHttpResponse(_occupancy_events(gym.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+def occupancy_status(request, gym_id):
+    # Polled by the dashboard under WSGI; answers at once from the in-memory counter
+    gym = get_object_or_404(Gym, id=gym_id, owner=request.user)
+    return JsonResponse(occupancy.snapshot(gym.id))
+
+@login_required
+def occupancy_checkout(request, gym_id):
+    gym = get_object_or_404(Gym, id=gym_id, owner=request.user)
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error'}, status=400)
+
+    member_id = request.POST.get('member_id')
+    staff_id = request.POST.get('staff_id')
+    if member_id:
+        member = get_object_or_404(Member, id=member_id, gym=gym)
+        occupancy.check_out(gym.id, 'member', member.id)
+    elif staff_id:
+        staff = get_object_or_404(Staff, id=staff_id, gym=gym)
+        occupancy.check_out(gym.id, 'staff', staff.id)
+    else:
+        return JsonResponse({'status': 'error'}, status=400)
+    return JsonResponse({'status': 'success', **occupancy.snapshot(gym.id)})
+
+
 @login_required
 def member_list(request):
     gym = get_object_or_404(Gym, owner=request.user)
     status = request.GET.get('status', 'active')
     search_query = request.GET.get('search', '')
     
-    members = gym.members.all()
-    
-    # Apply status filter
-    today = date.today()
-    if status == 'active':
-        members = members.filter(is_active=True)
-    elif status == 'expiring':
-        members = members.filter(expiry_date__range=(today, today + timedelta(days=7)))
-    elif status == 'expired':
-        members = members.filter(expiry_date__lt=today, is_active=True)
-    
-    # Apply search
-    if search_query:
-        members = members.filter(
-            Q(name__icontains=search_query) |
-            Q(phone__icontains=search_query) |
-            Q(email__icontains=search_query)
-        )
+    sweep_if_stale()
+    members = filter_members(gym.members.all(), status, search_query)
     
     paginator = Paginator(members, 10)
     page_number = request.GET.get('page')
@@ -94,6 +129,60 @@ def member_list(request):
     }
     return render(request, 'gym/member_list.html', context)
 
+@login_required
+def member_cards(request):
+    # Same filters as the member list, e.g. ?status=active&format=pdf
+    gym = get_object_or_404(Gym, owner=request.user)
+    fmt = request.GET.get('format', 'pdf')
+    if fmt not in ('pdf', 'svg'):
+        return JsonResponse({'status': 'error', 'message': 'Unsupported format'}, status=400)
+
+    members = filter_members(gym.members.all(), request.GET.get('status', 'active'), request.GET.get('search', ''))
+    rows = members.exclude(qr_payload='').order_by('name', 'id').values_list(
+        'id', 'name', 'qr_payload', 'expiry_date', 'sessions_remaining'
+    )
+
+    def card_data():
+        for member_id, name, payload, expiry_date, sessions_remaining in rows.iterator(chunk_size=500):
+            if expiry_date:
+                detail = f"Expires {expiry_date:%d %b %Y}"
+            elif sessions_remaining is not None:
+                detail = f"{sessions_remaining} sessions"
+            else:
+                detail = ''
+            yield {'id': member_id, 'name': name, 'gym': gym.name, 'detail': detail, 'payload': payload}
+
+    if fmt == 'pdf':
+        response = StreamingHttpResponse(cards.card_sheet(card_data(), 'pdf'), content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="member-cards-{gym.id}.pdf"'
+    else:
+        response = StreamingHttpResponse(cards.card_sheet(card_data(), 'svg'), content_type='text/html; charset=utf-8')
+    return response
+
+@login_required
+def export_data(request, dataset):
+    # e.g. /gym/export/members/?format=csv&status=active&search=ann
+    gym = get_object_or_404(Gym, owner=request.user)
+    fmt = request.GET.get('format', 'csv')
+    if dataset not in exports.COLUMNS or fmt not in exports.FORMATS:
+        return JsonResponse({'status': 'error', 'message': 'Unknown export'}, status=404)
+    try:
+        date_from = date.fromisoformat(request.GET['from']) if request.GET.get('from') else None
+        date_to = date.fromisoformat(request.GET['to']) if request.GET.get('to') else None
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Dates must be YYYY-MM-DD'}, status=400)
+
+    querysets = exports.querysets(
+        gym, dataset,
+        status=request.GET.get('status', 'active'),
+        search=request.GET.get('search', ''),
+        date_from=date_from,
+        date_to=date_to,
+    )
+    response = StreamingHttpResponse(exports.stream(querysets, dataset, fmt), content_type=exports.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}-{gym.id}-{date.today():%Y%m%d}.{fmt}"'
+    return response
+
 @login_required
 def member_detail(request, member_id):
     member = get_object_or_404(Member, id=member_id, gym__owner=request.user)
@@ -105,6 +194,26 @@ def member_detail(request, member_id):
     }
     return render(request, 'gym/member_detail.html', context)
 
+@login_required
+def member_attendance_history(request, member_id):
+    # Full history on demand, including rows moved to the archive
+    member = get_object_or_404(Member, id=member_id, gym__owner=request.user)
+    try:
+        offset = max(int(request.GET.get('offset') or 0), 0)
+        limit = min(max(int(request.GET.get('limit') or 50), 1), 200)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'offset and limit must be integers'}, status=400)
+    history = member_history(member.id, offset, limit)
+
+    return JsonResponse({
+        'member': member.name,
+        'results': [
+            {'timestamp': row['timestamp'].isoformat(), 'method': row['method']}
+            for row in history
+        ],
+        'next_offset': offset + limit if len(history) == limit else None,
+    })
+
 @login_required
 def attendance_report(request):
     gym = get_object_or_404(Gym, owner=request.user)
@@ -117,22 +226,24 @@ def attendance_report(request):
     if isinstance(date_to, str):
         date_to = date.fromisoformat(date_to)
     
-    attendance = Attendance.objects.filter(
-        gym=gym,
-        timestamp__date__range=[date_from, date_to]
-    )
-    
+    # One range query over the daily rollup, whatever the window size
+    rollups = {
+        rollup.date: rollup
+        for rollup in AttendanceDaily.objects.filter(gym=gym, date__range=[date_from, date_to])
+    }
+
     # Group by date
     attendance_by_date = {}
     current_date = date_from
     while current_date <= date_to:
-        day_attendance = attendance.filter(timestamp__date=current_date)
-        member_count = day_attendance.filter(attendance_type='member').count()
-        staff_count = day_attendance.filter(attendance_type='staff').count()
+        rollup = rollups.get(current_date) or AttendanceDaily(gym=gym, date=current_date)
         attendance_by_date[current_date] = {
-            'member': member_count,
-            'staff': staff_count,
-            'total': member_count + staff_count
+            'member': rollup.member_count,
+            'staff': rollup.staff_count,
+            'total': rollup.member_count + rollup.staff_count,
+            'qr': rollup.qr_count,
+            'manual': rollup.manual_count,
+            'unique_members': rollup.unique_members,
         }
         current_date += timedelta(days=1)
     
@@ -147,15 +258,8 @@ def attendance_report(request):
 @login_required
 def invoice_list(request):
     gym = get_object_or_404(Gym, owner=request.user)
-    invoices = gym.invoices.all().order_by('-date')
-    
-    # Search functionality
     search_query = request.GET.get('search', '')
-    if search_query:
-        invoices = invoices.filter(
-            Q(description__icontains=search_query) |
-            Q(payment_method__icontains=search_query)
-        )
+    invoices = filter_invoices(gym.invoices.all(), search_query).order_by('-date')
     
     paginator = Paginator(invoices, 10)
     page_number = request.GET.get('page')
@@ -192,12 +296,8 @@ def create_invoice(request):
 @login_required
 def visitor_list(request):
     gym = get_object_or_404(Gym, owner=request.user)
-    visitors = Visitor.objects.filter(gym=gym).order_by('-date')
-    
-    # Search functionality
     search_query = request.GET.get('search', '')
-    if search_query:
-        visitors = visitors.filter(name__icontains=search_query)
+    visitors = filter_visitors(Visitor.objects.filter(gym=gym), search_query).order_by('-date')
     
     paginator = Paginator(visitors, 10)
     page_number = request.GET.get('page')
@@ -213,12 +313,8 @@ def visitor_list(request):
 @login_required
 def expense_list(request):
     gym = get_object_or_404(Gym, owner=request.user)
-    expenses = Expense.objects.filter(gym=gym).order_by('-date')
-    
-    # Search functionality
     search_query = request.GET.get('search', '')
-    if search_query:
-        expenses = expenses.filter(description__icontains=search_query)
+    expenses = filter_expenses(Expense.objects.filter(gym=gym), search_query).order_by('-date')
     
     paginator = Paginator(expenses, 10)
     page_number = request.GET.get('page')
@@ -245,32 +341,15 @@ def financial_reports(request):
     if isinstance(date_to, str):
         date_to = date.fromisoformat(date_to)
     
-    # Calculate income
-    member_income = gym.members.filter(
-        registration_date__range=[date_from, date_to]
-    ).aggregate(total=Sum('plan__price'))['total'] or 0
-    
-    visitor_income = Visitor.objects.filter(
-        gym=gym,
-        date__date__range=[date_from, date_to]
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    total_income = member_income + visitor_income
-    
-    # Calculate expenses
-    expenses = Expense.objects.filter(
-        gym=gym,
-        date__range=[date_from, date_to]
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Net profit
-    net_profit = total_income - expenses
+    # Range sums over the daily ledger instead of the raw tables
+    report = ledger.summarize(gym.id, date_from, date_to)
+    today = date.today()
+    month_to_date = ledger.summarize(gym.id, today.replace(day=1), today)
+    year_to_date = ledger.summarize(gym.id, today.replace(month=1, day=1), today)
     
-    # Income sources
-    income_sources = {
-        'Memberships': member_income,
-        'Visitors': visitor_income
-    }
+    income_sources = report['income_by_source']
+    member_income = income_sources['Memberships'] + income_sources['Renewals']
+    visitor_income = income_sources['Visitors']
     
     context = {
         'gym': gym,
@@ -278,10 +357,14 @@ def financial_reports(request):
         'date_to': date_to,
         'member_income': member_income,
         'visitor_income': visitor_income,
-        'total_income': total_income,
-        'expenses': expenses,
-        'net_profit': net_profit,
+        'total_income': report['income_total'],
+        'expenses': report['expense_total'],
+        'net_profit': report['net_profit'],
         'income_sources': income_sources,
+        'expenses_by_category': report['expenses_by_category'],
+        'payment_methods': report['payment_methods'],
+        'month_to_date': month_to_date,
+        'year_to_date': year_to_date,
     }
     return render(request, 'gym/financial_reports.html', context)
 
@@ -292,7 +375,8 @@ def share_registration_link(request):
     
     context = {
         'gym': gym,
-        'registration_link': registration_link
+        'registration_link': registration_link,
+        'qr_url': asset_url(registration_link),
     }
     return render(request, 'gym/share_registration_link.html', context)
 
@@ -331,15 +415,13 @@ def create_staff(request):
 @login_required
 def notifications(request):
     gym = get_object_or_404(Gym, owner=request.user)
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
-    
     # Mark all as read
     if request.method == 'POST':
-        notifications.update(is_read=True)
+        inbox.mark_read(request.user)
         return redirect('notifications')
     
     context = {
-        'notifications': notifications,
+        'notifications': inbox.entries(request.user),
         'gym': gym
     }
     return render(request, 'gym/notifications.html', context)
@@ -356,7 +438,9 @@ def send_member_notification(request, member_id):
                 message=f"Notification sent to {member.name}: {message}",
                 link=f"/gym/members/{member.id}/"
             )
-            # In a real app, you would send this to the member (email/SMS)
+            if member.email:
+                outbox.enqueue(member.email, f"Message from {member.gym.name}", message)
+                jobs.enqueue('deliver_email', priority=10)
             messages.success(request, 'Notification sent successfully!')
             return redirect('member_detail', member_id=member.id)
     
@@ -394,6 +478,23 @@ def add_member(request):
     }
     return render(request, 'gym/add_member.html', context)
 
+@login_required
+def import_members_upload(request):
+    # QR images are pre-rendered by a background job, the lazy endpoint covers the gap
+    gym = get_object_or_404(Gym, owner=request.user)
+    upload = request.FILES.get('file')
+    if request.method != 'POST' or not upload:
+        return JsonResponse({'status': 'error', 'message': 'Upload a CSV or JSONL file'}, status=400)
+
+    fmt = upload.name.rsplit('.', 1)[-1].lower()
+    if fmt not in ('csv', 'jsonl'):
+        return JsonResponse({'status': 'error', 'message': 'Unsupported file type'}, status=400)
+
+    report = import_members(gym, read_rows(upload, fmt), render_qr=False)
+    if report.created:
+        jobs.enqueue('render_member_qr', gym_id=gym.id)
+    return JsonResponse({'status': 'success', **report.as_dict()})
+
 # Renew Membership
 def renew_membership(request, member_id):
     member = get_object_or_404(Member, id=member_id, gym__owner=request.user)
@@ -413,6 +514,7 @@ def renew_membership(request, member_id):
             gym=member.gym,
             amount=member.plan.price,
             payment_method=PaymentMethod.objects.get(name='cash'),
+            invoice_type='membership_renewal',
             description=f"Renewal for {member.name}",
             is_paid=True
         )
@@ -426,9 +528,23 @@ def renew_membership(request, member_id):
     }
     return render(request, 'gym/renew_membership.html', context)
 
+def _record_member_attendance(gym, member):
+    """Manual check-in; False, and nothing written, when a session plan has none left."""
+    with transaction.atomic():
+        # Session plans pay for the visit, refused once none are left
+        if member.sessions_remaining is not None and not consume_session(gym.id, member.id):
+            return False
+        Attendance.objects.create(
+            gym=gym,
+            attendance_type='member',
+            member=member,
+            method='manual'
+        )
+    return True
+
 # Record Attendance
 def record_attendance(request):
-    gym = request.user.gym_set.first()
+    gym = request.user.gyms.first()
     if not gym:
         return redirect('gym_dashboard')
     
@@ -438,12 +554,9 @@ def record_attendance(request):
         
         if member_id:
             member = get_object_or_404(Member, id=member_id, gym=gym)
-            Attendance.objects.create(
-                gym=gym,
-                attendance_type='member',
-                member=member,
-                method='manual'
-            )
+            if not _record_member_attendance(gym, member):
+                messages.error(request, f'{member.name} has no sessions remaining')
+                return redirect('record_attendance')
             messages.success(request, f'Attendance recorded for {member.name}')
         elif staff_id:
             staff = get_object_or_404(Staff, id=staff_id, gym=gym)
@@ -458,7 +571,7 @@ def record_attendance(request):
         return redirect('record_attendance')
     
     members = gym.members.filter(is_active=True)
-    staff = gym.staff.filter(is_active=True)
+    staff = gym.staff.filter(is_active=True).select_related('user')
     
     context = {
         'members': members,
@@ -467,6 +580,39 @@ def record_attendance(request):
     }
     return render(request, 'gym/record_attendance.html', context)
 
+@login_required
+async def record_attendance_async(request):
+    # POST path of record_attendance with async ORM calls for ASGI deployments
+    if request.method != 'POST':
+        return await sync_to_async(record_attendance)(request)
+
+    user = await request.auser()
+    async with db_slot():
+        gym = await user.gyms.afirst()
+        if not gym:
+            return redirect('gym_dashboard')
+
+        member_id = request.POST.get('member_id')
+        staff_id = request.POST.get('staff_id')
+
+        if member_id:
+            member = await aget_object_or_404(Member, id=member_id, gym=gym)
+            if not await sync_to_async(_record_member_attendance)(gym, member):
+                messages.error(request, f'{member.name} has no sessions remaining')
+                return redirect('record_attendance')
+            messages.success(request, f'Attendance recorded for {member.name}')
+        elif staff_id:
+            staff = await aget_object_or_404(Staff.objects.select_related('user'), id=staff_id, gym=gym)
+            await Attendance.objects.acreate(
+                gym=gym,
+                attendance_type='staff',
+                staff=staff,
+                method='manual'
+            )
+            messages.success(request, f'Attendance recorded for {staff.user.username}')
+
+    return redirect('record_attendance')
+
 # Invoice Detail
 def invoice_detail(request, invoice_id):
     invoice = get_object_or_404(Invoice, id=invoice_id, gym__owner=request.user)
@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     # Dashboard
     path('dashboard/', views.system_dashboard, name='system_dashboard'),
+    path('dashboard/history/', views.kpi_history, name='kpi_history'),
     
     # Gym Management
     path('gyms/', views.gym_list, name='gym_list'),
@@ -32,4 +33,5 @@ urlpatterns = [
     
     # Settings
     path('settings/', views.system_settings, name='system_settings'),
+    path('cache-stats/', views.metrics_cache_stats, name='metrics_cache_stats'),
 ]
\ No newline at end of file
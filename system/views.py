@@ -1,48 +1,39 @@
-import base64
-import io
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from datetime import timedelta, date
 from django.core.paginator import Paginator
-import qrcode
 from core.forms import GymForm, SystemPlanForm, SystemSettingsForm
-from core.models import Gym, Invoice, Expense, Notification, SystemPlan, SystemSetting, User
+from core import billing, inbox, income, jobs, metrics, outbox, platform
+from core.qr import asset_url
+from core.status import sweep_if_stale
+from core.models import Gym, Invoice, Expense, Notification, SystemPlan, SystemSetting
 from django.contrib import messages
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.core.mail import send_mail
 
 @login_required
 def system_dashboard(request):
     if request.user.role != 'system_admin':
         return redirect('home')
     
-    today = timezone.now().date()
-    
-    # Gym statistics
-    gyms = Gym.objects.all()
-    active_gyms = gyms.filter(is_active=True)
-    expiring_gyms = gyms.filter(expiry_date__range=(today, today + timedelta(days=30)))
-    expired_gyms = gyms.filter(expiry_date__lt=today, is_active=True)
-    
-    # Financial statistics
-    total_income = Invoice.objects.filter(is_paid=True).aggregate(total=Sum('amount'))['total'] or 0
-    total_expenses = Expense.objects.filter(gym__isnull=True).aggregate(total=Sum('amount'))['total'] or 0
-    net_profit = total_income - total_expenses
+    sweep_if_stale()
+    snapshot = platform.latest()
     
     # Recent activities
-    recent_gyms = gyms.order_by('-registration_date')[:5]
-    recent_invoices = Invoice.objects.filter(is_paid=True).order_by('-date')[:5]
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')[:5]
+    recent_gyms = Gym.objects.select_related('owner', 'system_plan').order_by('-registration_date')[:5]
+    recent_invoices = Invoice.objects.filter(is_paid=True).select_related('gym', 'payment_method').order_by('-date')[:5]
+    notifications = inbox.recent(request.user)
     
     context = {
-        'active_gyms_count': active_gyms.count(),
-        'expiring_gyms_count': expiring_gyms.count(),
-        'expired_gyms_count': expired_gyms.count(),
-        'total_income': total_income,
-        'total_expenses': total_expenses,
-        'net_profit': net_profit,
+        'active_gyms_count': snapshot.active_gyms,
+        'expiring_gyms_count': snapshot.expiring_gyms,
+        'expired_gyms_count': snapshot.expired_gyms,
+        'total_income': snapshot.total_income,
+        'total_expenses': snapshot.total_expenses,
+        'net_profit': snapshot.net_profit,
+        'snapshot_refreshed_at': snapshot.created_at,
         'recent_gyms': recent_gyms,
         'recent_invoices': recent_invoices,
         'notifications': notifications,
@@ -60,13 +51,11 @@ def gym_list(request):
     gyms = Gym.objects.all()
     
     # Apply status filter
-    today = date.today()
+    sweep_if_stale()
     if status == 'active':
-        gyms = gyms.filter(is_active=True)
-    elif status == 'expiring':
-        gyms = gyms.filter(expiry_date__range=(today, today + timedelta(days=30)))
-    elif status == 'expired':
-        gyms = gyms.filter(expiry_date__lt=today, is_active=True)
+        gyms = gyms.filter(status__in=Gym.ACTIVE_STATUSES)
+    elif status in dict(Gym.STATUSES):
+        gyms = gyms.filter(status=status)
     
     # Apply search
     if search_query:
@@ -140,23 +129,29 @@ def income_report(request):
     if isinstance(date_to, str):
         date_to = date.fromisoformat(date_to)
     
-    # Aggregate income by gym
-    gym_income = Gym.objects.annotate(
-        total_income=Sum('invoices__amount', filter=Q(invoices__is_paid=True, invoices__date__range=[date_from, date_to]))
-    ).exclude(total_income=None)
+    bucket = request.GET.get('bucket', 'day')
+    if bucket not in income.BUCKETS:
+        bucket = 'day'
     
-    total_income = sum(gym.total_income for gym in gym_income if gym.total_income)
+    invoices = income.platform_invoices(date_from, date_to)
+    totals = income.overall(invoices)
+    
+    # Per gym rows are paginated, everything else is a single grouped query
+    paginator = Paginator(income.by_gym(invoices), 50)
+    gym_income = paginator.get_page(request.GET.get('page'))
     
-    # Income sources
     sources = {
-        'subscriptions': total_income,
-        'renewals': 0  # In a real app, you'd calculate this
+        'subscriptions': totals['subscriptions'],
+        'renewals': totals['renewals'],
     }
     
     context = {
         'gym_income': gym_income,
-        'total_income': total_income,
+        'total_income': totals['total_income'],
         'sources': sources,
+        'plan_income': list(income.by_plan(invoices)),
+        'income_over_time': list(income.by_bucket(invoices, bucket)),
+        'bucket': bucket,
         'date_from': date_from,
         'date_to': date_to
     }
@@ -253,13 +248,8 @@ def renew_subscription(request, gym_id):
     gym = get_object_or_404(Gym, id=gym_id)
     
     if request.method == 'POST':
-        # Create renewal invoice
-        Invoice.objects.create(
-            gym=gym,
-            amount=gym.system_plan.price,
-            payment_method='pending',
-            description=f"Renewal subscription for {gym.name}"
-        )
+        # One invoice per period, however many times this is submitted
+        billing.renewal_invoice(gym)
         
         messages.success(request, 'Renewal invoice created. Gym owner can now complete payment.')
         return redirect('gym_detail', gym_id=gym.id)
@@ -273,14 +263,36 @@ def renew_subscription(request, gym_id):
 def is_system_admin(user):
     return user.role == 'system_admin'
 
+@login_required
+@user_passes_test(is_system_admin)
+def kpi_history(request):
+    # Daily series for trend charts
+    try:
+        days = min(max(int(request.GET.get('days') or 30), 1), 365)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'days must be an integer'}, status=400)
+    return JsonResponse({'results': [
+        {
+            'date': timezone.localdate(snapshot.created_at).isoformat(),
+            'active_gyms': snapshot.active_gyms,
+            'expiring_gyms': snapshot.expiring_gyms,
+            'expired_gyms': snapshot.expired_gyms,
+            'total_income': str(snapshot.total_income),
+            'total_expenses': str(snapshot.total_expenses),
+        }
+        for snapshot in platform.history(days)
+    ]})
+
+@login_required
+@user_passes_test(is_system_admin)
+def metrics_cache_stats(request):
+    return JsonResponse({'gym_metrics': metrics.stats()})
+
 @login_required
 @user_passes_test(is_system_admin)
 def share_registration_link(request):
     registration_link = f"{request.scheme}://{request.get_host()}/register/"
-    qr_img = qrcode.make(registration_link)
-    buffered = io.BytesIO()
-    qr_img.save(buffered, format="PNG")
-    qr_code_base64 = base64.b64encode(buffered.getvalue()).decode()
+    qr_url = asset_url(registration_link)
 
     if request.method == 'POST':
         recipient_email = request.POST.get('email')
@@ -288,35 +300,29 @@ def share_registration_link(request):
 
         if recipient_email:
             full_message = f"{custom_message}\n\nRegistration Link: {registration_link}"
-            send_mail(
-                subject='Gym Registration Invitation',
-                message=full_message,
-                from_email='your_email@example.com',  # Replace with your email or settings.DEFAULT_FROM_EMAIL
-                recipient_list=[recipient_email],
-                fail_silently=False,
-            )
-            messages.success(request, f"Invitation sent to {recipient_email}!")
+            # Delivered by a job worker, not inside the request
+            outbox.enqueue(recipient_email, 'Gym Registration Invitation', full_message)
+            jobs.enqueue('deliver_email', priority=10)
+            messages.success(request, f"Invitation to {recipient_email} queued for delivery!")
             return redirect('share_registration_link')
         else:
             messages.error(request, "Please provide a recipient email.")
 
     context = {
         'registration_link': registration_link,
-        'qr_code_base64': qr_code_base64,
+        'qr_url': qr_url,
     }
     return render(request, 'system/share_registration_link.html', context)
 
 @login_required
 def notifications(request):
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
-    
     # Mark all as read
     if request.method == 'POST':
-        notifications.update(is_read=True)
+        inbox.mark_read(request.user)
         return redirect('notifications')
     
     context = {
-        'notifications': notifications
+        'notifications': inbox.entries(request.user)
     }
     return render(request, 'system/notifications.html', context)
 
@@ -327,13 +333,8 @@ def send_notification(request):
         message = request.POST.get('message')
         
         if gym_id == 'all':
-            users = User.objects.filter(role='gym_owner')
-            for user in users:
-                Notification.objects.create(
-                    user=user,
-                    message=message,
-                    link="/gym/dashboard/"
-                )
+            # One row for every gym owner, read state is tracked lazily
+            inbox.broadcast(message, link="/gym/dashboard/", audience='gym_owner')
         else:
             gym = get_object_or_404(Gym, id=gym_id)
             Notification.objects.create(